@@ -1,16 +1,169 @@
+import base64
 import hashlib
+import hmac
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
 import os
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple, TypeVar
 from datetime import datetime
+from utils.db import ConnectionPool, get_connection_pool
+from utils.metrics import increment, record_error, timed, timer
 
+# 管理者権限のキャッシュ（別プロセスでの変更もこの秒数が経てば反映される）
+ROLE_CACHE_TTL_SECONDS = 300
+_role_cache: Dict[str, Tuple[bool, float]] = {}
+_role_cache_lock = threading.Lock()
 
-def hash_password(password: str) -> str:
-    """パスワードをハッシュ化"""
+# パスワードハッシュ（scrypt）の既定値（secrets.tomlの[auth]セクションで変更可能）
+# 保存するハッシュにパラメータを含めるため、変更後も既存のハッシュは検証でき、次回ログイン時に新しい値で再ハッシュされる
+DEFAULT_SCRYPT_N = 2**14
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+SCRYPT_SALT_BYTES = 16
+SCRYPT_KEY_BYTES = 32
+SCRYPT_PREFIX = "scrypt"
+
+# ハッシュ計算のスレッド数（同時に計算するログイン・登録の上限）と待ち時間の上限（秒）
+DEFAULT_KDF_WORKERS = 2
+DEFAULT_KDF_TIMEOUT_SECONDS = 30.0
+
+_kdf_executor: Optional[ThreadPoolExecutor] = None
+_kdf_executor_lock = threading.Lock()
+
+# 存在しないユーザーのログインでも同じ時間がかかるように検証するダミーのハッシュ
+_dummy_hash: Optional[str] = None
+_dummy_hash_future: Optional[Future] = None
+_dummy_hash_lock = threading.Lock()
+
+T = TypeVar("T")
+
+
+def get_auth_setting(name: str, default):
+    """認証の設定を取得（secrets.tomlの[auth]セクションで変更可能）"""
+    try:
+        import streamlit as st
+
+        return st.secrets.get("auth", {}).get(name, default)
+    except Exception:
+        return default
+
+
+def get_scrypt_params() -> Tuple[int, int, int]:
+    """新しく作成するハッシュのscryptのパラメータ（n, r, p）"""
+    try:
+        return (
+            int(get_auth_setting("scrypt_n", DEFAULT_SCRYPT_N)),
+            int(get_auth_setting("scrypt_r", DEFAULT_SCRYPT_R)),
+            int(get_auth_setting("scrypt_p", DEFAULT_SCRYPT_P)),
+        )
+    except (TypeError, ValueError):
+        return DEFAULT_SCRYPT_N, DEFAULT_SCRYPT_R, DEFAULT_SCRYPT_P
+
+
+def scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # 必要なメモリ（128 * n * r バイト）に余裕を持たせて上限を指定
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=SCRYPT_KEY_BYTES
+    )
+
+
+def hash_password(password: str, params: Optional[Tuple[int, int, int]] = None) -> str:
+    """パスワードをハッシュ化（ユーザーごとのソルトとパラメータを含む「scrypt$n$r$p$ソルト$ハッシュ」形式）"""
+    n, r, p = params or get_scrypt_params()
+    salt = os.urandom(SCRYPT_SALT_BYTES)
+    key = scrypt(password, salt, n, r, p)
+    return "$".join(
+        [SCRYPT_PREFIX, str(n), str(r), str(p), base64.b64encode(salt).decode(), base64.b64encode(key).decode()]
+    )
+
+
+def hash_password_legacy(password: str) -> str:
+    """移行前の形式（ソルトなしのSHA-256）でハッシュ化"""
     return hashlib.sha256(password.encode()).hexdigest()
 
 
+def verify_password(password: str, password_hash: str) -> bool:
+    """パスワードが保存されているハッシュと一致するか確認（移行前のSHA-256形式にも対応）"""
+    if not password_hash.startswith(SCRYPT_PREFIX + "$"):
+        return hmac.compare_digest(hash_password_legacy(password), password_hash)
+
+    try:
+        _, n, r, p, salt, key = password_hash.split("$")
+        expected = base64.b64decode(key)
+        actual = scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """移行前の形式、または現在の設定と異なるパラメータのハッシュか"""
+    if not password_hash.startswith(SCRYPT_PREFIX + "$"):
+        return True
+    return tuple(int(value) for value in password_hash.split("$")[1:4]) != get_scrypt_params()
+
+
+def get_kdf_executor() -> ThreadPoolExecutor:
+    """ハッシュ計算用のスレッドプールを取得（プロセス共通、スレッド数が同時計算数の上限）"""
+    global _kdf_executor, _dummy_hash_future
+    with _kdf_executor_lock:
+        if _kdf_executor is None:
+            try:
+                workers = max(1, int(get_auth_setting("kdf_workers", DEFAULT_KDF_WORKERS)))
+            except (TypeError, ValueError):
+                workers = DEFAULT_KDF_WORKERS
+            _kdf_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-kdf")
+            # 存在しないユーザーの初回のログインで作成を待たないよう、ダミーのハッシュを先に作成しておく
+            _dummy_hash_future = _kdf_executor.submit(hash_password, os.urandom(16).hex())
+        return _kdf_executor
+
+
+def start_kdf_pool():
+    """ハッシュ計算用のスレッドプールを起動（プロセスで1回だけ、アプリの起動時に呼び出す）"""
+    get_kdf_executor()
+
+
+def wait_kdf(future: "Future[T]") -> T:
+    """スレッドプールに投入したハッシュ計算の結果を待つ（上限時間を過ぎたら取り消してTimeoutErrorを送出）"""
+    try:
+        timeout = float(get_auth_setting("kdf_timeout_seconds", DEFAULT_KDF_TIMEOUT_SECONDS))
+    except (TypeError, ValueError):
+        timeout = DEFAULT_KDF_TIMEOUT_SECONDS
+    try:
+        with timer("auth.kdf"):
+            return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        # 待つのをやめた計算がスレッドプールを占有し続けないよう、開始前であれば取り消す
+        future.cancel()
+        increment("auth.kdf_timeout")
+        raise
+
+
+def run_kdf(func: Callable[..., T], *args) -> T:
+    """ハッシュ計算をスレッドプールで実行して結果を待つ
+
+    ログインが集中してもハッシュ計算の同時実行数がスレッド数に抑えられ、
+    他のセッションの再実行がCPU・メモリを奪われない（scryptの計算中はGILも解放される）。
+    """
+    return wait_kdf(get_kdf_executor().submit(func, *args))
+
+
+def get_dummy_hash() -> str:
+    """存在しないユーザーのログインで検証するダミーのハッシュを取得（スレッドプールで作成したものを使う）"""
+    global _dummy_hash
+    get_kdf_executor()
+    with _dummy_hash_lock:
+        if _dummy_hash is None and not _dummy_hash_future.cancelled():
+            _dummy_hash = wait_kdf(_dummy_hash_future)
+        if _dummy_hash is None or needs_rehash(_dummy_hash):
+            _dummy_hash = run_kdf(hash_password, os.urandom(16).hex())
+        return _dummy_hash
+
+
 def get_db_path() -> Path:
     """SQLiteのDBファイルパスを取得"""
     # スクリプトのディレクトリを基準にパスを構築
@@ -20,10 +173,8 @@ def get_db_path() -> Path:
     return db_dir / "users.db"
 
 
-def init_db():
-    """データベースの初期化"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
+def init_db_schema(conn: sqlite3.Connection):
+    """テーブルの作成"""
     c = conn.cursor()
 
     # usersテーブルの作成
@@ -39,50 +190,81 @@ def init_db():
     """
     )
 
-    conn.commit()
-    conn.close()
 
+def get_pool() -> ConnectionPool:
+    """usersテーブル用のコネクションプールを取得（初回のみスキーマを初期化）"""
+    return get_connection_pool(get_db_path(), init_db_schema)
 
-def verify_login(email: str, password: str) -> bool:
-    """ログイン認証を行う"""
-    init_db()  # DB初期化
-    hashed_password = hash_password(password)
 
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
+def init_db():
+    """データベースの初期化"""
+    get_pool()
+
+
+def invalidate_role_cache(email: Optional[str] = None):
+    """管理者権限のキャッシュを破棄する（emailを省略した場合は全ユーザー分）"""
+    with _role_cache_lock:
+        if email is None:
+            _role_cache.clear()
+        else:
+            _role_cache.pop(email, None)
 
+
+@timed("auth.verify_login")
+def verify_login(email: str, password: str) -> bool:
+    """ログイン認証を行う（移行前の形式・古いパラメータのハッシュは認証成功時に再ハッシュする）"""
     try:
-        c.execute("SELECT 1 FROM users WHERE email = ? AND password_hash = ?", (email, hashed_password))
-        result = c.fetchone() is not None
-        return result
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT password_hash FROM users WHERE email = ?", (email,))
+            row = c.fetchone()
+
+        if row is None:
+            run_kdf(verify_password, password, get_dummy_hash())
+            return False
+
+        password_hash = row[0]
+        if not run_kdf(verify_password, password, password_hash):
+            return False
+
+        if needs_rehash(password_hash):
+            new_hash = run_kdf(hash_password, password)
+            with get_pool().connection() as conn:
+                # 同時にパスワードが変更された場合は上書きしない
+                conn.execute(
+                    "UPDATE users SET password_hash = ?, updated_at = CURRENT_TIMESTAMP WHERE email = ? AND password_hash = ?",
+                    (new_hash, email, password_hash),
+                )
+                conn.commit()
+            increment("auth.password_rehashed")
+        return True
     except Exception as e:
         print(f"認証エラー: {str(e)}")
+        record_error("auth.verify_login", e)
         return False
-    finally:
-        conn.close()
 
 
+@timed("auth.save_user")
 def save_user(email: str, password: str, is_admin: bool = False):
     """新規ユーザーを保存する"""
-    init_db()  # DB初期化
-    hashed_password = hash_password(password)
-
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
+    hashed_password = run_kdf(hash_password, password)
 
     try:
-        c.execute(
-            "INSERT INTO users (email, password_hash, is_admin) VALUES (?, ?, ?)", (email, hashed_password, is_admin)
-        )
-        conn.commit()
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                "INSERT INTO users (email, password_hash, is_admin) VALUES (?, ?, ?)",
+                (email, hashed_password, is_admin),
+            )
+            conn.commit()
+        invalidate_role_cache(email)
     except sqlite3.IntegrityError:
         raise Exception("このメールアドレスは既に登録されています")
     except Exception as e:
         raise Exception(f"ユーザー登録エラー: {str(e)}")
-    finally:
-        conn.close()
 
 
+@timed("auth.change_password")
 def change_password(email: str, new_password: str) -> bool:
     """パスワードを変更する
 
@@ -93,41 +275,37 @@ def change_password(email: str, new_password: str) -> bool:
     Returns:
         bool: 変更成功ならTrue、メールアドレスが存在しない場合はFalse
     """
-    init_db()  # DB初期化
-    hashed_password = hash_password(new_password)
-
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
-
     try:
-        # メールアドレスが存在するか確認
-        c.execute("SELECT 1 FROM users WHERE email = ?", (email,))
-        if c.fetchone() is None:
-            return False
-
-        # パスワードを更新
-        c.execute(
-            """
-            UPDATE users 
-            SET password_hash = ?, 
-                updated_at = CURRENT_TIMESTAMP 
-            WHERE email = ?
-        """,
-            (hashed_password, email),
-        )
-        conn.commit()
-        return True
+        hashed_password = run_kdf(hash_password, new_password)
+
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+
+            # パスワードを更新（メールアドレスが存在しない場合は更新件数が0になる）
+            c.execute(
+                """
+                UPDATE users 
+                SET password_hash = ?, 
+                    updated_at = CURRENT_TIMESTAMP 
+                WHERE email = ?
+            """,
+                (hashed_password, email),
+            )
+            if c.rowcount == 0:
+                return False
+            conn.commit()
+            return True
 
     except Exception as e:
         print(f"パスワード変更エラー: {str(e)}")
+        record_error("auth.change_password", e)
         return False
-    finally:
-        conn.close()
 
 
 # 既存のユーザーデータを移行
+@timed("auth.migrate_existing_users")
 def migrate_existing_users():
-    """既存のcredentials.jsonからSQLiteへデータを移行"""
+    """既存のcredentials.jsonからSQLiteへデータを移行（SHA-256のハッシュは次回ログイン時にscryptで再ハッシュされる）"""
     credentials_path = Path(__file__).parent / "data" / "credentials.json"
     if not credentials_path.exists():
         return
@@ -137,65 +315,70 @@ def migrate_existing_users():
     with open(credentials_path, "r") as f:
         credentials = json.load(f)
 
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
-
-    try:
-        for email, password_hash in credentials.items():
-            try:
-                c.execute("INSERT INTO users (email, password_hash) VALUES (?, ?)", (email, password_hash))
-            except sqlite3.IntegrityError:
-                # 既に存在する場合はスキップ
-                continue
+    with get_pool().connection() as conn:
+        c = conn.cursor()
+        # 既に存在する場合はスキップ
+        c.executemany(
+            "INSERT OR IGNORE INTO users (email, password_hash) VALUES (?, ?)",
+            list(credentials.items()),
+        )
         conn.commit()
-    finally:
-        conn.close()
+    invalidate_role_cache()
 
 
+@timed("auth.is_admin")
 def is_admin(email: str) -> bool:
-    """ユーザーが管理者かどうかを確認する"""
-    init_db()
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
+    """ユーザーが管理者かどうかを確認する（結果はプロセス内でキャッシュ）"""
+    if not email:
+        return False
+
+    with _role_cache_lock:
+        cached = _role_cache.get(email)
+    if cached and time.monotonic() - cached[1] < ROLE_CACHE_TTL_SECONDS:
+        increment("auth.role_cache_hits")
+        return cached[0]
 
     try:
-        c.execute("SELECT is_admin FROM users WHERE email = ?", (email,))
-        result = c.fetchone()
-        return bool(result[0]) if result else False
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT is_admin FROM users WHERE email = ?", (email,))
+            result = c.fetchone()
+            admin = bool(result[0]) if result else False
+        with _role_cache_lock:
+            _role_cache[email] = (admin, time.monotonic())
+        return admin
     except Exception as e:
         print(f"管理者確認エラー: {str(e)}")
+        record_error("auth.is_admin", e)
         return False
-    finally:
-        conn.close()
 
 
+@timed("auth.get_all_users")
 def get_all_users() -> List[Dict]:
     """登録されているすべてのユーザー情報を取得"""
-    init_db()  # DB初期化
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
-
     try:
-        c.execute(
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                """
+                SELECT email, is_admin, created_at, updated_at 
+                FROM users 
+                ORDER BY created_at DESC
             """
-            SELECT email, is_admin, created_at, updated_at 
-            FROM users 
-            ORDER BY created_at DESC
-        """
-        )
+            )
 
-        users = []
-        for row in c.fetchall():
-            users.append({"email": row[0], "is_admin": bool(row[1]), "created_at": row[2], "updated_at": row[3]})
-        return users
+            users = []
+            for row in c.fetchall():
+                users.append({"email": row[0], "is_admin": bool(row[1]), "created_at": row[2], "updated_at": row[3]})
+            return users
 
     except Exception as e:
         print(f"ユーザー一覧取得エラー: {str(e)}")
+        record_error("auth.get_all_users", e)
         return []
-    finally:
-        conn.close()
 
 
+@timed("auth.delete_user")
 def delete_user(email: str) -> bool:
     """ユーザーを削除する
 
@@ -205,23 +388,19 @@ def delete_user(email: str) -> bool:
     Returns:
         bool: 削除成功ならTrue、ユーザーが存在しない場合はFalse
     """
-    init_db()
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
-
     try:
-        # メールアドレスが存在するか確認
-        c.execute("SELECT 1 FROM users WHERE email = ?", (email,))
-        if c.fetchone() is None:
-            return False
-
-        # ユーザーを削除
-        c.execute("DELETE FROM users WHERE email = ?", (email,))
-        conn.commit()
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+
+            # ユーザーを削除（存在しない場合は削除件数が0になる）
+            c.execute("DELETE FROM users WHERE email = ?", (email,))
+            if c.rowcount == 0:
+                return False
+            conn.commit()
+        invalidate_role_cache(email)
         return True
 
     except Exception as e:
         print(f"ユーザー削除エラー: {str(e)}")
+        record_error("auth.delete_user", e)
         return False
-    finally:
-        conn.close()
@@ -1,6 +1,5 @@
 import streamlit as st
 import streamlit_antd_components as sac
-from pages.chatbot import load_system_prompts
 from auth import is_admin
 
 
@@ -37,27 +36,28 @@ def show_sidebar():
 
         # チャットボット設定（チャットボットページの場合のみ表示）
         if st.session_state.page == "chatbot":
-            # SYSTEM_PROMPTSの初期化
-            if "SYSTEM_PROMPTS" not in st.session_state:
-                st.session_state.SYSTEM_PROMPTS = load_system_prompts()
+            # システムプロンプトはプロセス共通のレジストリから取得
+            from pages.chatbot import load_system_prompts
 
-            if st.session_state.SYSTEM_PROMPTS:
+            system_prompts = load_system_prompts()
+            if system_prompts:
                 st.markdown("---")
                 st.subheader("チャットボット設定")
                 st.selectbox(
                     "カテゴリを選択してください",
-                    options=list(st.session_state.SYSTEM_PROMPTS.keys()),
+                    options=list(system_prompts.keys()),
                     key="chatbot_category",
                 )
                 if st.button("会話履歴をクリア", key="clear_chat_history"):
                     st.session_state.messages = []
+                    st.session_state.chat_summary = {"text": None, "count": 0}
                     st.rerun()
 
         # ユーザー情報とログアウトボタンの表示
         if st.session_state.get("logged_in_email"):
             st.markdown("---")
             with st.container():
-                if st.button("ログアウト", key="logout_button", use_container_width=True):
+                if st.button("ログアウト", key="logout_button", width="stretch"):
                     st.session_state.password_correct = False
                     st.session_state.logged_in_email = None
                     st.rerun()
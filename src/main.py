@@ -1,11 +1,39 @@
+import importlib
+from typing import Callable, Optional
+
 import streamlit as st
+from auth import start_kdf_pool
 from ui.login_ui import show_login_page
 from ui.signup_ui import show_signup_page
-from components.sidebar import show_sidebar
-from pages.home import show_home_page
-from pages.chatbot import show_chatbot_page
-from pages.qa_drill import show_qa_drill_page
-from pages.admin import show_admin_page
+from utils.grading_queue import start_grading_queue_in_background
+from utils.metrics import start_metrics_server, timed, timer
+from utils.profiler import is_all_sessions_enabled, profile_rerun, profile_section
+
+# ページ名と表示関数の対応（モジュール名, 関数名）
+# ページのモジュールは初めて表示するときに読み込む
+PAGE_REGISTRY = {
+    "home": ("pages.home", "show_home_page"),
+    "chatbot": ("pages.chatbot", "show_chatbot_page"),
+    "qa_drill": ("pages.qa_drill", "show_qa_drill_page"),
+    "admin": ("pages.admin", "show_admin_page"),
+}
+
+
+def load_page(page: str) -> Optional[Callable[[], None]]:
+    """ページの表示関数を取得（未登録のページの場合はNone）"""
+    entry = PAGE_REGISTRY.get(page)
+    if entry is None:
+        return None
+
+    module_name, function_name = entry
+    # import済みのモジュールはsys.modulesから返されるため、読み込みはプロセスごとに1回
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def start_grading_queue():
+    """回答送信の採点キューを起動（再起動前の採点待ち・中断されたジョブを、QAドリルを開く前から再開する）"""
+    # 採点関数を含むQAドリルのモジュールの読み込みでログイン画面の表示が遅れないよう、別スレッドで読み込む
+    start_grading_queue_in_background(lambda: importlib.import_module("pages.qa_drill").get_submission_queue())
 
 
 def init_session_state():
@@ -18,6 +46,11 @@ def init_session_state():
         st.session_state.is_signup_visible = False
 
 
+def is_profiling_enabled() -> bool:
+    """この再実行をプロファイルするか"""
+    return st.session_state.get("profiling_enabled", False) or is_all_sessions_enabled()
+
+
 def init_page(is_logged_in: bool):
     """ページの初期化"""
     st.set_page_config(
@@ -48,34 +81,46 @@ def show_current_page():
 
     with main_container:
         # ページに応じたコンテンツを表示
-        if st.session_state.page == "chatbot":
-            show_chatbot_page()
-        elif st.session_state.page == "qa_drill":
-            show_qa_drill_page()
-        elif st.session_state.page == "admin":
-            show_admin_page()
-        elif st.session_state.page == "home":
-            show_home_page()
+        show_page = load_page(st.session_state.page)
+        if show_page is not None:
+            with timer(f"page.{st.session_state.page}"), profile_section(f"page.{st.session_state.page}"):
+                show_page()
 
 
+@timed("rerun")
 def main():
     """メイン処理"""
+    # メトリクスの配信（[metrics] port を設定した場合のみ、プロセスで1回だけ起動）
+    start_metrics_server()
+
+    # 採点キューのワーカーの起動（プロセスで1回だけ）
+    start_grading_queue()
+
+    # パスワードのハッシュ計算用のスレッドプールの起動（プロセスで1回だけ）
+    start_kdf_pool()
+
     # セッション状態の初期化
     init_session_state()
 
-    # ページ設定の初期化
-    init_page(st.session_state.password_correct)
+    # プロファイル（管理者ページで有効にしたセッション、または全セッション）
+    with profile_rerun(is_profiling_enabled()):
+        # ページ設定の初期化
+        init_page(st.session_state.password_correct)
 
-    # ログインしていない場合はログイン/サインアップ画面を表示
-    if not st.session_state.password_correct:
-        if st.session_state.is_signup_visible:
-            show_signup_page()
+        # ログインしていない場合はログイン/サインアップ画面を表示
+        if not st.session_state.password_correct:
+            with profile_section("login"):
+                if st.session_state.is_signup_visible:
+                    show_signup_page()
+                else:
+                    show_login_page()
         else:
-            show_login_page()
-    else:
-        # ログイン時はサイドバーとメインコンテンツを表示
-        show_sidebar()
-        show_current_page()
+            # ログイン時はサイドバーとメインコンテンツを表示
+            from components.sidebar import show_sidebar
+
+            with profile_section("sidebar"):
+                show_sidebar()
+            show_current_page()
 
 
 if __name__ == "__main__":
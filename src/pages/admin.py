@@ -1,5 +1,65 @@
 import streamlit as st
+from datetime import datetime, timedelta
+import shlex
+from functools import partial
 from auth import get_all_users, migrate_existing_users, save_user, is_admin, delete_user
+from utils.answer_matcher import TIER_CACHE, TIER_EXACT, TIER_LLM, TIER_LOCAL
+from utils.drill_results import (
+    TIER_ERROR,
+    TIER_INCORRECT,
+    count_result_rows,
+    get_category_analytics,
+    get_question_analytics,
+    get_results_overview,
+    get_tier_breakdown,
+    get_user_progress,
+    get_user_summaries,
+    refresh_aggregates,
+)
+from utils.grading_cache import get_grading_cache
+from utils.metrics import get_metrics
+from utils.results_export import (
+    EXPORT_MIME_TYPES,
+    FORMAT_CSV,
+    FORMAT_JSONL,
+    FORMAT_ZIP,
+    export_results_bytes,
+    get_max_download_rows,
+)
+from utils.question_bank import (
+    export_questions,
+    get_question_bank,
+    import_questions,
+    list_versions,
+    parse_questions,
+    restore_version,
+)
+from utils.profiler import (
+    MODE_CPROFILE,
+    MODE_SAMPLING,
+    get_mode,
+    get_profile_store,
+    is_all_sessions_enabled,
+    set_all_sessions,
+    set_mode,
+)
+
+# エクスポートの形式の表示名
+EXPORT_FORMAT_LABELS = {
+    FORMAT_ZIP: "ZIP（CSV・JSONL・テキストレポート）",
+    FORMAT_CSV: "CSV",
+    FORMAT_JSONL: "JSONL",
+}
+
+# 分析タブの判定段階の表示名
+TIER_ANALYTICS_LABELS = {
+    TIER_EXACT: "完全一致",
+    TIER_LOCAL: "表記ゆれを除いて一致",
+    TIER_CACHE: "AI採点（採点済みの結果を再利用）",
+    TIER_LLM: "AI採点",
+    TIER_INCORRECT: "不正解",
+    TIER_ERROR: "採点エラー",
+}
 
 
 def show_admin_page():
@@ -16,7 +76,19 @@ def show_admin_page():
     st.title("管理者ページ")
 
     # 管理者機能のタブ
-    tab1, tab2, tab3 = st.tabs(["ユーザー管理", "ユーザー追加", "データ移行"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs(
+        [
+            "ユーザー管理",
+            "ユーザー追加",
+            "データ移行",
+            "採点キャッシュ",
+            "パフォーマンス",
+            "プロファイラ",
+            "問題バンク",
+            "分析",
+            "エクスポート",
+        ]
+    )
 
     # ユーザー管理タブ
     with tab1:
@@ -25,7 +97,7 @@ def show_admin_page():
         # 更新ボタン
         col1, col2 = st.columns([1, 5])
         with col1:
-            if st.button("一覧を更新", key="refresh_users", use_container_width=True):
+            if st.button("一覧を更新", key="refresh_users", width="stretch"):
                 st.rerun()
 
         # ユーザー一覧を表示
@@ -37,7 +109,7 @@ def show_admin_page():
             df = pd.DataFrame(users)
             # カラム名を日本語に変更
             df.columns = ["メールアドレス", "管理者", "作成日時", "更新日時"]
-            st.dataframe(df, use_container_width=True)
+            st.dataframe(df, width="stretch")
 
             # 登録ユーザー数を表示
             st.info(f"登録ユーザー数: {len(users)}名")
@@ -59,7 +131,7 @@ def show_admin_page():
             else:
                 col1, col2, col3 = st.columns([2, 1, 2])
                 with col2:
-                    delete_clicked = st.button("削除", type="primary", use_container_width=True)
+                    delete_clicked = st.button("削除", type="primary", width="stretch")
 
                 if delete_clicked:
                     # 確認ダイアログを表示（全幅で）
@@ -104,7 +176,7 @@ def show_admin_page():
                     "管理者権限を付与", help="管理者権限を持つユーザーは、ユーザー管理などの特別な機能を使用できます"
                 )
 
-                submitted = st.form_submit_button("ユーザーを追加", use_container_width=True)
+                submitted = st.form_submit_button("ユーザーを追加", width="stretch")
                 if submitted:
                     if not new_email or not new_password or not confirm_password:
                         st.error("すべての項目を入力してください")
@@ -142,3 +214,444 @@ def show_admin_page():
                 st.success("データ移行が完了しました")
             except Exception as e:
                 st.error(f"データ移行中にエラーが発生しました: {str(e)}")
+
+    # 採点キャッシュタブ
+    with tab4:
+        st.header("採点キャッシュ")
+        st.write("AI採点の判定結果のキャッシュ状況です（ヒット・ミス数はアプリ起動後の累計）。")
+
+        cache = get_grading_cache()
+        stats = cache.stats()
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("ヒット（メモリ）", stats["memory_hits"])
+        col2.metric("ヒット（DB）", stats["db_hits"])
+        col3.metric("ミス", stats["misses"])
+        col4.metric("ヒット率", f"{stats['hit_rate']:.1%}")
+
+        try:
+            st.info(f"保存件数: {cache.count_rows()}件（メモリ上: {stats['memory_entries']}件）")
+        except Exception as e:
+            st.error(f"キャッシュ件数の取得中にエラーが発生しました: {str(e)}")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("期限切れを削除", key="prune_grading_cache", width="stretch"):
+                cache.prune()
+                st.rerun()
+        with col2:
+            if st.button("キャッシュを全て削除", key="clear_grading_cache", width="stretch"):
+                cache.clear()
+                st.success("採点キャッシュを削除しました")
+
+    # パフォーマンスタブ
+    with tab5:
+        show_performance_panel()
+
+    # プロファイラタブ
+    with tab6:
+        show_profiler_panel()
+
+    # 問題バンクタブ
+    with tab7:
+        show_question_bank_panel()
+
+    # 分析タブ
+    with tab8:
+        show_analytics_panel()
+
+    # エクスポートタブ
+    with tab9:
+        show_export_panel()
+
+
+def show_performance_panel():
+    """処理時間・エラーの計測結果を表示"""
+    st.header("パフォーマンス")
+    st.write("アプリ起動後の処理時間とエラーの計測結果です（パーセンタイルは直近の計測分から算出）。")
+
+    if st.button("表示を更新", key="refresh_metrics"):
+        st.rerun()
+
+    metrics = get_metrics()
+    snapshot = metrics.snapshot()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("稼働時間", f"{snapshot['uptime_seconds'] / 3600:.1f}時間")
+    col2.metric("計測回数", sum(op["count"] for op in snapshot["operations"].values()))
+    col3.metric("エラー数", sum(op["errors"] for op in snapshot["operations"].values()))
+
+    if snapshot["operations"]:
+        import pandas as pd
+
+        df = pd.DataFrame(
+            [
+                {
+                    "処理": name,
+                    "回数": op["count"],
+                    "エラー": op["errors"],
+                    "平均(ms)": round(op["mean_ms"], 1),
+                    "p50(ms)": round(op["p50_ms"], 1),
+                    "p95(ms)": round(op["p95_ms"], 1),
+                    "p99(ms)": round(op["p99_ms"], 1),
+                    "最大(ms)": round(op["max_ms"], 1),
+                }
+                for name, op in snapshot["operations"].items()
+            ]
+        )
+        st.dataframe(df, width="stretch", hide_index=True)
+    else:
+        st.info("まだ計測結果がありません")
+
+    if snapshot["counters"] or snapshot["gauges"]:
+        st.subheader("カウンター")
+        st.json({**snapshot["counters"], **snapshot["gauges"]})
+
+    if snapshot["recent_errors"]:
+        st.subheader("直近のエラー")
+        for error in snapshot["recent_errors"][:20]:
+            timestamp = datetime.fromtimestamp(error["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
+            st.error(f"{timestamp} [{error['name']}] {error['message']}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="Prometheus形式でダウンロード",
+            data=metrics.to_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain",
+            width="stretch",
+        )
+    with col2:
+        st.download_button(
+            label="JSON形式でダウンロード",
+            data=metrics.to_json(),
+            file_name="metrics.json",
+            mime="application/json",
+            width="stretch",
+        )
+
+
+def show_profiler_panel():
+    """再実行のプロファイル結果を表示"""
+    st.header("プロファイラ")
+    st.write("再実行ごとの処理時間を区間（サイドバー・各ページ）別に集計し、フレームグラフ用のデータを出力します。")
+
+    # ページを移動してもウィジェットの状態が消えないように、設定は別のキーに保持する
+    st.checkbox(
+        "このセッションの再実行をプロファイル",
+        value=st.session_state.get("profiling_enabled", False),
+        key="profiling_toggle",
+        on_change=lambda: st.session_state.update(profiling_enabled=st.session_state.profiling_toggle),
+    )
+    st.checkbox(
+        "全セッションの再実行をプロファイル",
+        value=is_all_sessions_enabled(),
+        key="profiling_all_sessions_toggle",
+        on_change=lambda: set_all_sessions(st.session_state.profiling_all_sessions_toggle),
+        help="受講者の操作も計測します。サンプリング方式でも再実行がわずかに遅くなります。",
+    )
+    modes = [MODE_SAMPLING, MODE_CPROFILE]
+    st.radio(
+        "方式",
+        modes,
+        index=modes.index(get_mode()),
+        format_func=lambda mode: {
+            MODE_SAMPLING: "サンプリング（フレームグラフ用）",
+            MODE_CPROFILE: "cProfile（関数ごとの呼び出し回数・時間）",
+        }[mode],
+        key="profiling_mode",
+        on_change=lambda: set_mode(st.session_state.profiling_mode),
+        horizontal=True,
+    )
+
+    store = get_profile_store()
+    st.info(f"計測した再実行: {store.reruns}回")
+
+    summary = store.timing_summary()
+    if summary:
+        import pandas as pd
+
+        df = pd.DataFrame(summary)
+        df.columns = ["区間", "回数", "平均(ms)", "p50(ms)", "p95(ms)"]
+        st.dataframe(df.round(1), width="stretch", hide_index=True)
+
+        section = st.selectbox("所要時間の分布", [row["name"] for row in summary], key="profiling_section")
+        st.bar_chart(pd.DataFrame({"回数": store.histogram(section)}))
+
+    top_functions = store.top_functions()
+    if top_functions:
+        import pandas as pd
+
+        st.subheader("累積時間の大きい関数（cProfile）")
+        df = pd.DataFrame(top_functions)
+        df.columns = ["関数", "呼び出し回数", "自身の時間(ms)", "累積時間(ms)"]
+        st.dataframe(df.round(1), width="stretch", hide_index=True)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button(
+            label="フレームグラフ用データ（collapsed）",
+            data=store.folded_stacks(),
+            file_name="rerun.folded",
+            mime="text/plain",
+            width="stretch",
+            help="flamegraph.pl・speedscopeで読み込めます（サンプリング方式）",
+        )
+    with col2:
+        dump = store.cprofile_dump()
+        if dump is not None:
+            st.download_button(
+                label="cProfileの結果（.prof）",
+                data=dump,
+                file_name="rerun.prof",
+                mime="application/octet-stream",
+                width="stretch",
+                help="snakeviz・flameprofで読み込めます",
+            )
+    with col3:
+        if st.button("集計をリセット", key="reset_profile", width="stretch"):
+            store.reset()
+            st.rerun()
+
+
+def show_question_bank_panel():
+    """問題バンクの取り込み・書き出し・バージョン管理"""
+    st.header("問題バンク")
+
+    try:
+        bank = get_question_bank()
+    except Exception as e:
+        st.error(f"問題バンクの読み込み中にエラーが発生しました: {str(e)}")
+        return
+
+    st.info(f"出題中: バージョン{bank.version}（{len(bank)}問・{len(bank.categories())}カテゴリ）")
+
+    # 成功メッセージの表示（セッション状態から）
+    if st.session_state.get("question_bank_imported"):
+        st.success(st.session_state.question_bank_imported)
+        del st.session_state.question_bank_imported
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.subheader("取り込み")
+        with st.form("import_questions_form"):
+            uploaded = st.file_uploader(
+                "問題データ（JSON・JSONL）",
+                type=["json", "jsonl"],
+                help='JSONはリストまたは{"questions": [...]}、JSONLは1行に1問。'
+                "各問題にref_number・ref_page・category・text・answer_count・correct_answersが必要です。",
+            )
+            note = st.text_input("変更内容のメモ")
+            submitted = st.form_submit_button("新しいバージョンとして取り込む", width="stretch")
+            if submitted:
+                if uploaded is None:
+                    st.error("ファイルを選択してください")
+                else:
+                    try:
+                        questions = parse_questions(uploaded.getvalue().decode("utf-8"), uploaded.name)
+                        version = import_questions(questions, note or None, st.session_state.logged_in_email)
+                        if version == bank.version:
+                            st.info("出題中のバージョンと同じ内容のため、取り込みませんでした")
+                        else:
+                            st.session_state.question_bank_imported = (
+                                f"バージョン{version}として{len(questions)}問を取り込みました"
+                            )
+                            st.rerun()
+                    except Exception as e:
+                        st.error(f"取り込みに失敗しました: {str(e)}")
+
+    with col2:
+        st.subheader("書き出し")
+        st.download_button(
+            label=f"バージョン{bank.version}をダウンロード",
+            data=export_questions(),
+            file_name=f"question_bank_v{bank.version}.json",
+            mime="application/json",
+            width="stretch",
+        )
+
+    st.subheader("バージョン履歴")
+    versions = list_versions()
+    if versions:
+        import pandas as pd
+
+        df = pd.DataFrame(versions)
+        df.columns = ["バージョン", "問題数", "メモ", "取り込んだユーザー", "取り込み日時"]
+        st.dataframe(df, width="stretch", hide_index=True)
+
+        restore_target = st.selectbox(
+            "過去のバージョンに戻す",
+            [version["version"] for version in versions if version["version"] != bank.version],
+            key="restore_question_bank_version",
+        )
+        if restore_target is not None and st.button("このバージョンの内容で出題する", key="restore_question_bank"):
+            try:
+                version = restore_version(restore_target, st.session_state.logged_in_email)
+                st.session_state.question_bank_imported = f"バージョン{restore_target}の内容をバージョン{version}として取り込みました"
+                st.rerun()
+            except Exception as e:
+                st.error(f"復元に失敗しました: {str(e)}")
+
+
+def show_analytics_panel():
+    """ドリルの採点結果の分析を表示（回答送信ごとに更新される集計テーブルから読み込む）"""
+    import pandas as pd
+
+    st.header("分析")
+    st.write("QAドリルの採点結果の集計です。集計は回答送信ごとに更新されます。")
+
+    col1, col2 = st.columns([1, 5])
+    with col1:
+        if st.button("表示を更新", key="refresh_analytics", width="stretch"):
+            st.rerun()
+
+    overview = get_results_overview()
+    if not overview["submissions"]:
+        st.info("まだ採点結果がありません")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("回答送信数", overview["submissions"])
+    col2.metric("受講者数", overview["users"])
+    col3.metric("正答率", f"{overview['accuracy']:.1%}")
+
+    st.subheader("カテゴリごとの正答率")
+    categories = pd.DataFrame(get_category_analytics())
+    st.bar_chart(categories.set_index("category")["accuracy"], horizontal=True, x_label="正答率", y_label="カテゴリ")
+    st.dataframe(
+        categories.rename(columns={"category": "カテゴリ", "attempts": "解答数", "correct": "正解数", "accuracy": "正答率"}),
+        width="stretch",
+        hide_index=True,
+        column_config={"正答率": st.column_config.NumberColumn(format="percent")},
+    )
+
+    st.subheader("問題ごとの誤答率")
+    questions = pd.DataFrame(get_question_analytics())
+    st.dataframe(
+        questions[["ref_number", "category", "text", "attempts", "incorrect", "error_rate", "last_answered_at"]].rename(
+            columns={
+                "ref_number": "参照項番",
+                "category": "カテゴリ",
+                "text": "問題",
+                "attempts": "解答数",
+                "incorrect": "不正解数",
+                "error_rate": "誤答率",
+                "last_answered_at": "最終解答日時",
+            }
+        ),
+        width="stretch",
+        hide_index=True,
+        column_config={"誤答率": st.column_config.ProgressColumn(format="percent", min_value=0.0, max_value=1.0)},
+    )
+
+    st.subheader("判定段階ごとの回答数")
+    period = st.radio("期間", ["全期間", "直近30日", "直近7日"], horizontal=True, key="analytics_tier_period")
+    since_day = None
+    if period != "全期間":
+        days = 30 if period == "直近30日" else 7
+        since_day = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    tiers = get_tier_breakdown(since_day)
+    tier_rows = [
+        {"判定段階": label, "回答数": tiers.get(tier, 0)} for tier, label in TIER_ANALYTICS_LABELS.items()
+    ] + [{"判定段階": tier, "回答数": count} for tier, count in tiers.items() if tier not in TIER_ANALYTICS_LABELS]
+    tier_df = pd.DataFrame(tier_rows)
+    total_answers = tier_df["回答数"].sum()
+    tier_df["割合"] = tier_df["回答数"] / total_answers if total_answers else 0.0
+    st.dataframe(
+        tier_df,
+        width="stretch",
+        hide_index=True,
+        column_config={"割合": st.column_config.NumberColumn(format="percent")},
+    )
+
+    st.subheader("受講者ごとの進捗")
+    users = get_user_summaries()
+    st.dataframe(
+        pd.DataFrame(users).rename(
+            columns={
+                "email": "メールアドレス",
+                "submissions": "回答送信数",
+                "questions": "解答数",
+                "correct": "正解数",
+                "accuracy": "正答率",
+                "first_day": "初回受講日",
+                "last_day": "最終受講日",
+            }
+        ),
+        width="stretch",
+        hide_index=True,
+        column_config={"正答率": st.column_config.NumberColumn(format="percent")},
+    )
+    email = st.selectbox("受講者", [user["email"] for user in users], key="analytics_user")
+    progress = pd.DataFrame(get_user_progress(email))
+    if not progress.empty:
+        st.line_chart(progress.set_index("day")["accuracy"], x_label="日付", y_label="正答率")
+
+    with st.expander("集計の再構築"):
+        st.write("保存済みの採点結果から集計を作り直します（通常は不要です）。")
+        if st.button("集計を再構築", key="rebuild_analytics"):
+            with st.spinner("集計中..."):
+                refresh_aggregates()
+            st.success("集計を再構築しました")
+
+
+def export_command(export_format: str, email=None, start_day=None, end_day=None, categories=None) -> str:
+    """絞り込み条件に対応するscripts/export_results.pyのコマンドを作成"""
+    args = ["python", "src/scripts/export_results.py", f"qa_drill_results.{export_format}", "--format", export_format]
+    if email:
+        args += ["--email", email]
+    if start_day:
+        args += ["--start", start_day.isoformat()]
+    if end_day:
+        args += ["--end", end_day.isoformat()]
+    for category in categories or []:
+        args += ["--category", category]
+    return shlex.join(args)
+
+
+def show_export_panel():
+    """採点結果の一括ダウンロード"""
+    from pages.qa_drill import generate_report
+
+    st.header("エクスポート")
+    st.write("QAドリルの採点結果をまとめてダウンロードします。ファイルはダウンロードボタンを押したときに作成します。")
+
+    emails = [user["email"] for user in get_user_summaries()]
+    email = st.selectbox("受講者", [None] + emails, format_func=lambda e: "すべて" if e is None else e, key="export_user")
+    period = st.date_input("期間", value=(), key="export_period", help="未指定の場合は全期間")
+    categories = st.multiselect(
+        "カテゴリ", [row["category"] for row in get_category_analytics()], placeholder="すべて", key="export_categories"
+    )
+    export_format = st.radio(
+        "形式", list(EXPORT_FORMAT_LABELS), format_func=EXPORT_FORMAT_LABELS.get, horizontal=True, key="export_format"
+    )
+
+    # 期間は開始日だけ選んでいる途中の状態もある
+    start_day = period[0] if len(period) > 0 else None
+    end_day = period[1] if len(period) > 1 else start_day
+    filters = {"email": email, "start_day": start_day, "end_day": end_day, "categories": categories}
+
+    submissions, rows = count_result_rows(**filters)
+    st.caption(f"対象: 回答送信 {submissions}件（問題ごとの結果 {rows}行）")
+
+    # ダウンロードするファイルはアプリのプロセスのメモリに載るため、大量の結果はコマンドラインで書き出す
+    max_rows = get_max_download_rows()
+    too_large = rows > max_rows
+    if too_large:
+        st.warning(
+            f"対象が{max_rows}行を超えるため、この画面からはダウンロードできません。"
+            "サーバー上で以下のコマンドを実行してファイルに書き出してください。"
+        )
+        st.code(export_command(export_format, **filters), language="bash")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    st.download_button(
+        label="ダウンロード",
+        data=partial(export_results_bytes, export_format, generate_report, **filters),
+        file_name=f"qa_drill_results_{timestamp}.{export_format}",
+        mime=EXPORT_MIME_TYPES[export_format],
+        disabled=rows == 0 or too_large,
+        on_click="ignore",
+        key="export_download",
+    )
@@ -1,34 +1,53 @@
 import streamlit as st
-import os
-from langsmith import wrappers, traceable
-from auth import verify_login
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
+from typing import Dict, Optional
+from utils.chat_context import (
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_SUMMARY_MIN_MESSAGES,
+    ContextWindow,
+    build_context_window,
+    summarize_history,
+)
+from utils.metrics import record_error, timed
 from utils.openai_utils import get_openai_client
+from utils.prompt_registry import Prompt, get_prompt_registry
+from utils.streaming import DEFAULT_FLUSH_CHARS, DEFAULT_FLUSH_INTERVAL, StreamRenderer
 
+# チャットに使用するモデル
+CHAT_MODEL = "gpt-4o-mini"
 
-def load_system_prompts():
-    """システムプロンプトの読み込み"""
-    prompts = {}
+
+def get_chatbot_setting(name: str, default):
+    """チャットボット設定を取得（secrets.tomlの[chatbot]セクションで変更可能）"""
+    try:
+        return st.secrets.get("chatbot", {}).get(name, default)
+    except Exception:
+        return default
+
+
+def get_context_token_budget() -> int:
+    """1回のリクエストで送信するトークン数の上限を取得"""
+    try:
+        return int(get_chatbot_setting("context_token_budget", DEFAULT_CONTEXT_TOKEN_BUDGET))
+    except (TypeError, ValueError):
+        return DEFAULT_CONTEXT_TOKEN_BUDGET
+
+
+def create_stream_renderer(placeholder) -> StreamRenderer:
+    """描画間隔を設定から読み込んでストリーミング描画を作成"""
     try:
-        # 機能分類プロンプトの読み込み
-        function_classification_path = os.path.join("src", "prompts", "function_classification.md")
-        with open(function_classification_path, "r", encoding="utf-8") as f:
-            prompts["機能分類"] = {"content": f.read(), "type": "markdown"}
-
-        # テスト分類プロンプトの読み込み
-        test_classification_path = os.path.join("src", "prompts", "test_classification.md")
-        with open(test_classification_path, "r", encoding="utf-8") as f:
-            prompts["テスト分類"] = {"content": f.read(), "type": "markdown"}
-
-        # 評価シート作成プロンプトの読み込み
-        evaluation_sheet_path = os.path.join("src", "prompts", "evaluation_sheet.md")
-        with open(evaluation_sheet_path, "r", encoding="utf-8") as f:
-            prompts["評価シート作成"] = {"content": f.read(), "type": "markdown"}
-
-        return prompts
+        return StreamRenderer(
+            placeholder,
+            float(get_chatbot_setting("stream_flush_interval_ms", DEFAULT_FLUSH_INTERVAL * 1000)) / 1000,
+            int(get_chatbot_setting("stream_flush_chars", DEFAULT_FLUSH_CHARS)),
+        )
+    except (TypeError, ValueError):
+        return StreamRenderer(placeholder)
+
+
+def load_system_prompts() -> Dict[str, Prompt]:
+    """システムプロンプトの読み込み（プロセス共通のレジストリから取得し、ファイル更新時のみ再読み込み）"""
+    try:
+        return get_prompt_registry().get_all()
     except FileNotFoundError:
         st.error("システムプロンプトファイルが見つかりません。")
         st.info("管理者に連絡してください。")
@@ -39,60 +58,82 @@ def load_system_prompts():
         return {}
 
 
-def get_chat_response(system_prompt: str, user_input: str, message_placeholder, chat_history: list) -> str:
-    """ストリーミング対応のチャット応答を取得"""
+@timed("chatbot.get_chat_response")
+def get_chat_response(
+    system_prompt: str,
+    user_input: str,
+    message_placeholder,
+    chat_history: list,
+    context: Optional[ContextWindow] = None,
+    renderer: Optional[StreamRenderer] = None,
+) -> str:
+    """ストリーミング対応のチャット応答を取得
+
+    contextを省略した場合はトークン予算内に収まる直近の履歴から送信メッセージを組み立てる。
+    rendererを渡した場合は応答後にrenderer.statsで初回トークンまでの時間と生成速度を参照できる。
+    静的なシステムプロンプトを常に先頭に置くことで、プロバイダ側のプロンプトキャッシュが効くようにしている。
+    """
     try:
         # OpenAIクライアントの確認
         client = get_openai_client()
         if not client:
             return "OpenAIクライアントの初期化に失敗しました。"
 
-        # メッセージの準備
-        messages = [
-            SystemMessage(content=system_prompt),
-            *[
-                HumanMessage(content=msg["content"]) if msg["role"] == "user" else AIMessage(content=msg["content"])
-                for msg in chat_history[-5:]
-            ],
-            HumanMessage(content=user_input),
-        ]
-
-        # OpenAI APIに送信するためのメッセージ形式に変換
-        api_messages = [
-            {
-                "role": (
-                    "system"
-                    if isinstance(msg, SystemMessage)
-                    else "user" if isinstance(msg, HumanMessage) else "assistant"
-                ),
-                "content": msg.content,
-            }
-            for msg in messages
-        ]
-
-        # ストリーミングレスポンスの処理
-        response_text = ""
+        # メッセージの準備（履歴は新しいものからトークン予算内で詰める）
+        if context is None:
+            context = build_context_window(system_prompt, chat_history, user_input, get_context_token_budget())
+        api_messages = context.messages
+
+        # ストリーミングレスポンスの処理（差分はまとめて一定間隔で描画）
+        if renderer is None:
+            renderer = create_stream_renderer(message_placeholder)
+        renderer.start()
         for chunk in client.chat.completions.create(
             messages=api_messages,
-            model="gpt-4o-mini",
+            model=CHAT_MODEL,
             temperature=0,
             stream=True,
         ):
-            if chunk.choices[0].delta.content is not None:
-                response_text += chunk.choices[0].delta.content
-                if message_placeholder is not None:
-                    message_placeholder.markdown(response_text + "▌")
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                renderer.write(chunk.choices[0].delta.content)
 
-        if message_placeholder is not None:
-            message_placeholder.markdown(response_text)
-        return response_text
+        return renderer.finish()
 
     except Exception as e:
         error_msg = f"チャットレスポンスの取得中にエラーが発生しました: {str(e)}"
         st.error(error_msg)
+        record_error("chatbot.get_chat_response", e)
         return error_msg
 
 
+def format_response_caption(message: Dict) -> str:
+    """応答の下に表示するプロンプトのバージョンと応答速度"""
+    caption = f"プロンプト: {message['prompt_name']}（{message['prompt_version']}）"
+    if message.get("stream_stats"):
+        caption += f"　{message['stream_stats']}"
+    return caption
+
+
+def fold_chat_history(context: ContextWindow):
+    """予算外になった履歴を要約に統合する（[chatbot] summarize_history = true の場合のみ）"""
+    if not get_chatbot_setting("summarize_history", False):
+        return
+    if len(context.dropped) < int(get_chatbot_setting("summary_min_messages", DEFAULT_SUMMARY_MIN_MESSAGES)):
+        return
+
+    client = get_openai_client()
+    if not client:
+        return
+
+    summary = st.session_state.chat_summary
+    try:
+        summary["text"] = summarize_history(client, CHAT_MODEL, summary["text"], context.dropped)
+        summary["count"] = context.history_start
+    except Exception as e:
+        print(f"会話履歴の要約エラー: {str(e)}")
+        record_error("chatbot.summarize_history", e)
+
+
 def show_chatbot_page():
     """チャットボット画面を表示"""
     # 現在のページがチャットボットでない場合は即座に終了
@@ -104,21 +145,20 @@ def show_chatbot_page():
         st.error("ログインが必要です")
         st.stop()
 
-    # OpenAIクライアントの初期化
-    if "openai_client" not in st.session_state:
-        st.session_state.openai_client = get_openai_client()
-
     # メインコンテンツ
     st.title("QA Chatbot System")
 
-    # システムプロンプトの読み込みとセッション状態への保存
-    if "SYSTEM_PROMPTS" not in st.session_state:
-        st.session_state.SYSTEM_PROMPTS = load_system_prompts()
+    # システムプロンプトの読み込み（セッションには内容を保持しない）
+    system_prompts = load_system_prompts()
 
     # チャット履歴の初期化
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
+    # 予算外になった履歴の要約（countは要約済みの履歴の件数）
+    if "chat_summary" not in st.session_state:
+        st.session_state.chat_summary = {"text": None, "count": 0}
+
     # カテゴリ選択の説明を追加
     st.markdown(
         """
@@ -137,6 +177,8 @@ def show_chatbot_page():
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
+            if message.get("prompt_version"):
+                st.caption(format_response_caption(message))
 
     # ユーザー入力
     if user_input := st.chat_input("メッセージを入力してください"):
@@ -147,19 +189,43 @@ def show_chatbot_page():
 
         try:
             selected_category = st.session_state.get("chatbot_category")
-            if selected_category:
+            if selected_category in system_prompts:
                 # システムプロンプトの準備
-                system_prompt = st.session_state.SYSTEM_PROMPTS[selected_category]["content"]
+                prompt = system_prompts[selected_category]
+                system_prompt = prompt.content
+
+                # トークン予算内で送信するメッセージを組み立て
+                summary = st.session_state.chat_summary
+                context = build_context_window(
+                    system_prompt,
+                    st.session_state.messages,
+                    user_input,
+                    get_context_token_budget(),
+                    summary["text"],
+                    summary["count"],
+                )
 
                 # アシスタントのメッセージ枠を準備
                 with st.chat_message("assistant"):
                     message_placeholder = st.empty()
+                    renderer = create_stream_renderer(message_placeholder)
                     # ストリーミングで応答を取得・表示（チャット履歴も渡す）
                     response = get_chat_response(
-                        system_prompt, user_input, message_placeholder, st.session_state.messages
+                        system_prompt, user_input, message_placeholder, st.session_state.messages, context, renderer
                     )
-                    # チャット履歴に追加
-                    st.session_state.messages.append({"role": "assistant", "content": response})
+                    # チャット履歴に追加（使用したプロンプトのバージョンと応答速度も記録）
+                    message = {
+                        "role": "assistant",
+                        "content": response,
+                        "prompt_name": prompt.name,
+                        "prompt_version": prompt.version,
+                        "stream_stats": renderer.stats.describe() if renderer.stats else None,
+                    }
+                    st.caption(format_response_caption(message))
+                    st.session_state.messages.append(message)
+
+                # 応答の表示後に、予算外になった古い履歴を要約へ統合
+                fold_chat_history(context)
             else:
                 st.error("サイドバーからカテゴリを選択してください")
 
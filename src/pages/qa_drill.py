@@ -1,321 +1,259 @@
 import streamlit as st
-from typing import List, Dict
+from typing import List, Dict, Mapping, Optional, Sequence
 from utils.openai_utils import get_openai_client
-import os
+from utils.grading import (
+    DEFAULT_GRADING_MODE,
+    DEFAULT_MAX_CONCURRENCY,
+    GRADING_MODE_BATCH,
+    GRADING_MODE_PAIR,
+    AnswerVerdict,
+    ProblemGradingTask,
+    grade_problems,
+)
+from utils.grading_cache import get_grading_cache
+from utils.grading_queue import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_RUNNING,
+    GradingQueue,
+    get_grading_queue,
+)
+from utils.metrics import record_error, timed
+from utils.question_bank import QuestionBank, get_question_bank
+from utils.drill_assembler import MODE_ADAPTIVE, MODE_RANDOM, MODE_SEQUENTIAL, assemble_drill
+from utils.drill_results import get_submission, get_user_question_stats, list_submissions, load_submission
+from utils.answer_matcher import (
+    DEFAULT_REJECT_THRESHOLD,
+    TIER_CACHE,
+    TIER_EXACT,
+    TIER_LLM,
+    TIER_LOCAL,
+    AnswerMatcher,
+)
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
 import json
 
-# OpenAIクライアントの初期化
-if "openai_client" not in st.session_state:
-    st.session_state.openai_client = get_openai_client()
-
-
-def load_qa_problems() -> List[Dict]:
-    """QA問題データの読み込み"""
-    return [
-        {
-            "ref_number": "1.1",
-            "ref_page": "2～4",
-            "category": "テストとは何か？",
-            "text": "ソフトウェアが期待通りに動かないことによる不都合を4つ答えよ。",
-            "answer_count": 4,
-            "correct_answers": ["経済的な損失", "時間の浪費", "信用の失墜", "傷害と死亡事故"],
-            "evaluation_criteria": """
-            以下の基準で回答を評価してください：
-            1. 経済的損失に関する表現（金銭的損失、経済的影響なども可）
-            2. 時間的損失に関する表現（時間のロス、工数の無駄なども可）
-            3. 信用に関する表現（評判の低下、ブランドイメージの毀損なども可）
-            4. 人的被害に関する表現（人命に関わる事故、健康被害なども可）
-            """,
-        },
-        {
-            "ref_number": "1.1",
-            "ref_page": "4",
-            "category": "テストとは何か？",
-            "text": "テスト前実行作業を4つ答えよ。",
-            "answer_count": 4,
-            "correct_answers": ["テスト計画", "テスト分析", "テスト設計", "テスト実装"],
-        },
-        {
-            "ref_number": "1.1",
-            "ref_page": "5",
-            "category": "テストとは何か？",
-            "text": "テスト実行時の作業として、テスト実行の他にテスト工程で行うのは何か2つ答えよ。",
-            "answer_count": 2,
-            "correct_answers": ["実行結果のチェック", "テスト終了基準の評価"],
-        },
-        {
-            "ref_number": "1.1.1",
-            "ref_page": "9",
-            "category": "テストの目的",
-            "text": "テストのフェーズ、視点が異なっていると、テストの目的も異なります。主なテストの目的を9つ答えよ。",
-            "answer_count": 9,
-            "correct_answers": [
-                "要件、ユーザーストーリー、設計、およびコードなどの作業成果物の評価",
-                "明確にしたすべての要件を満たしていることの検証",
-                "テスト対象が完成し、ユーザーやその他ステークホルダーの期待通りの動作内容であることの妥当性確認",
-                "テスト対象の品質に対する信頼を積み重ねて、所定のレベルにあることの確証",
-                "欠陥の作り込みの防止",
-                "故障や欠陥の発見",
-                "ステークホルダーが意志決定できる、特にテスト対象の品質レベルについての十分な情報の提供",
-                "(以前に検出されなかつた故障が運用環境で発生するなどの)不適切なソフトウエア品質のリスクレベルの低減",
-                "契約上、法律上、または規則上の要件や標準を遵守する、そして/またはテスト対象がそのような要件や標準に準拠していることの検証",
-            ],
-        },
-        {
-            "ref_number": "1.2.3",
-            "ref_page": "21",
-            "category": "エラー、欠陥、および故障",
-            "text": "いくつかの原因から勘違いや思い込みが発生することにより、１つの成果物のみならず、他の欠陥を発生させることもある行為を、何と呼ぶか答えよ。",
-            "answer_count": 1,
-            "correct_answers": ["エラー"],
-        },
-        {
-            "ref_number": "1.2.3",
-            "ref_page": "22",
-            "category": "エラー、欠陥、および故障",
-            "text": "誤りによって、作業成果物やプログラムに埋め込んで実装されるものは何か答えよ。",
-            "answer_count": 1,
-            "correct_answers": ["欠陥"],
-        },
-        {
-            "ref_number": "1.2.3",
-            "ref_page": "22",
-            "category": "エラー、欠陥、および故障",
-            "text": "コンポーネントやシステムの問題により、実行されたプログラムに期待通りではない不正な結果が得られた場合、この結果のことを何と呼ぶか答えよ。",
-            "answer_count": 1,
-            "correct_answers": ["故障"],
-        },
-        {
-            "ref_number": "1.3.1",
-            "ref_page": "29",
-            "category": "ソフトウェアテストの原則",
-            "text": "テストの7原則、原則1においてテストで示すことが出来ないのは何か答えよ。",
-            "answer_count": 2,
-            "correct_answers": ["欠陥がないこと(もしくは故障しないこと)", "故障しない＝欠陥がない"],
-        },
-        {
-            "ref_number": "1.3.1",
-            "ref_page": "30",
-            "category": "ソフトウェアテストの原則",
-            "text": "テストの7原則、原則2において全数テストが不可能なためテストの現場ではソフトウェアの性質や目的、使われ方などからどのようにテストを行うか2つ答えよ。",
-            "answer_count": 2,
-            "correct_answers": ["重点的にテストする場所を絞る", "優先順位を決める"],
-        },
-        {
-            "ref_number": "1.3.1",
-            "ref_page": "31",
-            "category": "ソフトウェアテストの原則",
-            "text": "テストの7原則、原則3において欠陥を見つけるのが遅くなった際のリスクを4つ答えよ。",
-            "answer_count": 4,
-            "correct_answers": [
-                "欠陥を特定するのに時間がかかる",
-                "欠陥の修正に時間がかかってしまう",
-                "間違った直し方をされる可能性がある",
-                "他のソフトウェアに流用された場合は関連する箇所を探すのに時間がかかる",
-            ],
-        },
-        {
-            "ref_number": "1.3.1",
-            "ref_page": "32",
-            "category": "ソフトウェアテストの原則",
-            "text": "テストの7原則、原則4において効率的にテストを行うために何に基づいて重点的にテストをする箇所を絞り込むのがよいか。",
-            "answer_count": 1,
-            "correct_answers": ["予測結果"],
-        },
-        {
-            "ref_number": "1.3.1",
-            "ref_page": "33",
-            "category": "ソフトウェアテストの原則",
-            "text": "テストの7原則、原則5において『殺虫剤のパラドックス』の意味として耐性の出来てしまった害虫に対して、新しい成分の殺虫剤を開発していくことに置き換えているのは何か答えよ。",
-            "answer_count": 1,
-            "correct_answers": ["新しい内容のテストを常に作っていくこと"],
-        },
-        {
-            "ref_number": "1.3.1",
-            "ref_page": "33",
-            "category": "ソフトウェアテストの原則",
-            "text": "テストの7原則、原則6において、全てのソフトウェアやソフトウェア開発ライフサイクルにないものは何か答えよ。",
-            "answer_count": 1,
-            "correct_answers": ["共通するテスト設計、テストの方法"],
-        },
-        {
-            "ref_number": "1.3.1",
-            "ref_page": "34",
-            "category": "ソフトウェアテストの原則",
-            "text": "テストの7原則、原則7において修正を行う際に確認するべき大切な作業は何か2つ答えよ。",
-            "answer_count": 2,
-            "correct_answers": ["性能や機能に影響はないかどうか", "システム全体に影響はないかどうか"],
-        },
-        {
-            "ref_number": "2.1.1",
-            "ref_page": "85",
-            "category": "ソフトウェアテストの原則",
-            "text": "ウォーターフォールモデルのどのような順番で開発が進んでいくか、上流工程から順に4工程を答えよ。",
-            "answer_count": 4,
-            "correct_answers": ["要件定義", "設計", "コーディング", "テスト"],
-        },
-        {
-            "ref_number": "2.1.1",
-            "ref_page": "86",
-            "category": "V字モデル(シーケンシャルモデル)",
-            "text": "V字モデルのテスト工程はどのように分けられるか上流工程からの工程順に4つ答えよ。",
-            "answer_count": 4,
-            "correct_answers": ["コンポーネントテスト", "統合テスト", "システムテスト", "受け入れテスト"],
-        },
-        {
-            "ref_number": "2.2.3",
-            "ref_page": "110",
-            "category": "システムテスト テストタイプ",
-            "text": "統合テストで行われるテストのタイプは、何テストが含まれるか、４つ答えよ。",
-            "answer_count": 4,
-            "correct_answers": ["機能テスト", "非機能テスト", "ホワイトボックステスト", "リグレッションテスト"],
-        },
-        {
-            "ref_number": "2.3.1",
-            "ref_page": "122",
-            "category": "機能テスト",
-            "text": "テスト工程では観点を定めてテストを行います。機能テストではどういった観点でテストを行うか答えよ。",
-            "answer_count": 1,
-            "correct_answers": ["機能が仕様通りに実装されているか"],
-        },
-        {
-            "ref_number": "2.3.2",
-            "ref_page": "125",
-            "category": "非機能テスト",
-            "text": "非機能テストの目的とは何か、答えよ。",
-            "answer_count": 1,
-            "correct_answers": [
-                "コンポーネントやシステムの特性、例えば性能、使用性やセキュリティなどの特性を評価すること"
-            ],
-        },
-        {
-            "ref_number": "2.3.2",
-            "ref_page": "126",
-            "category": "非機能テスト",
-            "text": "使用性テスト（usability testing）で評価するのはなにか答えよ。",
-            "answer_count": 1,
-            "correct_answers": [
-                "特定のユーザーが特定の使用状況の下でシステムを使用する際の有効性、効率性、および満足度の度合い"
-            ],
-        },
-        {
-            "ref_number": "2.3.2",
-            "ref_page": "127",
-            "category": "非機能テスト",
-            "text": "非機能テストはどのテストレベルで実施することが出来るか、4つのレベルを答えよ。",
-            "answer_count": 4,
-            "correct_answers": [
-                "コンポーネントテストレベル",
-                "統合テストレベル",
-                "システムテストレベル",
-                "受け入れテストレベル",
-            ],
-        },
-        {
-            "ref_number": "2.3.4",
-            "ref_page": "132",
-            "category": "変更部分のテスト",
-            "text": "確認テストの実施タイミングを答えよ。",
-            "answer_count": 1,
-            "correct_answers": ["欠陥を修正した後"],
-        },
-        {
-            "ref_number": "2.4",
-            "ref_page": "139",
-            "category": "回帰テスト",
-            "text": "メンテナンステストで実施しなければならないテストの範囲を決める要因には何があるか、３つ答えよ。",
-            "answer_count": 3,
-            "correct_answers": ["変更のリスクの度合い", "現状システムの規模", "変更の規模"],
-        },
-        {
-            "ref_number": "2.4.1",
-            "ref_page": "140",
-            "category": "メンテナンス（保守）テスト",
-            "text": "保守テストを行わなければならないケースを4つ答えよ。",
-            "answer_count": 4,
-            "correct_answers": [
-                "ソフトウェアの変更作業を行ったとき",
-                "ソフトウェアの運用環境が変わったとき",
-                "新しい環境への移行作業を行ったとき",
-                "ソフトウェアを廃棄したとき",
-            ],
-        },
-        {
-            "ref_number": "2.4.2",
-            "ref_page": "142",
-            "category": "メンテナンスの影響度分析",
-            "text": "影響度分析とは何か、答えよ。",
-            "answer_count": 1,
-            "correct_answers": [
-                "さまざまなメンテナンスを行い、ソフトウェアやシステムをリリースする際には、それぞれのケースにおける作業(変更、追加、削除など)による影響を調べること"
-            ],
-        },
-    ]
+# 1ページに表示する問題数の既定値（secrets.tomlの[drill] page_sizeで変更可能、0で全問を1ページに表示）
+DEFAULT_PAGE_SIZE = 5
+
+# 1回のドリルで出題する問題数の既定値（secrets.tomlの[drill] drill_sizeで変更可能、0で条件に合う全問）
+DEFAULT_DRILL_SIZE = 0
+
+# 出題方式の表示名
+DRILL_MODE_LABELS = {
+    MODE_SEQUENTIAL: "順番通り",
+    MODE_RANDOM: "ランダム",
+    MODE_ADAPTIVE: "苦手な問題を優先",
+}
+
+# 1問ずつの採点・ページ移動時の先行採点に使うスレッド数
+BACKGROUND_WORKERS = 4
+
+# バックグラウンド採点の完了を確認する間隔（秒）
+GRADING_POLL_INTERVAL = 1.0
+
+# 採点キューに入れた回答送信の完了を確認する間隔（秒）
+SUBMISSION_POLL_INTERVAL = 2.0
+
+_background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="drill-grading")
+
+
+@dataclass
+class GradingJob:
+    """バックグラウンドで実行中の1問分の採点"""
+
+    answers: tuple  # 採点した回答（回答が変更された場合は結果を表示しない）
+    future: Future
 
 
-def evaluate_answer(user_answer: str, correct_answer: str, evaluation_criteria: str = None) -> bool:
-    """LLMを使用して回答を評価"""
+def load_qa_problems() -> Sequence[Mapping]:
+    """QA問題データの読み込み（問題バンクから取得し、プロセスごとに1回だけ読み込む）"""
+    return get_question_bank().questions
+
+
+def get_drill_problems() -> List[Mapping]:
+    """現在のドリルの問題を出題順に取得（ドリル未作成の場合は全問を順番通りに出題）"""
+    bank = get_question_bank()
+    question_ids = st.session_state.get("drill_question_ids")
+    if question_ids is None:
+        return list(bank.questions)
+    # 問題バンクの更新で削除された問題は除く
+    return [problem for problem in map(bank.get, question_ids) if problem is not None]
+
+
+# 判定段階ごとのレポート表示
+TIER_LABELS = {
+    TIER_EXACT: "【正解】完全一致",
+    TIER_LOCAL: "【正解】表記ゆれを除いて一致",
+    TIER_CACHE: "【正解】AI採点による意味が一致（採点済みの結果を再利用）",
+    TIER_LLM: "【正解】AI採点による意味が一致",
+}
+
+
+def get_grading_setting(name: str, default):
+    """採点設定を取得（secrets.tomlの[grading]セクションで変更可能）"""
     try:
-        client = get_openai_client()
-        if not client:
-            st.error("OpenAIクライアントの初期化に失敗しました")
-            return False
-
-        # システムプロンプトの作成
-        system_prompt = (
-            "あなたはテスト技術の専門家です。ユーザーの回答が模範解答と意味的に一致しているかを判断してください。"
-        )
-        if evaluation_criteria:
-            system_prompt += f"\n\n評価基準：\n{evaluation_criteria}"
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt,
-                },
-                {
-                    "role": "user",
-                    "content": f"ユーザーの回答: {user_answer}\n模範解答: {correct_answer}\nこれらは意味的に一致していますか？YesまたはNoで答えてください。",
-                },
-            ],
-        )
-        return response.choices[0].message.content.strip().lower() == "yes"
-    except Exception as e:
-        st.error(f"回答の評価中にエラーが発生しました: {str(e)}")
-        return False
+        return st.secrets.get("grading", {}).get(name, default)
+    except Exception:
+        return default
 
 
-def check_answers(problem: Dict, user_answers: List[str]) -> tuple[bool, str]:
-    """回答をチェックして結果を返す"""
+def get_grading_concurrency() -> int:
+    """採点時のLLM同時リクエスト数を取得"""
+    try:
+        return max(1, int(get_grading_setting("max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_CONCURRENCY
+
+
+def get_grading_mode() -> str:
+    """採点モードを取得（batch: 1問1リクエスト、pair: 回答の組ごとに1リクエスト）"""
+    mode = get_grading_setting("mode", DEFAULT_GRADING_MODE)
+    return mode if mode in (GRADING_MODE_BATCH, GRADING_MODE_PAIR) else DEFAULT_GRADING_MODE
+
+
+def get_drill_setting(name: str, default):
+    """ドリル表示の設定を取得（secrets.tomlの[drill]セクションで変更可能）"""
+    try:
+        return st.secrets.get("drill", {}).get(name, default)
+    except Exception:
+        return default
+
+
+def get_page_size() -> int:
+    """1ページに表示する問題数を取得（0は全問を1ページに表示）"""
+    try:
+        return max(0, int(get_drill_setting("page_size", DEFAULT_PAGE_SIZE)))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def get_drill_size() -> int:
+    """1回のドリルで出題する問題数の既定値を取得（0は条件に合う全問）"""
+    try:
+        return max(0, int(get_drill_setting("drill_size", DEFAULT_DRILL_SIZE)))
+    except (TypeError, ValueError):
+        return DEFAULT_DRILL_SIZE
+
+
+def get_answer_matcher() -> AnswerMatcher:
+    """ローカル判定のしきい値を設定から読み込んでマッチャーを作成"""
+    reject_threshold = get_grading_setting("local_reject_threshold", DEFAULT_REJECT_THRESHOLD)
+    try:
+        return AnswerMatcher(float(reject_threshold) if reject_threshold is not None else None)
+    except (TypeError, ValueError):
+        return AnswerMatcher()
+
+
+def make_result(user_answers: List[str], is_correct: bool, message: str, verdicts: List[AnswerVerdict]) -> Dict:
+    """1問分の採点結果を作成"""
+    return {"is_correct": is_correct, "message": message, "user_answers": user_answers, "verdicts": verdicts}
+
+
+def precheck_answers(problem: Dict, user_answers: List[str]) -> Optional[Dict]:
+    """回答全体を比較するだけで判定できる場合は結果を返す（判定できない場合はNone）"""
     if len(user_answers) != len(problem["correct_answers"]):
-        return False, "回答数が正しくありません。"
+        return make_result(user_answers, False, "回答数が正しくありません。", [AnswerVerdict(a) for a in user_answers])
 
     # 完全一致チェック
     if sorted(user_answers) == sorted(problem["correct_answers"]):
-        return True, "正解です！"
+        return make_result(
+            user_answers, True, "正解です！", [AnswerVerdict(a, a, tier=TIER_EXACT) for a in user_answers]
+        )
 
-    # 部分一致チェック
-    correct_count = 0
-    evaluation_criteria = problem.get("evaluation_criteria")
-    for user_ans, correct_ans in zip(sorted(user_answers), sorted(problem["correct_answers"])):
-        if evaluate_answer(user_ans, correct_ans, evaluation_criteria):
-            correct_count += 1
-
-    if correct_count == len(problem["correct_answers"]):
-        return True, "正解です！（意味的に一致）"
+    return None
+
+
+def build_grading_task(problem: Dict, user_answers: List[str]) -> ProblemGradingTask:
+    """部分一致チェック用の採点タスクを作成"""
+    return ProblemGradingTask(user_answers, list(problem["correct_answers"]), problem.get("evaluation_criteria"))
+
+
+@timed("qa_drill.grade_with_llm")
+def grade_with_llm(tasks: List[ProblemGradingTask]) -> List[List[AnswerVerdict]]:
+    """採点タスクを評価（ローカル判定・キャッシュで決まらない回答のみLLMに並列で問い合わせる）"""
+    if not tasks:
+        return []
+
+    return grade_problems(
+        get_openai_client(),
+        tasks,
+        get_grading_mode(),
+        get_grading_concurrency(),
+        get_grading_cache(),
+        get_answer_matcher(),
+    )
+
+
+def summarize_grading(
+    problem: Dict, user_answers: List[str], verdicts: List[AnswerVerdict], show_errors: bool = True
+) -> Dict:
+    """回答ごとの判定結果から問題ごとの採点結果を作成（show_errors=Falseの場合は画面にエラーを表示しない）"""
+    errors = {verdict.error for verdict in verdicts if verdict.error}
+    for error in errors:
+        if show_errors:
+            st.error(f"回答の評価中にエラーが発生しました: {error}")
+        record_error("qa_drill.grading", error)
+
+    correct_count = sum(1 for verdict in verdicts if verdict.is_correct)
+    if correct_count != len(problem["correct_answers"]):
+        message = f"不正解です。（{correct_count}/{len(problem['correct_answers'])}が正解）"
+        return make_result(user_answers, False, message, verdicts)
+
+    tiers = {verdict.tier for verdict in verdicts}
+    if tiers <= {TIER_EXACT}:
+        message = "正解です！"
+    elif tiers <= {TIER_EXACT, TIER_LOCAL}:
+        message = "正解です！（表記ゆれを除いて一致）"
     else:
-        return False, f"不正解です。（{correct_count}/{len(problem['correct_answers'])}が正解）"
+        message = "正解です！（意味的に一致）"
+    return make_result(user_answers, True, message, verdicts)
 
 
-def generate_report(problems: List[Dict], results: List[Dict]) -> str:
-    """採点結果のレポートを生成"""
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def grade_answers(problem: Dict, user_answers: List[str], show_errors: bool = True) -> Dict:
+    """1問分の回答を採点して結果を返す"""
+    result = precheck_answers(problem, user_answers)
+    if result is not None:
+        return result
+
+    # 部分一致チェック
+    verdicts = grade_with_llm([build_grading_task(problem, user_answers)])[0]
+    return summarize_grading(problem, user_answers, verdicts, show_errors)
+
+
+def check_answers(problem: Dict, user_answers: List[str]) -> tuple[bool, str]:
+    """回答をチェックして結果を返す"""
+    result = grade_answers(problem, user_answers)
+    return result["is_correct"], result["message"]
+
+
+def classify_result(result: Dict) -> str:
+    """採点結果を完全一致・表記ゆれ・意味一致・不正解に分類"""
+    if not result["is_correct"]:
+        return "incorrect"
+    tiers = {verdict.tier for verdict in result["verdicts"]}
+    if tiers <= {TIER_EXACT}:
+        return "exact"
+    if tiers <= {TIER_EXACT, TIER_LOCAL}:
+        return "local"
+    return "semantic"
+
+
+@timed("qa_drill.generate_report")
+def generate_report(
+    problems: List[Dict], results: List[Dict], email: Optional[str] = None, generated_at: Optional[str] = None
+) -> str:
+    """採点結果のレポートを生成（受験者・日時を省略した場合はログイン中のユーザー・現在日時）"""
+    now = generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    email = email or st.session_state.get("logged_in_email", "未ログイン")
 
     # 採点結果の集計
     exact_match = 0
+    local_match = 0
     semantic_match = 0
     incorrect = 0
     semantic_match_details = []
@@ -323,26 +261,29 @@ def generate_report(problems: List[Dict], results: List[Dict]) -> str:
 
     report = f"""QAドリル採点結果レポート
 生成日時: {now}
-受験者: {st.session_state.get('logged_in_email', '未ログイン')}
+受験者: {email}
 
 === 採点結果サマリー ===
 """
 
     # 各問題の結果を分析
     for i, (problem, result) in enumerate(zip(problems, results)):
-        if result["is_correct"]:
-            if result["message"] == "正解です！":
-                exact_match += 1
-            else:
-                semantic_match += 1
-                semantic_match_details.append((i + 1, problem, result))
+        classification = classify_result(result)
+        if classification == "exact":
+            exact_match += 1
+        elif classification == "local":
+            local_match += 1
+        elif classification == "semantic":
+            semantic_match += 1
+            semantic_match_details.append((i + 1, problem, result))
         else:
             incorrect += 1
             incorrect_details.append((i + 1, problem, result))
 
     report += f"""【正解】完全一致：{exact_match}
+【正解】表記ゆれを除いて一致：{local_match}
 【正解】AI採点による意味の一致：{semantic_match}
-【不正解】どちらにも当てはまらない：{incorrect}
+【不正解】どれにも当てはまらない：{incorrect}
 
 """
 
@@ -376,12 +317,12 @@ def generate_report(problems: List[Dict], results: List[Dict]) -> str:
 結果: {'正解' if result['is_correct'] else '不正解'}
 ユーザーの回答と採点: """
 
-        for j, user_ans in enumerate(result["user_answers"]):
-            report += f"\n {j+1}.{user_ans}"
-            if user_ans == problem["correct_answers"][j]:
-                report += "\n  採点結果：【正解】完全一致"
-            elif result["is_correct"] and "意味的に一致" in result["message"]:
-                report += "\n  採点結果：【正解】AI採点による意味が一致"
+        for j, verdict in enumerate(result["verdicts"]):
+            report += f"\n {j+1}.{verdict.user_answer}"
+            if verdict.is_correct:
+                report += f"\n  採点結果：{TIER_LABELS.get(verdict.tier, '【正解】')}"
+            elif verdict.error:
+                report += "\n  採点結果：【不正解】（採点エラー）"
             else:
                 report += "\n  採点結果：【不正解】"
         report += "\n\n"
@@ -389,32 +330,103 @@ def generate_report(problems: List[Dict], results: List[Dict]) -> str:
     return report
 
 
-def save_report(report: str) -> str:
-    """レポートをファイルに保存"""
+def render_submission_report(submission_id: int) -> str:
+    """保存した採点結果からレポートを生成（ダウンロード時に呼ばれる）"""
+    loaded = load_submission(submission_id)
+    if loaded is None:
+        return ""
+    submission, problems, results = loaded
+    return generate_report(problems, results, submission["email"], submission["submitted_at"])
+
+
+def report_file_name(submission: Dict) -> str:
+    """レポートのファイル名（ユーザー名と送信日時を含む）"""
+    user_name = submission["email"].split("@")[0]  # メールアドレスのドメイン部分を除去
+    timestamp = datetime.fromisoformat(submission["submitted_at"]).strftime("%Y%m%d_%H%M%S")
+    return f"qa_drill_report_{user_name}_{timestamp}.txt"
+
+
+def show_report_download(submission: Dict, key: str):
+    """レポートのダウンロードボタンを表示（レポートはボタンを押したときに生成）"""
+    st.download_button(
+        label="レポートをダウンロード",
+        data=partial(render_submission_report, submission["id"]),
+        file_name=report_file_name(submission),
+        mime="text/plain",
+        key=key,
+        on_click="ignore",
+    )
+
+
+def show_submission_history():
+    """過去の採点結果の一覧とレポートのダウンロードを表示"""
     try:
-        # レポート保存用のディレクトリを作成
-        reports_dir = os.path.join("reports")
-        os.makedirs(reports_dir, exist_ok=True)
-
-        # ファイル名を生成（タイムスタンプとユーザーメールを含む）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        user_email = st.session_state.get("logged_in_email", "anonymous")
-        user_email = user_email.split("@")[0]  # メールアドレスのドメイン部分を除去
-        filename = f"qa_drill_report_{user_email}_{timestamp}.txt"
-        filepath = os.path.join(reports_dir, filename)
-
-        # レポートを保存
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(report)
-
-        return filepath
+        submissions = list_submissions(st.session_state.get("logged_in_email", "anonymous"))
     except Exception as e:
-        st.error(f"レポートの保存中にエラーが発生しました: {str(e)}")
-        return None
+        print(f"採点結果の一覧取得エラー: {str(e)}")
+        record_error("qa_drill.list_submissions", e)
+        return
+    if not submissions:
+        return
+
+    with st.expander("過去の採点結果", expanded=False):
+        submission = st.selectbox(
+            "採点結果",
+            submissions,
+            format_func=lambda s: f"#{s['id']} {s['submitted_at']}（{s['correct_count']} / {s['question_count']}問正解）",
+        )
+        show_report_download(submission, key="history_report_download")
+
+
+def get_saved_answers(question_id: str) -> tuple:
+    """保存済みの回答欄の入力を取得（未入力の問題は空のタプル）"""
+    return st.session_state.get("drill_answers", {}).get(question_id, ())
+
+
+def save_answers(question_id: str, answers: List[str]):
+    """回答欄の入力を保存（ページを移動してウィジェットが消えても残るように、問題IDごとにまとめて保持）
+
+    問題バンクの更新で問題の並びが変わっても別の問題の回答にならないよう、出題順ではなく問題IDで保持する。
+    """
+    drill_answers = st.session_state.setdefault("drill_answers", {})
+    if any(answers):
+        drill_answers[question_id] = tuple(answers)
+    else:
+        drill_answers.pop(question_id, None)
 
 
-def show_question(question: Dict, index: int):
-    """問題の表示"""
+def start_grading(problem: Dict, user_answers: List[str]):
+    """1問分の採点をバックグラウンドで開始（結果は問題IDごとにgrading_jobsに保持）"""
+    future = _background_executor.submit(grade_answers, problem, user_answers, False)
+    st.session_state.setdefault("grading_jobs", {})[problem["id"]] = GradingJob(tuple(user_answers), future)
+
+
+def show_grading_result(question_id: str, user_answers: List[str]):
+    """1問分の採点結果を表示（採点中の場合はその旨を表示）"""
+    job = st.session_state.get("grading_jobs", {}).get(question_id)
+    if job is None or job.answers != tuple(user_answers):
+        return
+
+    if not job.future.done():
+        st.info("採点中...（他の問題の回答を続けられます）")
+        return
+
+    try:
+        result = job.future.result()
+    except Exception as e:
+        st.error(f"回答の評価中にエラーが発生しました: {str(e)}")
+        return
+
+    for error in {verdict.error for verdict in result["verdicts"] if verdict.error}:
+        st.error(f"回答の評価中にエラーが発生しました: {error}")
+    if result["is_correct"]:
+        st.success(result["message"])
+    else:
+        st.error(result["message"])
+
+
+def show_question(question: Dict, index: int) -> bool:
+    """問題の表示（フォーム内に配置し、採点ボタンが押された場合はTrueを返す）"""
     # 問題ヘッダー
     st.markdown(
         f"""
@@ -427,43 +439,302 @@ def show_question(question: Dict, index: int):
         unsafe_allow_html=False,
     )
 
-    # 解答欄
+    # 解答欄（別のページから戻ってきた場合は保存済みの回答を復元）
     st.markdown("##### 解答欄：")
-    user_answers = []
+    saved_answers = get_saved_answers(question["id"])
+    inputs = []
     for i in range(question["answer_count"]):
-        key = f"q{index}_answer_{i}"
-        answer = st.text_input(f"回答 {i+1}", key=key)
-        if answer:
-            user_answers.append(answer)
-
-    # 採点ボタン
-    if st.button(f"採点（問題{index + 1}）", key=f"grade_{index}"):
-        is_correct, message = check_answers(question, user_answers)
-        if is_correct:
-            st.success(message)
-        else:
-            st.error(message)
+        key = f"q{question['id']}_answer_{i}"
+        if key not in st.session_state and i < len(saved_answers):
+            st.session_state[key] = saved_answers[i]
+        inputs.append(st.text_input(f"回答 {i+1}", key=key))
+    save_answers(question["id"], inputs)
+    user_answers = [answer for answer in inputs if answer]
+
+    # 採点ボタン（押されたらフォームの入力を確定し、採点はバックグラウンドで行う）
+    grade_clicked = st.form_submit_button(f"採点（問題{index + 1}）", key=f"grade_{index}")
+    if grade_clicked:
+        start_grading(question, user_answers)
+    show_grading_result(question["id"], user_answers)
 
     st.markdown("---")
+    return grade_clicked
 
 
-def evaluate_all_answers(problems: List[Dict]) -> List[Dict]:
-    """全ての回答を評価"""
-    results = []
-    for i, problem in enumerate(problems):
+def has_pending_grading() -> bool:
+    """バックグラウンドで採点中の問題があるか"""
+    return any(not job.future.done() for job in st.session_state.get("grading_jobs", {}).values())
+
+
+def watch_grading_jobs():
+    """採点中の問題があれば一定間隔で確認し、全て終わったら画面全体を再実行して結果を表示"""
+    if not has_pending_grading():
+        return
+
+    def poll():
+        if not has_pending_grading():
+            st.rerun(scope="app")
+
+    st.fragment(poll, run_every=GRADING_POLL_INTERVAL)()
+
+
+def get_page_count(problem_count: int, page_size: int) -> int:
+    """ページ数を取得"""
+    if page_size <= 0 or problem_count == 0:
+        return 1
+    return (problem_count + page_size - 1) // page_size
+
+
+def get_page_indexes(problem_count: int, page: int, page_size: int) -> range:
+    """ページに表示する問題番号の範囲を取得"""
+    if page_size <= 0:
+        return range(problem_count)
+    return range(page * page_size, min(problem_count, (page + 1) * page_size))
+
+
+def find_unanswered(problems: List[Dict], indexes: range) -> List[int]:
+    """回答欄に空欄が残っている問題番号を取得"""
+    unanswered = []
+    for index in indexes:
+        filled = sum(1 for answer in get_saved_answers(problems[index]["id"]) if answer.strip())
+        if filled < problems[index]["answer_count"]:
+            unanswered.append(index)
+    return unanswered
+
+
+def prefetch_grading(problems: List[Dict], indexes: range):
+    """回答済みのページをバックグラウンドで先行採点する（結果は採点キャッシュに残り、送信時の採点が速くなる）"""
+    all_user_answers = collect_user_answers(problems)
+    tasks = [
+        build_grading_task(problems[index], all_user_answers[index])
+        for index in indexes
+        if all_user_answers[index] and precheck_answers(problems[index], all_user_answers[index]) is None
+    ]
+    if not tasks:
+        return
+
+    def report_error(future):
+        if future.exception() is not None:
+            record_error("qa_drill.prefetch_grading", future.exception())
+
+    _background_executor.submit(grade_with_llm, tasks).add_done_callback(report_error)
+
+
+def show_page_navigation(problems: List[Dict], page: int, page_count: int, page_size: int) -> Optional[int]:
+    """ページ移動ボタンと回答状況を表示（フォーム内に配置し、移動先のページ番号を返す）"""
+    indexes = get_page_indexes(len(problems), page, page_size)
+    answered = len(problems) - len(find_unanswered(problems, range(len(problems))))
+
+    target = None
+    col1, col2, col3 = st.columns([1, 3, 1])
+    with col1:
+        if st.form_submit_button("← 前のページ", key="drill_prev_page", disabled=page == 0, width="stretch"):
+            target = page - 1
+    with col2:
+        st.markdown(f"ページ {page + 1} / {page_count}（回答済み {answered} / {len(problems)}問）")
+    with col3:
+        if st.form_submit_button(
+            "次のページ →", key="drill_next_page", disabled=page >= page_count - 1, width="stretch"
+        ):
+            if get_drill_setting("prefetch_grading", True):
+                prefetch_grading(problems, indexes)
+            target = page + 1
+
+    unanswered = find_unanswered(problems, indexes)
+    if unanswered:
+        st.caption("このページの未回答: " + "、".join(f"問題{index + 1}" for index in unanswered))
+    return target
+
+
+def collect_user_answers(problems: List[Dict]) -> List[List[str]]:
+    """セッション状態から全問題分の回答を取得（空欄は除く）"""
+    all_user_answers = []
+    for problem in problems:
         user_answers = []
-        for j in range(problem["answer_count"]):
-            key = f"q{i}_answer_{j}"
-            answer = st.session_state.get(key, "").strip()
+        for answer in get_saved_answers(problem["id"]):
+            answer = answer.strip()
             if answer:
                 user_answers.append(answer)
+        all_user_answers.append(user_answers)
+    return all_user_answers
+
+
+@timed("qa_drill.grade_submission")
+def grade_submission(
+    problems: List[Dict], all_user_answers: List[List[str]], show_errors: bool = True
+) -> List[Dict]:
+    """全問題分の回答を採点
+
+    LLMによる判定が必要な回答は全問題分をまとめて並列に問い合わせる。
+    各回答の判定結果（verdicts）には判定を確定させた段階（tier）が記録される。
+    """
+    prechecked = []
+    tasks = []
+    for problem, user_answers in zip(problems, all_user_answers):
+        result = precheck_answers(problem, user_answers)
+        prechecked.append(result)
+        if result is None:
+            tasks.append(build_grading_task(problem, user_answers))
 
-        is_correct, message = check_answers(problem, user_answers)
-        results.append({"is_correct": is_correct, "message": message, "user_answers": user_answers})
+    graded = iter(grade_with_llm(tasks))
+
+    results = []
+    for problem, user_answers, result in zip(problems, all_user_answers, prechecked):
+        if result is None:
+            result = summarize_grading(problem, user_answers, next(graded), show_errors)
+        results.append(result)
 
     return results
 
 
+def evaluate_all_answers(problems: List[Dict]) -> List[Dict]:
+    """全ての回答を評価"""
+    return grade_submission(problems, collect_user_answers(problems))
+
+
+def get_submission_queue() -> GradingQueue:
+    """回答送信の採点キューを取得（採点はワーカースレッドで行うため画面にはエラーを表示しない）"""
+    return get_grading_queue(partial(grade_submission, show_errors=False))
+
+
+def enqueue_submission(problems: List[Dict]) -> Optional[int]:
+    """全ての回答を採点キューに入れて受付番号を返す（失敗した場合はNone）"""
+    try:
+        return get_submission_queue().enqueue(
+            st.session_state.get("logged_in_email", "anonymous"),
+            problems,
+            collect_user_answers(problems),
+            get_question_bank().version,
+        )
+    except Exception as e:
+        st.error(f"回答の受付中にエラーが発生しました: {str(e)}")
+        record_error("qa_drill.enqueue_submission", e)
+        return None
+
+
+def load_submission_jobs() -> List[Dict]:
+    """表示する採点ジョブを取得（未完了・失敗のジョブと、このセッションで送信したジョブ）"""
+    queue = get_submission_queue()
+    jobs = {job["id"]: job for job in queue.list_jobs(st.session_state.get("logged_in_email", "anonymous"))}
+    for job_id in st.session_state.get("submission_job_ids", []):
+        if job_id not in jobs:
+            job = queue.get_job(job_id)
+            if job is not None:
+                jobs[job_id] = job
+    return [jobs[job_id] for job_id in sorted(jobs)]
+
+
+def show_submission_job(job: Dict):
+    """採点ジョブ1件の状況を表示（完了した場合はレポートをダウンロード可能にする）"""
+    if job["status"] == STATUS_DONE:
+        submission = get_submission(job["submission_id"])
+        if submission:
+            st.success(
+                f"受付番号 #{job['id']} の採点が完了しました！"
+                f"（{submission['correct_count']} / {submission['question_count']}問正解）"
+            )
+            show_report_download(submission, key=f"job_report_download_{job['id']}")
+    elif job["status"] == STATUS_FAILED:
+        st.error(f"受付番号 #{job['id']} は採点できませんでした: {job['last_error']}")
+        if st.button("もう一度採点する", key=f"retry_job_{job['id']}"):
+            get_submission_queue().retry(job["id"])
+            st.rerun(scope="app")
+    elif job["last_error"]:
+        st.warning(
+            f"受付番号 #{job['id']}: AI採点に失敗したため、時間をおいて再試行します"
+            f"（{job['attempts']}回失敗: {job['last_error']}）"
+        )
+    else:
+        st.info(f"受付番号 #{job['id']}: 採点中...（他の操作を続けられます）")
+
+
+def show_submission_jobs():
+    """採点キューに入れた回答送信の状況を表示（未完了のジョブがある間は一定間隔で更新）"""
+    try:
+        jobs = load_submission_jobs()
+    except Exception as e:
+        print(f"採点ジョブの一覧取得エラー: {str(e)}")
+        record_error("qa_drill.load_submission_jobs", e)
+        return
+    if not jobs:
+        return
+
+    def is_unfinished(job: Dict) -> bool:
+        return job["status"] in (STATUS_PENDING, STATUS_RUNNING)
+
+    polling = any(is_unfinished(job) for job in jobs)
+
+    def render():
+        current = load_submission_jobs()
+        for job in current:
+            show_submission_job(job)
+        # 全て完了したら画面全体を再実行して定期更新を止める（過去の採点結果にも反映される）
+        if polling and not any(is_unfinished(job) for job in current):
+            st.rerun(scope="app")
+
+    st.fragment(render, run_every=SUBMISSION_POLL_INTERVAL if polling else None)()
+
+
+def reset_drill_answers():
+    """回答欄の入力・採点状況・表示ページを初期化"""
+    # 他のページのセッション状態を消さないよう、回答欄のウィジェット（q{問題ID}_answer_{番号}）だけを削除
+    keys_to_remove = [key for key in st.session_state.keys() if key.startswith("q") and "_answer_" in key]
+    for key in keys_to_remove:
+        del st.session_state[key]
+    st.session_state.drill_answers = {}
+    st.session_state.grading_jobs = {}
+    st.session_state.drill_page = 0
+
+
+@timed("qa_drill.build_drill")
+def build_drill(bank: QuestionBank, mode: str, count: int, categories: List[str], ref_start: str, ref_end: str) -> tuple:
+    """条件に合う問題からドリルを組み立てて問題IDを返す"""
+    stats = None
+    if mode == MODE_ADAPTIVE:
+        stats = get_user_question_stats(st.session_state.get("logged_in_email", "anonymous"))
+    return assemble_drill(
+        bank,
+        mode=mode,
+        count=count or None,
+        categories=categories,
+        ref_start=ref_start.strip() or None,
+        ref_end=ref_end.strip() or None,
+        stats=stats,
+    )
+
+
+def show_drill_builder(bank: QuestionBank):
+    """出題条件を指定してドリルを作成するフォームを表示"""
+    with st.expander("出題条件", expanded=False):
+        with st.form("drill_builder"):
+            mode = st.radio(
+                "出題方式",
+                list(DRILL_MODE_LABELS),
+                format_func=DRILL_MODE_LABELS.get,
+                horizontal=True,
+                help="「苦手な問題を優先」は過去に間違えた割合が高い問題ほど出題されやすくなります",
+            )
+            categories = st.multiselect("カテゴリ", bank.categories(), placeholder="すべて")
+            col1, col2 = st.columns(2)
+            with col1:
+                ref_start = st.text_input("参照項番（開始）", placeholder="例: 1.1")
+            with col2:
+                ref_end = st.text_input("参照項番（終了）", placeholder="例: 2.3")
+            count = st.number_input(
+                "出題数（0は条件に合う全問）", min_value=0, max_value=len(bank), value=min(get_drill_size(), len(bank))
+            )
+            created = st.form_submit_button("この条件でドリルを作成")
+
+    if created:
+        question_ids = build_drill(bank, mode, int(count), categories, ref_start, ref_end)
+        if not question_ids:
+            st.warning("条件に合う問題がありません")
+            return
+        st.session_state.drill_question_ids = question_ids
+        reset_drill_answers()
+        st.rerun()
+
+
 def show_qa_drill_page():
     """QAドリルページを表示"""
     # 現在のページがQAドリルでない場合は即座に終了
@@ -494,48 +765,54 @@ def show_qa_drill_page():
     st.title("QA Training Drill")
     st.write("QA事業部のドリルです。各問題をよく読んで回答してください。")
 
-    # 問題データの読み込み
-    problems = load_qa_problems()
-
-    # すべての問題を表示
-    for i, problem in enumerate(problems):
-        show_question(problem, i)
-
-    # 回答送信ボタン
-    col1, col2 = st.columns([1, 4])
-    with col1:
-        if st.button("回答を送信", key="submit_answers", use_container_width=True):
-            with st.spinner("採点中..."):
-                # 全ての回答を評価
-                results = evaluate_all_answers(problems)
-
-                # レポートを生成
-                report = generate_report(problems, results)
-
-                # レポートを保存
-                report_path = save_report(report)
-
-                if report_path:
-                    st.success(f"採点が完了しました！レポートが保存されました: {report_path}")
-                    # レポートの内容をダウンロード可能にする
-                    with open(report_path, "r", encoding="utf-8") as f:
-                        report_content = f.read()
-                    st.download_button(
-                        label="レポートをダウンロード",
-                        data=report_content,
-                        file_name=os.path.basename(report_path),
-                        mime="text/plain",
-                    )
-                else:
-                    st.error("レポートの保存に失敗しました。")
-
-    with col2:
-        if st.button("回答をクリア", key="clear_answers", use_container_width=True):
-            # セッション状態から回答をクリア
-            keys_to_remove = [key for key in st.session_state.keys() if key.startswith("q")]
-            for key in keys_to_remove:
-                del st.session_state[key]
-            st.rerun()
+    # 出題条件の指定とドリルの問題の読み込み
+    show_drill_builder(get_question_bank())
+    problems = get_drill_problems()
+
+    # 現在のページの問題だけを表示（他のページの回答はdrill_answersに保持）
+    # 入力はフォームでまとめ、ボタンを押したときだけ再実行する
+    page_size = get_page_size()
+    page_count = get_page_count(len(problems), page_size)
+    page = min(st.session_state.get("drill_page", 0), page_count - 1)
+    with st.form(f"drill_page_{page}", border=False):
+        for i in get_page_indexes(len(problems), page, page_size):
+            show_question(problems[i], i)
+
+        target_page = None
+        if page_count > 1:
+            target_page = show_page_navigation(problems, page, page_count, page_size)
+
+        # 回答送信ボタン
+        col1, col2 = st.columns([1, 4])
+        with col1:
+            submitted = st.form_submit_button("回答を送信", key="submit_answers", width="stretch")
+        with col2:
+            cleared = st.form_submit_button("回答をクリア", key="clear_answers", width="stretch")
+
+    # 採点中の問題があれば完了を待って結果を表示
+    watch_grading_jobs()
+
+    if target_page is not None:
+        st.session_state.drill_page = target_page
+        st.rerun()
+
+    if submitted:
+        # 採点はキューで行い、受付番号だけをすぐに返す
+        job_id = enqueue_submission(problems)
+        if job_id is not None:
+            st.session_state.setdefault("submission_job_ids", []).append(job_id)
+            st.success(f"回答を受け付けました（受付番号 #{job_id}）。採点が終わるとこの画面に結果が表示されます。")
+
+    # 採点キューに入れた回答送信の状況
+    show_submission_jobs()
+
+    # 過去の採点結果
+    show_submission_history()
+
+    if cleared:
+        # セッション状態から回答をクリア
+        reset_drill_answers()
+        st.rerun()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,426 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# srcディレクトリをPythonパスに追加
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(SRC_DIR)
+
+from streamlit.testing.v1 import AppTest
+
+import auth
+from pages.chatbot import get_chat_response
+from pages.qa_drill import check_answers, generate_report, get_submission_queue, load_qa_problems
+from utils import db, drill_results, grading_cache, openai_utils, question_bank
+from utils.grading_cache import GradingCache
+from utils.grading_queue import STATUS_DONE, STATUS_FAILED, GradingQueue
+from utils.llm_backends import (
+    DEFAULT_FAKE_CHUNK_DELAY_SECONDS,
+    DEFAULT_FAKE_LATENCY_SECONDS,
+    FakeAsyncOpenAI,
+    FaultInjector,
+    default_responder,
+)
+from utils.llm_gateway import DEFAULT_MAX_CONCURRENCY, DEFAULT_RPM, DEFAULT_TPM, LLMGateway
+from utils.prompt_registry import get_prompt_registry
+
+# 回答の作り方の割合（完全一致・表記ゆれ・言い換え・誤答）
+ANSWER_MIX = {"exact": 0.5, "variant": 0.2, "paraphrase": 0.2, "wrong": 0.1}
+
+# チャットの質問例
+CHAT_QUESTIONS = [
+    "同値分割と境界値分析の違いを教えてください",
+    "プレイリスト機能のテスト観点を挙げてください",
+    "評価シートの期待結果はどう書けばよいですか",
+    "回帰テストの対象はどう選べばよいですか",
+]
+
+# 前回の計測結果と比較して悪化とみなすp95の増加率
+REGRESSION_THRESHOLD = 0.2
+
+# 再実行を計測するアプリ本体（ログイン済みのセッションでQAドリルのページを表示）
+APP_SCRIPT = os.path.join(SRC_DIR, "main.py")
+APP_TIMEOUT_SECONDS = 60
+
+# 回答送信の採点が終わったかを確認する間隔（秒）
+JOB_POLL_SECONDS = 0.05
+
+
+class Usage:
+    """SQL文の実行数とLLMへのリクエスト数の累計（スレッドセーフ）"""
+
+    def __init__(self):
+        self.db_statements = 0
+        self.llm_grading_calls = 0
+        self.llm_chat_calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, statement: str):
+        """sqlite3のトレースコールバック（PRAGMAは数えない）"""
+        if statement.lstrip().upper().startswith("PRAGMA"):
+            return
+        with self._lock:
+            self.db_statements += 1
+
+    def count_llm_call(self, stream: bool):
+        with self._lock:
+            if stream:
+                self.llm_chat_calls += 1
+            else:
+                self.llm_grading_calls += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "db_statements": self.db_statements,
+                "llm_grading_calls": self.llm_grading_calls,
+                "llm_chat_calls": self.llm_chat_calls,
+            }
+
+
+class Recorder:
+    """操作ごとの所要時間を記録する（usageを渡すと操作ごとのSQL文・LLMリクエスト数も記録）"""
+
+    def __init__(self, usage: Optional[Usage] = None):
+        self.usage = usage
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.costs: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name: str):
+        before = self.usage.snapshot() if self.usage else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.samples[name].append(elapsed)
+                if before is not None:
+                    for key, value in self.usage.snapshot().items():
+                        self.costs[name][key] += value - before[key]
+
+    def per_call_costs(self) -> Dict[str, Dict[str, float]]:
+        """操作1回あたりのSQL文・LLMリクエスト数"""
+        return {
+            name: {key: value / len(self.samples[name]) for key, value in costs.items()}
+            for name, costs in self.costs.items()
+        }
+
+
+def percentile(sorted_samples: List[float], p: float) -> float:
+    """最近傍順位法によるパーセンタイル"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, int(round(p / 100 * len(sorted_samples))) - 1))
+    return sorted_samples[rank]
+
+
+def summarize_samples(samples: List[float]) -> Dict:
+    """所要時間（秒）の一覧をミリ秒単位の統計値にまとめる"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+
+def make_answers(problems: List[Dict], rng: random.Random) -> List[List[str]]:
+    """ANSWER_MIXの割合で完全一致・表記ゆれ・言い換え・誤答を混ぜた回答を作る"""
+    all_correct_answers = [answer for problem in problems for answer in problem["correct_answers"]]
+    kinds = list(ANSWER_MIX)
+    weights = list(ANSWER_MIX.values())
+
+    all_user_answers = []
+    for problem in problems:
+        user_answers = []
+        for correct_answer in problem["correct_answers"]:
+            kind = rng.choices(kinds, weights)[0]
+            if kind == "exact":
+                user_answers.append(correct_answer)
+            elif kind == "variant":
+                user_answers.append(f"{correct_answer}。")
+            elif kind == "paraphrase":
+                user_answers.append(f"たぶん{correct_answer}だと思います")
+            else:
+                user_answers.append(rng.choice(all_correct_answers))
+        rng.shuffle(user_answers)
+        all_user_answers.append(user_answers)
+    return all_user_answers
+
+
+def setup_environment(work_dir: Path, usage: Usage, args) -> LLMGateway:
+    """SQLiteを一時ディレクトリに、LLMをプロセス内の疑似バックエンドに差し替え、採点キューを起動する"""
+    db.set_trace_callback(usage)
+    auth.get_db_path = lambda: work_dir / "users.db"
+    question_bank.get_question_bank_db_path = lambda: work_dir / "question_bank.db"
+    drill_results.get_results_db_path = lambda: work_dir / "drill_results.db"
+    auth.invalidate_role_cache()
+    grading_cache._cache = GradingCache(work_dir / "grading_cache.db")
+
+    def responder(messages: List[Dict], request: Dict) -> str:
+        usage.count_llm_call(bool(request.get("stream")))
+        return default_responder(messages, request)
+
+    backend = FakeAsyncOpenAI(
+        responder=responder,
+        faults=FaultInjector(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            retry_after=0.0 if args.error_rate else None,
+            seed=args.seed,
+        ),
+        chunk_delay=args.chunk_delay,
+    )
+    gateway = LLMGateway(backend, rpm=args.rpm, tpm=args.tpm, max_concurrency=args.llm_concurrency)
+    openai_utils._gateway = gateway
+
+    # 回答送信はアプリと同じ採点キュー（[grading_queue]の設定）で採点する
+    get_submission_queue()
+    return gateway
+
+
+def start_session(email: str) -> AppTest:
+    """ログイン済みでQAドリルのページを開いたセッションを作成（最初の描画まで行う）"""
+    app = AppTest.from_file(APP_SCRIPT, default_timeout=APP_TIMEOUT_SECONDS)
+    app.session_state["password_correct"] = True
+    app.session_state["logged_in_email"] = email
+    app.session_state["page"] = "qa_drill"
+    # サイドバーのメニューの選択（未選択の場合はHomeになる）
+    app.session_state["main_menu"] = "QA Drill"
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"QAドリルのページの描画中に例外が発生しました: {app.exception[0].message}")
+    return app
+
+
+def wait_for_job(queue: GradingQueue, job_id: int) -> Dict:
+    """採点ジョブが完了（または失敗）するまで待つ"""
+    while True:
+        job = queue.get_job(job_id)
+        if job["status"] in (STATUS_DONE, STATUS_FAILED):
+            return job
+        time.sleep(JOB_POLL_SECONDS)
+
+
+def run_trainee(name: str, seed: int, problems: List[Dict], system_prompt: str, recorder: Recorder, args):
+    """受講者1人分の操作（登録・ログイン・再実行・1問ずつの採点・全問送信・チャット）"""
+    rng = random.Random(seed)
+    email = f"{name}@example.com"
+    password = f"password-{name}"
+    queue = get_submission_queue()
+
+    with recorder.measure("auth.save_user"):
+        auth.save_user(email, password)
+    with recorder.measure("auth.verify_login"):
+        auth.verify_login(email, password)
+    app = start_session(email)
+
+    for _ in range(args.drills):
+        all_user_answers = make_answers(problems, rng)
+
+        # ボタン操作ごとの再実行（サイドバー・QAドリルのページ全体を描画）
+        for _ in range(args.reruns):
+            with recorder.measure("rerun.qa_drill"):
+                app.run()
+
+        # 1問ずつの採点ボタン
+        for i in rng.sample(range(len(problems)), min(args.checks, len(problems))):
+            with recorder.measure("qa_drill.check_answers"):
+                check_answers(problems[i], all_user_answers[i])
+
+        # 回答送信（採点キューに入れて受付番号を受け取り、ワーカーが採点・保存を終えるまで待つ）
+        with recorder.measure("submission"):
+            with recorder.measure("grading_queue.enqueue"):
+                job_id = queue.enqueue(email, problems, all_user_answers, question_bank.get_question_bank().version)
+            job = wait_for_job(queue, job_id)
+        if job["status"] != STATUS_DONE:
+            continue
+
+        # レポートのダウンロード（保存した採点結果から生成）
+        with recorder.measure("qa_drill.generate_report"):
+            submission, stored_problems, stored_results = drill_results.load_submission(job["submission_id"])
+            generate_report(stored_problems, stored_results, email, submission["submitted_at"])
+
+    history = []
+    for turn in range(args.chat_turns):
+        question = CHAT_QUESTIONS[turn % len(CHAT_QUESTIONS)]
+        with recorder.measure("chatbot.get_chat_response"):
+            response = get_chat_response(system_prompt, question, None, history)
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": response})
+
+    with recorder.measure("auth.change_password"):
+        auth.change_password(email, password + "-new")
+
+
+def get_git_revision() -> Optional[str]:
+    """計測したコードのコミット（取得できない場合はNone）"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare_results(results: Dict, baseline_path: str) -> List[str]:
+    """前回の計測結果とp95を比較し、悪化した操作の一覧を返す"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = []
+    print(f"\n=== 前回の計測結果との比較（{baseline.get('meta', {}).get('git_revision')}） ===")
+    for name, stats in results["latency"].items():
+        previous = baseline.get("latency", {}).get(name)
+        if not previous or not previous["p95_ms"]:
+            continue
+        change = stats["p95_ms"] / previous["p95_ms"] - 1
+        mark = " ← 悪化" if change > REGRESSION_THRESHOLD else ""
+        print(f"{name:<28} p95 {previous['p95_ms']:9.1f} → {stats['p95_ms']:9.1f} ms ({change:+.0%}){mark}")
+        if mark:
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results: Dict):
+    """計測結果を表形式で表示"""
+    print(f"\n=== レイテンシ（受講者{results['config']['trainees']}人が同時に操作） ===")
+    print(f"{'操作':<28} {'回数':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'最大':>9} (ms)")
+    for name, stats in results["latency"].items():
+        print(
+            f"{name:<28} {stats['count']:6d} {stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} "
+            f"{stats['p99_ms']:9.1f} {stats['max_ms']:9.1f}"
+        )
+
+    throughput = results["throughput"]
+    print(f"\n経過時間: {results['wall_seconds']:.2f}秒")
+    print(f"スループット: 回答送信 {throughput['submissions_per_second']:.2f}件/秒・"
+          f"チャット {throughput['chat_turns_per_second']:.2f}件/秒")
+
+    llm = results["llm"]
+    print(f"LLMリクエスト: 回答送信1件あたり {llm['grading_calls_per_submission']:.2f}回"
+          f"（採点ボタン含む）・チャット1件あたり {llm['chat_calls_per_turn']:.2f}回"
+          f"・リトライ {llm['gateway']['retries']}回")
+    print(f"SQL文: 再実行1回あたり {results['db']['statements_per_rerun']:.2f}文")
+    jobs = results["grading_queue"]
+    print(f"採点キュー: 完了 {jobs.get(STATUS_DONE, 0)}件・失敗 {jobs.get(STATUS_FAILED, 0)}件")
+    cache = results["grading_cache"]
+    print(f"採点キャッシュ: ヒット率 {cache['hit_rate']:.1%}")
+
+    print("\n=== 操作1回あたりのSQL文・LLMリクエスト数（受講者1人で計測） ===")
+    for name, costs in results["per_call_costs"].items():
+        print(
+            f"{name:<28} SQL {costs['db_statements']:6.2f}  "
+            f"LLM採点 {costs['llm_grading_calls']:6.2f}  LLMチャット {costs['llm_chat_calls']:6.2f}"
+        )
+
+
+def main():
+    """疑似LLMバックエンドと一時DBを使って、受講者の同時利用時のレイテンシを計測する"""
+    parser = argparse.ArgumentParser(description="QAドリル・チャットボット・認証のエンドツーエンド負荷試験")
+    parser.add_argument("--trainees", type=int, default=20, help="同時に操作する受講者数")
+    parser.add_argument("--drills", type=int, default=1, help="受講者1人あたりの回答送信回数")
+    parser.add_argument("--checks", type=int, default=3, help="回答送信1回あたりの1問ずつの採点回数")
+    parser.add_argument("--reruns", type=int, default=20, help="回答送信1回あたりの再実行回数")
+    parser.add_argument("--chat-turns", type=int, default=3, help="受講者1人あたりのチャット回数")
+    parser.add_argument("--latency", type=float, default=DEFAULT_FAKE_LATENCY_SECONDS, help="LLMの応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="LLMの応答遅延のゆらぎ（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="LLMが429を返す割合")
+    parser.add_argument("--chunk-delay", type=float, default=DEFAULT_FAKE_CHUNK_DELAY_SECONDS)
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM)
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM)
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="計測結果JSONの出力先")
+    parser.add_argument("--compare", help="比較する前回の計測結果JSON（p95が悪化した場合は終了コード1）")
+    args = parser.parse_args()
+
+    system_prompt = get_prompt_registry().get(get_prompt_registry().names()[0]).content
+
+    with tempfile.TemporaryDirectory(prefix="qa-benchmark-") as work_dir:
+        usage = Usage()
+        gateway = setup_environment(Path(work_dir), usage, args)
+        problems = load_qa_problems()
+
+        # 受講者1人で操作ごとのSQL文・LLMリクエスト数を計測（キャッシュが空の状態）
+        calibration = Recorder(usage)
+        run_trainee("calibration", args.seed, problems, system_prompt, calibration, args)
+
+        # 受講者を同時に操作させてレイテンシを計測
+        recorder = Recorder()
+        before = usage.snapshot()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.trainees) as executor:
+            futures = [
+                executor.submit(
+                    run_trainee, f"trainee{i:04d}", args.seed * 1000 + i, problems, system_prompt, recorder, args
+                )
+                for i in range(args.trainees)
+            ]
+            for future in futures:
+                future.result()
+        wall_seconds = time.perf_counter() - start
+        used = {key: value - before[key] for key, value in usage.snapshot().items()}
+
+        submissions = args.trainees * args.drills
+        chat_turns = args.trainees * args.chat_turns
+        reruns = len(recorder.samples["rerun.qa_drill"])
+        results = {
+            "meta": {
+                "git_revision": get_git_revision(),
+                "python": platform.python_version(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "config": vars(args),
+            "wall_seconds": wall_seconds,
+            "throughput": {
+                "submissions_per_second": submissions / wall_seconds,
+                "chat_turns_per_second": chat_turns / wall_seconds,
+            },
+            "latency": {name: summarize_samples(samples) for name, samples in sorted(recorder.samples.items())},
+            "llm": {
+                "grading_calls_per_submission": used["llm_grading_calls"] / submissions if submissions else 0.0,
+                "chat_calls_per_turn": used["llm_chat_calls"] / chat_turns if chat_turns else 0.0,
+                "gateway": vars(gateway.stats),
+            },
+            "db": {
+                "statements": used["db_statements"],
+                "statements_per_rerun": calibration.per_call_costs().get("rerun.qa_drill", {}).get("db_statements", 0.0),
+                "reruns": reruns,
+            },
+            "per_call_costs": calibration.per_call_costs(),
+            "grading_cache": grading_cache._cache.stats(),
+            "grading_queue": get_submission_queue().stats(),
+        }
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n計測結果を保存しました: {args.output}")
+
+    if args.compare and compare_results(results, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+from datetime import date
+
+# srcディレクトリをPythonパスに追加
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(SRC_DIR)
+
+from pages.qa_drill import generate_report
+from utils.drill_results import count_result_rows
+from utils.results_export import EXPORT_MIME_TYPES, FORMAT_ZIP, write_export
+
+
+def main():
+    """採点結果をファイルに直接書き出す（管理者ページのエクスポートと同じ形式）"""
+    parser = argparse.ArgumentParser(description="QAドリルの採点結果の一括エクスポート")
+    parser.add_argument("output", help="出力先のファイル（-で標準出力、ZIPは不可）")
+    parser.add_argument("--format", choices=list(EXPORT_MIME_TYPES), default=FORMAT_ZIP)
+    parser.add_argument("--email", help="受講者のメールアドレスで絞り込む")
+    parser.add_argument("--start", type=date.fromisoformat, help="開始日（YYYY-MM-DD）")
+    parser.add_argument("--end", type=date.fromisoformat, help="終了日（YYYY-MM-DD、その日を含む）")
+    parser.add_argument("--category", action="append", dest="categories", help="カテゴリで絞り込む（複数指定可）")
+    args = parser.parse_args()
+
+    filters = {"email": args.email, "start_day": args.start, "end_day": args.end, "categories": args.categories}
+    submissions, rows = count_result_rows(**filters)
+    print(f"回答送信 {submissions}件（問題ごとの結果 {rows}行）を書き出します", file=sys.stderr)
+
+    if args.output == "-":
+        if args.format == FORMAT_ZIP:
+            parser.error("ZIPは標準出力に書き出せません")
+        write_export(sys.stdout.buffer, args.format, **filters)
+    else:
+        with open(args.output, "wb") as f:
+            write_export(f, args.format, generate_report, **filters)
+        print(f"書き出しました: {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Tuple
+
+# srcディレクトリ
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import時間を計測するモジュール
+MODULES = ["main", "pages.home", "pages.chatbot", "pages.qa_drill", "pages.admin"]
+
+# ログイン画面の初回描画を計測する子プロセスのコード
+FIRST_PAINT_CODE = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("main.py", default_timeout=60)
+app.run()
+elapsed = time.perf_counter() - start
+if app.exception:
+    raise SystemExit("ログイン画面の描画中に例外が発生しました: " + str(app.exception))
+print(elapsed)
+"""
+
+
+def measure_import(module: str) -> float:
+    """新しいプロセスでモジュールをimportし、累積import時間（ミリ秒）を返す"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # 「import time: self [us] | cumulative | imported package」形式の行から対象モジュールを探す
+    pattern = re.compile(r"import time:\s*\d+\s*\|\s*(\d+)\s*\|\s*" + re.escape(module) + r"$")
+    for line in result.stderr.splitlines():
+        match = pattern.search(line.rstrip())
+        if match:
+            return int(match.group(1)) / 1000
+    raise RuntimeError(f"{module}のimport時間を取得できませんでした")
+
+
+def measure_first_paint() -> Tuple[float, float]:
+    """新しいプロセスでアプリを1回実行し、ログイン画面の描画までの時間とプロセス全体の時間（ミリ秒）を返す"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", FIRST_PAINT_CODE], cwd=SRC_DIR, capture_output=True, text=True)
+    process_elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError((result.stderr or result.stdout).strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1]) * 1000, process_elapsed * 1000
+
+
+def main(repeat: int = 3, output_path: str = None):
+    """起動時間を計測して表示する（各計測はrepeat回の中央値）"""
+    results = {"imports_ms": {}, "first_paint_ms": None, "first_paint_process_ms": None}
+
+    for module in MODULES:
+        try:
+            samples = sorted(measure_import(module) for _ in range(repeat))
+            results["imports_ms"][module] = samples[len(samples) // 2]
+            print(f"import {module:<16} {results['imports_ms'][module]:8.1f} ms")
+        except Exception as e:
+            print(f"import {module:<16} 計測エラー: {str(e)}")
+
+    try:
+        samples = sorted(measure_first_paint() for _ in range(repeat))
+        paint_ms, process_ms = samples[len(samples) // 2]
+        results["first_paint_ms"] = paint_ms
+        results["first_paint_process_ms"] = process_ms
+        print(f"ログイン画面の初回描画     {paint_ms:8.1f} ms（プロセス起動を含む: {process_ms:.1f} ms）")
+    except Exception as e:
+        print(f"ログイン画面の初回描画 計測エラー: {str(e)}")
+
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"計測結果を保存しました: {output_path}")
+
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        print("使用方法: python measure_startup.py [繰り返し回数] [結果JSONの出力先]")
+        sys.exit(1)
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    output_path = sys.argv[2] if len(sys.argv) > 2 else None
+    main(repeat, output_path)
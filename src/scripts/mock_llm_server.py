@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# srcディレクトリをPythonパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.llm_backends import (
+    DEFAULT_FAKE_CHUNK_CHARS,
+    DEFAULT_FAKE_CHUNK_DELAY_SECONDS,
+    DEFAULT_FAKE_LATENCY_SECONDS,
+    FaultInjector,
+    build_chunks,
+    build_completion,
+    default_responder,
+)
+
+
+def create_handler(faults: FaultInjector, chunk_delay: float, chunk_chars: int):
+    """OpenAIのChat Completions APIを模したリクエストハンドラーを作成"""
+
+    class MockLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # リクエストごとのログは出力しない
+            pass
+
+        def _send_json(self, status: int, body: dict, headers: dict = None):
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Not found: {self.path}", "type": "invalid_request_error"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            time.sleep(faults.next_latency())
+            error = faults.next_error()
+            if error is not None:
+                self._send_json(
+                    error.status_code,
+                    {"error": {"message": str(error), "type": "mock_error", "code": error.status_code}},
+                    error.response.headers,
+                )
+                return
+
+            content = default_responder(request.get("messages", []), request)
+            if not request.get("stream"):
+                self._send_json(200, build_completion(content, request))
+                return
+
+            # Server-Sent Eventsでチャンクを送信
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for chunk in build_chunks(content, request, chunk_chars):
+                    time.sleep(chunk_delay)
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # クライアントが途中で切断した場合
+                pass
+
+    return MockLLMHandler
+
+
+def main():
+    """OpenAI互換のモックLLMサーバーを起動"""
+    parser = argparse.ArgumentParser(description="負荷試験用のOpenAI互換モックLLMサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=DEFAULT_FAKE_LATENCY_SECONDS, help="応答までの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のゆらぎ（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="エラーを返す割合（0.0〜1.0）")
+    parser.add_argument("--error-status", type=int, default=429, help="注入するエラーのHTTPステータス")
+    parser.add_argument("--retry-after", type=float, default=None, help="エラー時に返すRetry-After（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=DEFAULT_FAKE_CHUNK_DELAY_SECONDS)
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_FAKE_CHUNK_CHARS)
+    parser.add_argument("--seed", type=int, default=None, help="エラー注入の乱数シード")
+    args = parser.parse_args()
+
+    faults = FaultInjector(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), create_handler(faults, args.chunk_delay, args.chunk_chars))
+    print(f"モックLLMサーバーを起動しました: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -59,7 +59,7 @@ def show_login_page():
                 # ログインボタンを中央に配置
                 col1, col2, col3 = st.columns([1, 2, 1])
                 with col2:
-                    submitted = st.form_submit_button("ログイン", use_container_width=True)
+                    submitted = st.form_submit_button("ログイン", width="stretch")
 
                 if submitted:
                     if not email or not password:
@@ -77,11 +77,11 @@ def show_login_page():
             # 新規登録とパスワード変更のボタンを横に並べる
             col1, col2 = st.columns(2)
             with col1:
-                if st.button("新規登録", use_container_width=True):
+                if st.button("新規登録", width="stretch"):
                     st.session_state.display_mode = "signup"
                     st.rerun()
             with col2:
-                if st.button("パスワード変更", use_container_width=True):
+                if st.button("パスワード変更", width="stretch"):
                     st.session_state.display_mode = "change_password"
                     st.rerun()
 
@@ -95,7 +95,7 @@ def show_login_page():
 
                 col1, col2, col3 = st.columns([1, 2, 1])
                 with col2:
-                    signup_submitted = st.form_submit_button("登録", use_container_width=True)
+                    signup_submitted = st.form_submit_button("登録", width="stretch")
 
                 if signup_submitted:
                     if not new_email or not new_password or not confirm_password:
@@ -115,7 +115,7 @@ def show_login_page():
             # ログイン画面に戻るボタン
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                if st.button("ログイン画面に戻る", use_container_width=True):
+                if st.button("ログイン画面に戻る", width="stretch"):
                     st.session_state.display_mode = "login"
                     st.rerun()
 
@@ -129,7 +129,7 @@ def show_login_page():
 
                 col1, col2, col3 = st.columns([1, 2, 1])
                 with col2:
-                    change_submitted = st.form_submit_button("パスワード変更", use_container_width=True)
+                    change_submitted = st.form_submit_button("パスワード変更", width="stretch")
 
                 if change_submitted:
                     if not email or not new_password or not confirm_password:
@@ -150,6 +150,6 @@ def show_login_page():
             # ログイン画面に戻るボタン
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                if st.button("ログイン画面に戻る", use_container_width=True):
+                if st.button("ログイン画面に戻る", width="stretch"):
                     st.session_state.display_mode = "login"
                     st.rerun()
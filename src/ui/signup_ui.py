@@ -25,7 +25,7 @@ def show_signup_page():
             # 登録ボタン中央に配置
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                submit_button = st.form_submit_button("登録", use_container_width=True)
+                submit_button = st.form_submit_button("登録", width="stretch")
 
         if submit_button:
             if not email or not password:
@@ -52,6 +52,6 @@ def show_signup_page():
         # ログイン画面に戻るボタン
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            if st.button("戻る", use_container_width=True):
+            if st.button("戻る", width="stretch"):
                 st.session_state["is_signup_visible"] = False
                 st.rerun()
\ No newline at end of file
@@ -0,0 +1,128 @@
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+# 判定を行った段階
+TIER_EXACT = "exact"  # 入力がそのまま一致
+TIER_LOCAL = "local"  # 正規化による表記ゆれを除いたローカル判定
+TIER_CACHE = "cache"  # 採点キャッシュ
+TIER_LLM = "llm"  # LLMによる意味一致判定
+
+# 既定のしきい値（secrets.tomlの[grading]セクションで変更可能）
+DEFAULT_REJECT_THRESHOLD = None  # Noneの場合はローカルで不正解と判定しない
+
+# 内容語（漢字・カタカナ・英数字）の間にある場合だけ比較時に取り除く助詞
+JOINING_PARTICLE = "の"
+
+
+@dataclass
+class LocalVerdict:
+    """ローカル判定の結果（verdictがNoneの場合はLLMで判定が必要）"""
+
+    verdict: Optional[bool]
+    tier: str
+    score: float
+
+
+def is_content_char(ch: str) -> bool:
+    """内容語を構成する文字（漢字・カタカナ・長音記号・英数字）か"""
+    return (
+        "\u4e00" <= ch <= "\u9fff"
+        or ch == "々"
+        or "\u30a1" <= ch <= "\u30fc"
+        or (ch.isascii() and ch.isalnum())
+    )
+
+
+def normalize_answer(text: str) -> str:
+    """比較用に回答を正規化（NFKC、小文字化、空白・記号の除去、内容語をつなぐ助詞「の」の除去）
+
+    「の」は前後が内容語の場合（「テストの設計」など）だけ取り除き、「のれん」「もの」などの語の一部は残す。
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    chars = [ch for ch in text if not ch.isspace() and unicodedata.category(ch)[0] not in ("P", "S")]
+    return "".join(
+        ch
+        for i, ch in enumerate(chars)
+        if not (
+            ch == JOINING_PARTICLE
+            and 0 < i < len(chars) - 1
+            and is_content_char(chars[i - 1])
+            and is_content_char(chars[i + 1])
+        )
+    )
+
+
+def fold_kana(text: str) -> str:
+    """ひらがな・カタカナの違いと長音記号を無視するため、カタカナをひらがなにして長音記号を除く"""
+    return "".join(
+        chr(ord(ch) - 0x60) if "\u30a1" <= ch <= "\u30f6" else ch for ch in text if ch != "ー"
+    )
+
+
+def levenshtein_distance(a: str, b: str) -> int:
+    """2つの文字列の編集距離を計算"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ch_a in enumerate(a, 1):
+        current = [i]
+        for j, ch_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ch_a != ch_b)))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a: str, b: str) -> float:
+    """編集距離に基づく類似度（0.0〜1.0）"""
+    if not a and not b:
+        return 1.0
+    return 1.0 - levenshtein_distance(a, b) / max(len(a), len(b))
+
+
+def bigram_similarity(a: str, b: str) -> float:
+    """文字bigramのDice係数（0.0〜1.0）"""
+    if len(a) < 2 or len(b) < 2:
+        return 1.0 if a == b else 0.0
+    bigrams_a = [a[i : i + 2] for i in range(len(a) - 1)]
+    bigrams_b = [b[i : i + 2] for i in range(len(b) - 1)]
+    remaining = list(bigrams_b)
+    overlap = 0
+    for bigram in bigrams_a:
+        if bigram in remaining:
+            remaining.remove(bigram)
+            overlap += 1
+    return 2 * overlap / (len(bigrams_a) + len(bigrams_b))
+
+
+class AnswerMatcher:
+    """LLMに問い合わせる前に明らかな正解・不正解をローカルで判定する
+
+    正解とするのは、正規化した回答が一致する場合と、違いがひらがな・カタカナ・長音記号・記号だけの場合に限る。
+    日本語では1文字の違い（「非」の有無など）で意味が逆になるため、似ているだけの回答は採点キャッシュ・LLMで判定する。
+    """
+
+    def __init__(self, reject_threshold: Optional[float] = DEFAULT_REJECT_THRESHOLD):
+        self.reject_threshold = reject_threshold
+
+    def match(self, user_answer: str, correct_answer: str) -> LocalVerdict:
+        """1組の回答を判定"""
+        if user_answer.strip() == correct_answer.strip():
+            return LocalVerdict(True, TIER_EXACT, 1.0)
+
+        normalized_user = normalize_answer(user_answer)
+        normalized_correct = normalize_answer(correct_answer)
+        if not normalized_user:
+            return LocalVerdict(False, TIER_LOCAL, 0.0)
+
+        if normalized_user == normalized_correct or fold_kana(normalized_user) == fold_kana(normalized_correct):
+            return LocalVerdict(True, TIER_LOCAL, 1.0)
+
+        score = similarity(normalized_user, normalized_correct)
+
+        if self.reject_threshold is not None:
+            score = max(score, bigram_similarity(normalized_user, normalized_correct))
+            if score <= self.reject_threshold:
+                return LocalVerdict(False, TIER_LOCAL, score)
+
+        return LocalVerdict(None, TIER_LOCAL, score)
@@ -0,0 +1,124 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from utils.chat_messages import ChatMessage, history_messages, system_message, user_message
+
+# トークン数の計算に使うエンコーディング（gpt-4o系）
+TOKEN_ENCODING = "o200k_base"
+
+# メッセージ1件あたりの付加トークン数（役割名や区切り）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 既定値（secrets.tomlの[chatbot]セクションで変更可能）
+DEFAULT_CONTEXT_TOKEN_BUDGET = 8000
+DEFAULT_SUMMARY_MIN_MESSAGES = 4
+
+SUMMARY_PROMPT = (
+    "あなたは会話の要約担当です。これまでの要約と新しい会話を統合し、"
+    "以降の回答に必要な事実・ユーザーの関心・決定事項を日本語で簡潔にまとめてください。"
+)
+
+_encoding = None
+_encoding_loaded = False
+
+
+def get_encoding():
+    """tiktokenのエンコーディングを取得（利用できない場合はNone）"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            print(f"トークナイザーの読み込みに失敗したため概算でトークン数を数えます: {str(e)}")
+            _encoding = None
+    return _encoding
+
+
+@lru_cache(maxsize=2048)
+def count_tokens(text: str) -> int:
+    """文字列のトークン数を数える（tiktokenがない場合は文字種から概算）"""
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    # 概算：ASCII文字は約4文字で1トークン、それ以外は1文字1トークン
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def count_message_tokens(message: Dict) -> int:
+    """メッセージ1件のトークン数を数える"""
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass
+class ContextWindow:
+    """APIに送るメッセージと、予算に収まらなかった履歴の範囲"""
+
+    messages: List[ChatMessage]
+    token_count: int
+    history_start: int  # 送信した履歴の先頭位置（chat_history内のインデックス）
+    dropped: List[Dict] = field(default_factory=list)  # 予算外で要約にも含まれていない履歴
+
+
+def strip_current_turn(chat_history: Sequence[Dict], user_input: str) -> Sequence[Dict]:
+    """履歴の末尾が今回のユーザー入力と同じ場合は取り除く（二重送信の防止）"""
+    if chat_history and chat_history[-1]["role"] == "user" and chat_history[-1]["content"] == user_input:
+        return chat_history[:-1]
+    return chat_history
+
+
+def build_context_window(
+    system_prompt: str,
+    chat_history: Sequence[Dict],
+    user_input: str,
+    token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+    summary: Optional[str] = None,
+    summarized_count: int = 0,
+) -> ContextWindow:
+    """トークン予算内に収まるように新しい履歴から順に詰めてメッセージを組み立てる
+
+    システムプロンプトは常に先頭に置き、要約がある場合はその直後に追加する。
+    summarized_count件目までの履歴は要約に含まれているものとして送信しない。
+    """
+    history = strip_current_turn(chat_history, user_input)
+    fixed = [system_message(system_prompt)]
+    if summary:
+        fixed.append(system_message(f"これまでの会話の要約：\n{summary}"))
+    current = user_message(user_input)
+
+    used = sum(count_message_tokens(message) for message in fixed) + count_message_tokens(current)
+    start = len(history)
+    while start > summarized_count:
+        cost = count_message_tokens(history[start - 1])
+        if used + cost > token_budget:
+            break
+        used += cost
+        start -= 1
+
+    return ContextWindow(
+        messages=[*fixed, *history_messages(history[start:]), current],
+        token_count=used,
+        history_start=start,
+        dropped=list(history[summarized_count:start]),
+    )
+
+
+def summarize_history(client, model: str, previous_summary: Optional[str], messages: Sequence[Dict]) -> str:
+    """予算外になった履歴をこれまでの要約に統合する（失敗時は例外を送出）"""
+    transcript = "\n".join(
+        f"{'ユーザー' if message['role'] == 'user' else 'アシスタント'}: {message['content']}" for message in messages
+    )
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            system_message(SUMMARY_PROMPT),
+            user_message(f"これまでの要約：\n{previous_summary or 'なし'}\n\n新しい会話：\n{transcript}"),
+        ],
+        temperature=0,
+    )
+    return response.choices[0].message.content.strip()
@@ -0,0 +1,33 @@
+from typing import Dict, Iterable, List, Literal, TypedDict
+
+Role = Literal["system", "user", "assistant"]
+
+
+class ChatMessage(TypedDict):
+    """Chat Completions APIにそのまま渡せるメッセージ"""
+
+    role: Role
+    content: str
+
+
+def system_message(content: str) -> ChatMessage:
+    """システムメッセージを作成"""
+    return {"role": "system", "content": content}
+
+
+def user_message(content: str) -> ChatMessage:
+    """ユーザーメッセージを作成"""
+    return {"role": "user", "content": content}
+
+
+def assistant_message(content: str) -> ChatMessage:
+    """アシスタントメッセージを作成"""
+    return {"role": "assistant", "content": content}
+
+
+def history_messages(chat_history: Iterable[Dict]) -> List[ChatMessage]:
+    """セッションのチャット履歴をAPI用のメッセージに変換（user以外はassistantとして扱う）"""
+    return [
+        user_message(msg["content"]) if msg["role"] == "user" else assistant_message(msg["content"])
+        for msg in chat_history
+    ]
@@ -0,0 +1,109 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+# プールに保持しておく未使用コネクション数の既定値
+DEFAULT_POOL_SIZE = 8
+
+# ロック待ちのタイムアウト（ミリ秒）
+BUSY_TIMEOUT_MS = 5000
+
+# 新しく作成するコネクションに設定するSQL文のコールバック（計測用）
+_trace_callback: Optional[Callable[[str], None]] = None
+
+
+def set_trace_callback(callback: Optional[Callable[[str], None]]):
+    """以後に作成するコネクションで実行されるSQL文ごとに呼ばれるコールバックを設定（Noneで解除）"""
+    global _trace_callback
+    _trace_callback = callback
+
+
+class ConnectionPool:
+    """SQLiteコネクションのスレッドセーフなプール
+
+    Streamlitは再実行のたびに別スレッドでスクリプトを実行するため、
+    スレッドごとではなくプロセス全体でコネクションを使い回す。
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        init_schema: Optional[Callable[[sqlite3.Connection], None]] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=pool_size)
+
+        # スキーマの初期化はプール作成時に1回だけ行う
+        if init_schema is not None:
+            conn = self._create_connection()
+            try:
+                init_schema(conn)
+                conn.commit()
+            finally:
+                self._release(conn)
+
+    def _create_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        if _trace_callback is not None:
+            conn.set_trace_callback(_trace_callback)
+        return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """プールからコネクションを借りる（未コミットの変更は返却時にロールバック）"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._create_connection()
+
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                conn.close()
+            else:
+                self._release(conn)
+
+    def close_all(self):
+        """未使用のコネクションを全て閉じる"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools_lock = threading.Lock()
+_pools: Dict[str, ConnectionPool] = {}
+
+
+def get_connection_pool(
+    db_path: Path, init_schema: Optional[Callable[[sqlite3.Connection], None]] = None
+) -> ConnectionPool:
+    """DBファイルごとにプロセス共通のコネクションプールを取得"""
+    key = str(db_path)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_path, init_schema)
+        return _pools[key]
@@ -0,0 +1,113 @@
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.question_bank import QuestionBank
+
+# 出題方式
+MODE_SEQUENTIAL = "sequential"  # 問題バンクの順番通り
+MODE_RANDOM = "random"  # 無作為に抽出
+MODE_ADAPTIVE = "adaptive"  # 過去に間違えた問題ほど出やすくする
+
+# 不正解率の事前分布（未解答の問題は0.5として扱う）
+PRIOR_INCORRECT = 1.0
+PRIOR_CORRECT = 1.0
+
+# どれだけ正解していても出題される可能性を残すための最小の重み
+MIN_WEIGHT = 0.05
+
+
+class FenwickTree:
+    """重みの累積和を管理するFenwick木（更新・累積和・累積和からの位置の検索がO(log n)）"""
+
+    def __init__(self, weights: Sequence[float]):
+        self.size = len(weights)
+        self.tree = [0.0] * (self.size + 1)
+        # O(n)で構築
+        for i, weight in enumerate(weights, start=1):
+            self.tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index: int, delta: float):
+        """index番目の重みにdeltaを加算"""
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index: int) -> float:
+        """先頭からindex番目（含まない）までの重みの和"""
+        total = 0.0
+        i = index
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def total(self) -> float:
+        return self.prefix_sum(self.size)
+
+    def find(self, target: float) -> int:
+        """累積和がtargetを超える最初の位置（0 <= target < total()）"""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            next_position = position + step
+            if next_position <= self.size and self.tree[next_position] <= target:
+                position = next_position
+                target -= self.tree[next_position]
+            step >>= 1
+        return min(position, self.size - 1)
+
+
+def weighted_sample(weights: Sequence[float], count: int, rng: Optional[random.Random] = None) -> List[int]:
+    """重みに比例した確率で重複なくcount個の位置を抽出（O(n + count log n)）"""
+    rng = rng or random.Random()
+    tree = FenwickTree(weights)
+    remaining = [float(weight) for weight in weights]
+    chosen = []
+    for _ in range(min(count, sum(1 for weight in weights if weight > 0))):
+        index = tree.find(rng.random() * tree.total())
+        # 浮動小数点の誤差で重み0の位置に当たった場合は、重みが残っている位置を探し直す
+        if remaining[index] <= 0:
+            index = next(i for i, weight in enumerate(remaining) if weight > 0)
+        chosen.append(index)
+        tree.add(index, -remaining[index])
+        remaining[index] = 0.0
+    return chosen
+
+
+def error_rate_weight(attempts: int, incorrect: int) -> float:
+    """過去の解答状況から出題の重みを算出（事前分布で補正した不正解率）"""
+    return max(MIN_WEIGHT, (incorrect + PRIOR_INCORRECT) / (attempts + PRIOR_INCORRECT + PRIOR_CORRECT))
+
+
+def assemble_drill(
+    bank: QuestionBank,
+    mode: str = MODE_SEQUENTIAL,
+    count: Optional[int] = None,
+    categories: Optional[Sequence[str]] = None,
+    ref_start: Optional[str] = None,
+    ref_end: Optional[str] = None,
+    stats: Optional[Dict[str, Tuple[int, int]]] = None,
+    rng: Optional[random.Random] = None,
+) -> Tuple[str, ...]:
+    """条件に合う問題からドリルを組み立て、出題する問題IDを出題順に返す
+
+    stats（問題IDごとの（解答回数, 不正解回数））はadaptiveの場合に使う。
+    """
+    positions = bank.select(categories=categories, ref_start=ref_start, ref_end=ref_end)
+    count = len(positions) if count is None else min(count, len(positions))
+    rng = rng or random.Random()
+
+    if mode == MODE_RANDOM:
+        chosen = rng.sample(positions, count)
+    elif mode == MODE_ADAPTIVE:
+        stats = stats or {}
+        weights = [error_rate_weight(*stats.get(bank.questions[p]["id"], (0, 0))) for p in positions]
+        chosen = [positions[i] for i in weighted_sample(weights, count, rng)]
+    else:
+        chosen = list(positions[:count])
+
+    return tuple(bank.questions[p]["id"] for p in chosen)
@@ -0,0 +1,682 @@
+import json
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from utils.db import ConnectionPool, get_connection_pool
+from utils.answer_matcher import TIER_EXACT
+from utils.grading import AnswerVerdict
+
+# submissionsテーブルから読み込む列
+SUBMISSION_COLUMNS = ("id", "email", "submitted_at", "bank_version", "question_count", "correct_count")
+
+# 書き出し時に1回で読み込む行数
+EXPORT_BATCH_SIZE = 500
+
+# iter_result_rowsが返す列（verdictsは回答ごとの判定結果）
+RESULT_ROW_COLUMNS = (
+    "submission_id",
+    "email",
+    "submitted_at",
+    "bank_version",
+    "position",
+    "question_id",
+    "ref_number",
+    "ref_page",
+    "category",
+    "text",
+    "correct_answers",
+    "is_correct",
+    "message",
+    "verdicts",
+)
+
+# 判定段階の集計で、正解しなかった回答に使う区分（正解した回答は判定を確定させた段階で集計）
+TIER_INCORRECT = "incorrect"
+TIER_ERROR = "error"
+
+
+def format_submitted_at(value: datetime) -> str:
+    """送信日時の保存形式（文字列の順序が日時の順序と一致する）"""
+    return value.isoformat(sep=" ", timespec="seconds")
+
+
+def get_results_db_path() -> Path:
+    """ドリル結果のDBファイルパスを取得（users.dbと同じdataディレクトリ）"""
+    db_dir = Path(__file__).parent.parent / "data"
+    db_dir.mkdir(parents=True, exist_ok=True)
+    return db_dir / "drill_results.db"
+
+
+def init_results_schema(conn: sqlite3.Connection):
+    """テーブルの作成"""
+    c = conn.cursor()
+
+    # 回答送信1回分の結果
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            submitted_at TIMESTAMP NOT NULL,
+            bank_version INTEGER,
+            question_count INTEGER NOT NULL,
+            correct_count INTEGER NOT NULL
+        )
+    """
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS idx_submissions_email ON submissions (email, submitted_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_submissions_submitted_at ON submissions (submitted_at)")
+
+    # 問題ごとの採点結果（問題バンクが更新されてもレポートを再現できるよう出題時の内容も保存）
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS submission_questions (
+            submission_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            question_id TEXT NOT NULL,
+            ref_number TEXT,
+            ref_page TEXT,
+            category TEXT,
+            text TEXT NOT NULL,
+            correct_answers TEXT NOT NULL,
+            is_correct INTEGER NOT NULL,
+            message TEXT,
+            PRIMARY KEY (submission_id, position)
+        ) WITHOUT ROWID
+    """
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS idx_submission_questions_question ON submission_questions (question_id)")
+
+    # 回答ごとの判定結果
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS submission_verdicts (
+            submission_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            answer_index INTEGER NOT NULL,
+            user_answer TEXT NOT NULL,
+            matched_answer TEXT,
+            tier TEXT,
+            error TEXT,
+            PRIMARY KEY (submission_id, position, answer_index)
+        ) WITHOUT ROWID
+    """
+    )
+
+    # 採点待ちの回答送信（utils.grading_queueのワーカーが採点し、完了時にsubmissionsへ保存）
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS grading_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            submission_id INTEGER,
+            created_at TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP
+        )
+    """
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS idx_grading_jobs_status ON grading_jobs (status, next_attempt_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_grading_jobs_email ON grading_jobs (email, id)")
+
+    # ユーザー・問題ごとの解答回数と不正解回数（出題の重み付けに使う）
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_question_stats (
+            email TEXT NOT NULL,
+            question_id TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            incorrect INTEGER NOT NULL DEFAULT 0,
+            last_answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (email, question_id)
+        ) WITHOUT ROWID
+    """
+    )
+
+    # 分析用の集計（回答送信ごとにinsert_submissionで加算し、表示時に全件を集計し直さない）
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS question_stats (
+            question_id TEXT PRIMARY KEY,
+            ref_number TEXT,
+            category TEXT,
+            text TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            incorrect INTEGER NOT NULL DEFAULT 0,
+            last_answered_at TIMESTAMP
+        ) WITHOUT ROWID
+    """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS category_stats (
+            category TEXT PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_daily_stats (
+            email TEXT NOT NULL,
+            day TEXT NOT NULL,
+            submissions INTEGER NOT NULL DEFAULT 0,
+            questions INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (email, day)
+        ) WITHOUT ROWID
+    """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tier_daily_stats (
+            day TEXT NOT NULL,
+            tier TEXT NOT NULL,
+            answers INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, tier)
+        ) WITHOUT ROWID
+    """
+    )
+
+    # 集計テーブルの追加前に保存された採点結果があれば集計し直す
+    needs_rebuild = c.execute(
+        "SELECT EXISTS (SELECT 1 FROM submissions) AND NOT EXISTS (SELECT 1 FROM user_daily_stats)"
+    ).fetchone()[0]
+    if needs_rebuild:
+        rebuild_aggregates(conn)
+
+
+def get_pool() -> ConnectionPool:
+    """ドリル結果用のコネクションプールを取得（初回のみスキーマを初期化）"""
+    return get_connection_pool(get_results_db_path(), init_results_schema)
+
+
+def update_question_stats(conn: sqlite3.Connection, email: str, outcomes: Iterable[Tuple[str, bool]]):
+    """問題ごとの正誤をユーザーの統計に加算（コミットは呼び出し側で行う）"""
+    conn.executemany(
+        """
+        INSERT INTO user_question_stats (email, question_id, attempts, incorrect)
+        VALUES (?, ?, 1, ?)
+        ON CONFLICT (email, question_id) DO UPDATE SET
+            attempts = attempts + 1,
+            incorrect = incorrect + excluded.incorrect,
+            last_answered_at = CURRENT_TIMESTAMP
+    """,
+        [(email, question_id, 0 if is_correct else 1) for question_id, is_correct in outcomes],
+    )
+
+
+def verdict_tier(verdict: AnswerVerdict) -> str:
+    """判定段階の集計区分"""
+    if verdict.is_correct:
+        return verdict.tier or TIER_EXACT
+    return TIER_ERROR if verdict.error else TIER_INCORRECT
+
+
+def update_aggregates(
+    conn: sqlite3.Connection, email: str, submitted_at: str, problems: Sequence[Mapping], results: Sequence[Dict]
+):
+    """回答送信1回分を分析用の集計に加算（コミットは呼び出し側で行う）"""
+    day = submitted_at[:10]
+    conn.executemany(
+        """
+        INSERT INTO question_stats (question_id, ref_number, category, text, attempts, incorrect, last_answered_at)
+        VALUES (?, ?, ?, ?, 1, ?, ?)
+        ON CONFLICT (question_id) DO UPDATE SET
+            ref_number = excluded.ref_number,
+            category = excluded.category,
+            text = excluded.text,
+            attempts = attempts + 1,
+            incorrect = incorrect + excluded.incorrect,
+            last_answered_at = MAX(last_answered_at, excluded.last_answered_at)
+    """,
+        [
+            (
+                problem["id"],
+                problem["ref_number"],
+                problem["category"],
+                problem["text"],
+                0 if result["is_correct"] else 1,
+                submitted_at,
+            )
+            for problem, result in zip(problems, results)
+        ],
+    )
+
+    categories: Dict[str, List[int]] = {}
+    tiers: Dict[str, int] = {}
+    for problem, result in zip(problems, results):
+        counts = categories.setdefault(problem["category"], [0, 0])
+        counts[0] += 1
+        counts[1] += int(result["is_correct"])
+        for verdict in result["verdicts"]:
+            tier = verdict_tier(verdict)
+            tiers[tier] = tiers.get(tier, 0) + 1
+
+    conn.executemany(
+        """
+        INSERT INTO category_stats (category, attempts, correct) VALUES (?, ?, ?)
+        ON CONFLICT (category) DO UPDATE SET
+            attempts = attempts + excluded.attempts,
+            correct = correct + excluded.correct
+    """,
+        [(category, attempts, correct) for category, (attempts, correct) in categories.items()],
+    )
+    conn.execute(
+        """
+        INSERT INTO user_daily_stats (email, day, submissions, questions, correct) VALUES (?, ?, 1, ?, ?)
+        ON CONFLICT (email, day) DO UPDATE SET
+            submissions = submissions + 1,
+            questions = questions + excluded.questions,
+            correct = correct + excluded.correct
+    """,
+        (email, day, len(results), sum(1 for result in results if result["is_correct"])),
+    )
+    conn.executemany(
+        """
+        INSERT INTO tier_daily_stats (day, tier, answers) VALUES (?, ?, ?)
+        ON CONFLICT (day, tier) DO UPDATE SET answers = answers + excluded.answers
+    """,
+        [(day, tier, answers) for tier, answers in tiers.items()],
+    )
+
+
+def rebuild_aggregates(conn: sqlite3.Connection):
+    """保存済みの採点結果から分析用の集計を作り直す（コミットは呼び出し側で行う）"""
+    c = conn.cursor()
+    for table in ("question_stats", "category_stats", "user_daily_stats", "tier_daily_stats"):
+        c.execute(f"DELETE FROM {table}")
+
+    # 問題文などは最後に回答された時点のもの（MAXと同じ行の値）を使う
+    c.execute(
+        """
+        INSERT INTO question_stats (question_id, ref_number, category, text, attempts, incorrect, last_answered_at)
+        SELECT q.question_id, q.ref_number, q.category, q.text, COUNT(*), SUM(1 - q.is_correct), MAX(s.submitted_at)
+        FROM submission_questions q JOIN submissions s ON s.id = q.submission_id
+        GROUP BY q.question_id
+    """
+    )
+    c.execute(
+        """
+        INSERT INTO category_stats (category, attempts, correct)
+        SELECT category, COUNT(*), SUM(is_correct) FROM submission_questions GROUP BY category
+    """
+    )
+    c.execute(
+        """
+        INSERT INTO user_daily_stats (email, day, submissions, questions, correct)
+        SELECT email, substr(submitted_at, 1, 10), COUNT(*), SUM(question_count), SUM(correct_count)
+        FROM submissions GROUP BY email, substr(submitted_at, 1, 10)
+    """
+    )
+    c.execute(
+        """
+        INSERT INTO tier_daily_stats (day, tier, answers)
+        SELECT substr(s.submitted_at, 1, 10),
+               CASE
+                   WHEN v.matched_answer IS NOT NULL THEN COALESCE(v.tier, ?)
+                   WHEN v.error IS NOT NULL THEN ?
+                   ELSE ?
+               END AS verdict_tier,
+               COUNT(*)
+        FROM submission_verdicts v JOIN submissions s ON s.id = v.submission_id
+        GROUP BY 1, 2
+    """,
+        (TIER_EXACT, TIER_ERROR, TIER_INCORRECT),
+    )
+
+
+def insert_submission(
+    conn: sqlite3.Connection,
+    email: str,
+    problems: Sequence[Mapping],
+    results: Sequence[Dict],
+    bank_version: Optional[int] = None,
+    submitted_at: Optional[str] = None,
+) -> int:
+    """回答送信1回分の採点結果を追加して問題ごとの正誤・分析用の集計を加算し、受験番号を返す（コミットは呼び出し側で行う）"""
+    submitted_at = submitted_at or format_submitted_at(datetime.now())
+    c = conn.cursor()
+    c.execute(
+        """
+        INSERT INTO submissions (email, submitted_at, bank_version, question_count, correct_count)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+        (
+            email,
+            submitted_at,
+            bank_version,
+            len(results),
+            sum(1 for result in results if result["is_correct"]),
+        ),
+    )
+    submission_id = c.lastrowid
+    c.executemany(
+        """
+        INSERT INTO submission_questions
+            (submission_id, position, question_id, ref_number, ref_page, category, text,
+             correct_answers, is_correct, message)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+        [
+            (
+                submission_id,
+                position,
+                problem["id"],
+                problem["ref_number"],
+                problem["ref_page"],
+                problem["category"],
+                problem["text"],
+                json.dumps(list(problem["correct_answers"]), ensure_ascii=False),
+                int(result["is_correct"]),
+                result["message"],
+            )
+            for position, (problem, result) in enumerate(zip(problems, results))
+        ],
+    )
+    c.executemany(
+        """
+        INSERT INTO submission_verdicts
+            (submission_id, position, answer_index, user_answer, matched_answer, tier, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+        [
+            (submission_id, position, answer_index, v.user_answer, v.correct_answer, v.tier, v.error)
+            for position, result in enumerate(results)
+            for answer_index, v in enumerate(result["verdicts"])
+        ],
+    )
+    update_question_stats(
+        conn, email, [(problem["id"], result["is_correct"]) for problem, result in zip(problems, results)]
+    )
+    update_aggregates(conn, email, submitted_at, problems, results)
+    return submission_id
+
+
+def save_submission(
+    email: str,
+    problems: Sequence[Mapping],
+    results: Sequence[Dict],
+    bank_version: Optional[int] = None,
+    submitted_at: Optional[str] = None,
+) -> int:
+    """回答送信1回分の採点結果と問題ごとの正誤を1つのトランザクションで保存し、受験番号を返す"""
+    with get_pool().connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        submission_id = insert_submission(conn, email, problems, results, bank_version, submitted_at)
+        conn.commit()
+    return submission_id
+
+
+def get_submission(submission_id: int) -> Optional[Dict]:
+    """回答送信の情報を取得（存在しない場合はNone）"""
+    with get_pool().connection() as conn:
+        row = conn.execute(
+            f"SELECT {', '.join(SUBMISSION_COLUMNS)} FROM submissions WHERE id = ?", (submission_id,)
+        ).fetchone()
+    return dict(zip(SUBMISSION_COLUMNS, row)) if row else None
+
+
+def list_submissions(email: str, limit: int = 20) -> List[Dict]:
+    """ユーザーの回答送信を新しい順に取得"""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT {", ".join(SUBMISSION_COLUMNS)}
+            FROM submissions WHERE email = ? ORDER BY submitted_at DESC, id DESC LIMIT ?
+        """,
+            (email, limit),
+        ).fetchall()
+    return [dict(zip(SUBMISSION_COLUMNS, row)) for row in rows]
+
+
+def load_submission(submission_id: int) -> Optional[Tuple[Dict, List[Dict], List[Dict]]]:
+    """保存した回答送信を（送信情報, 問題, 採点結果）として読み込む（存在しない場合はNone）"""
+    with get_pool().connection() as conn:
+        submission = conn.execute(
+            f"SELECT {', '.join(SUBMISSION_COLUMNS)} FROM submissions WHERE id = ?", (submission_id,)
+        ).fetchone()
+        if submission is None:
+            return None
+        question_rows = conn.execute(
+            """
+            SELECT position, question_id, ref_number, ref_page, category, text, correct_answers, is_correct, message
+            FROM submission_questions WHERE submission_id = ? ORDER BY position
+        """,
+            (submission_id,),
+        ).fetchall()
+        verdict_rows = conn.execute(
+            """
+            SELECT position, user_answer, matched_answer, error, tier
+            FROM submission_verdicts WHERE submission_id = ? ORDER BY position, answer_index
+        """,
+            (submission_id,),
+        ).fetchall()
+
+    verdicts: Dict[int, List[AnswerVerdict]] = {}
+    for position, *fields in verdict_rows:
+        verdicts.setdefault(position, []).append(AnswerVerdict(*fields))
+
+    problems = []
+    results = []
+    for position, question_id, ref_number, ref_page, category, text, correct_answers, is_correct, message in question_rows:
+        problems.append(
+            {
+                "id": question_id,
+                "ref_number": ref_number,
+                "ref_page": ref_page,
+                "category": category,
+                "text": text,
+                "correct_answers": json.loads(correct_answers),
+            }
+        )
+        answer_verdicts = verdicts.get(position, [])
+        results.append(
+            {
+                "is_correct": bool(is_correct),
+                "message": message,
+                "user_answers": [verdict.user_answer for verdict in answer_verdicts],
+                "verdicts": answer_verdicts,
+            }
+        )
+    return dict(zip(SUBMISSION_COLUMNS, submission)), problems, results
+
+
+def get_user_question_stats(email: str) -> Dict[str, Tuple[int, int]]:
+    """ユーザーの問題ごとの（解答回数, 不正解回数）を取得"""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            "SELECT question_id, attempts, incorrect FROM user_question_stats WHERE email = ?", (email,)
+        ).fetchall()
+    return {question_id: (attempts, incorrect) for question_id, attempts, incorrect in rows}
+
+
+def build_result_filter(
+    email: Optional[str] = None,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    categories: Optional[Sequence[str]] = None,
+) -> Tuple[str, list]:
+    """書き出し対象の絞り込み条件（WHERE句とパラメータ）を作成（end_dayはその日を含む）"""
+    conditions = []
+    params: list = []
+    if email:
+        conditions.append("s.email = ?")
+        params.append(email)
+    if start_day:
+        conditions.append("s.submitted_at >= ?")
+        params.append(start_day.isoformat())
+    if end_day:
+        conditions.append("s.submitted_at < ?")
+        params.append((end_day + timedelta(days=1)).isoformat())
+    if categories:
+        conditions.append(f"q.category IN ({', '.join('?' * len(categories))})")
+        params.extend(categories)
+    return " AND ".join(conditions) or "1", params
+
+
+def count_result_rows(**filters) -> Tuple[int, int]:
+    """条件に合う（回答送信数, 問題ごとの結果の行数）"""
+    where, params = build_result_filter(**filters)
+    with get_pool().connection() as conn:
+        return conn.execute(
+            f"""
+            SELECT COUNT(DISTINCT s.id), COUNT(*)
+            FROM submissions s JOIN submission_questions q ON q.submission_id = s.id
+            WHERE {where}
+        """,
+            params,
+        ).fetchone()
+
+
+def iter_result_rows(**filters) -> Iterator[Dict]:
+    """条件に合う問題ごとの採点結果を回答送信・出題順に1行ずつ返す
+
+    EXPORT_BATCH_SIZE行ずつ読み込むため、全件をメモリに載せずに書き出せる。
+    回答ごとの判定結果はverdictsにまとめる。
+    """
+    where, params = build_result_filter(**filters)
+    with get_pool().connection() as conn:
+        cursor = conn.execute(
+            f"""
+            SELECT s.id, s.email, s.submitted_at, s.bank_version, q.position, q.question_id, q.ref_number,
+                   q.ref_page, q.category, q.text, q.correct_answers, q.is_correct, q.message,
+                   (SELECT json_group_array(json_array(v.user_answer, v.matched_answer, v.error, v.tier))
+                    FROM submission_verdicts v
+                    WHERE v.submission_id = q.submission_id AND v.position = q.position) AS verdicts
+            FROM submissions s JOIN submission_questions q ON q.submission_id = s.id
+            WHERE {where}
+            ORDER BY s.id, q.position
+        """,
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                record = dict(zip(RESULT_ROW_COLUMNS, row))
+                record["correct_answers"] = json.loads(record["correct_answers"])
+                record["is_correct"] = bool(record["is_correct"])
+                record["verdicts"] = [AnswerVerdict(*fields) for fields in json.loads(record["verdicts"])]
+                yield record
+
+
+def get_results_overview() -> Dict:
+    """回答送信数・受講者数・問題ごとの正答率の全体集計"""
+    with get_pool().connection() as conn:
+        submissions, users, questions, correct = conn.execute(
+            """
+            SELECT COALESCE(SUM(submissions), 0), COUNT(DISTINCT email),
+                   COALESCE(SUM(questions), 0), COALESCE(SUM(correct), 0)
+            FROM user_daily_stats
+        """
+        ).fetchone()
+    return {
+        "submissions": submissions,
+        "users": users,
+        "questions": questions,
+        "correct": correct,
+        "accuracy": correct / questions if questions else 0.0,
+    }
+
+
+def get_question_analytics() -> List[Dict]:
+    """問題ごとの解答回数・誤答率（誤答率の高い順）"""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT question_id, ref_number, category, text, attempts, incorrect, last_answered_at
+            FROM question_stats ORDER BY CAST(incorrect AS REAL) / attempts DESC, attempts DESC
+        """
+        ).fetchall()
+    return [
+        {
+            "question_id": question_id,
+            "ref_number": ref_number,
+            "category": category,
+            "text": text,
+            "attempts": attempts,
+            "incorrect": incorrect,
+            "error_rate": incorrect / attempts if attempts else 0.0,
+            "last_answered_at": last_answered_at,
+        }
+        for question_id, ref_number, category, text, attempts, incorrect, last_answered_at in rows
+    ]
+
+
+def get_category_analytics() -> List[Dict]:
+    """カテゴリごとの解答回数・正答率"""
+    with get_pool().connection() as conn:
+        rows = conn.execute("SELECT category, attempts, correct FROM category_stats ORDER BY category").fetchall()
+    return [
+        {"category": category, "attempts": attempts, "correct": correct, "accuracy": correct / attempts if attempts else 0.0}
+        for category, attempts, correct in rows
+    ]
+
+
+def get_user_summaries() -> List[Dict]:
+    """受講者ごとの回答送信数・正答率・最終受講日"""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT email, SUM(submissions), SUM(questions), SUM(correct), MIN(day), MAX(day)
+            FROM user_daily_stats GROUP BY email ORDER BY MAX(day) DESC, email
+        """
+        ).fetchall()
+    return [
+        {
+            "email": email,
+            "submissions": submissions,
+            "questions": questions,
+            "correct": correct,
+            "accuracy": correct / questions if questions else 0.0,
+            "first_day": first_day,
+            "last_day": last_day,
+        }
+        for email, submissions, questions, correct, first_day, last_day in rows
+    ]
+
+
+def get_user_progress(email: str) -> List[Dict]:
+    """受講者の日ごとの回答送信数・正答率（古い順）"""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            "SELECT day, submissions, questions, correct FROM user_daily_stats WHERE email = ? ORDER BY day",
+            (email,),
+        ).fetchall()
+    return [
+        {
+            "day": day,
+            "submissions": submissions,
+            "questions": questions,
+            "correct": correct,
+            "accuracy": correct / questions if questions else 0.0,
+        }
+        for day, submissions, questions, correct in rows
+    ]
+
+
+def get_tier_breakdown(since_day: Optional[str] = None) -> Dict[str, int]:
+    """判定段階ごとの回答数（since_day以降の集計、省略時は全期間）"""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            "SELECT tier, SUM(answers) FROM tier_daily_stats WHERE day >= ? GROUP BY tier",
+            (since_day or "",),
+        ).fetchall()
+    return dict(rows)
+
+
+def refresh_aggregates():
+    """分析用の集計を保存済みの採点結果から作り直す（集計の不整合を解消する場合に使う）"""
+    with get_pool().connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_aggregates(conn)
+        conn.commit()
@@ -0,0 +1,396 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, TypeVar
+
+from utils.answer_matcher import TIER_CACHE, TIER_EXACT, TIER_LLM, TIER_LOCAL, AnswerMatcher
+
+# 採点に使用するモデル
+GRADING_MODEL = "gpt-4o-mini"
+
+# 採点モード（batch: 1問につき1リクエスト、pair: 回答の組ごとに1リクエスト）
+GRADING_MODE_BATCH = "batch"
+GRADING_MODE_PAIR = "pair"
+DEFAULT_GRADING_MODE = GRADING_MODE_BATCH
+
+# 同時に発行するLLMリクエスト数の既定値
+DEFAULT_MAX_CONCURRENCY = 8
+
+# 判定段階の順序（後ろほどコストが高い）
+TIER_ORDER = [TIER_EXACT, TIER_LOCAL, TIER_CACHE, TIER_LLM]
+
+CLIENT_UNAVAILABLE_MESSAGE = "OpenAIクライアントの初期化に失敗しました"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class GradingTask:
+    """意味一致判定1件分の入力"""
+
+    user_answer: str
+    correct_answer: str
+    evaluation_criteria: Optional[str] = None
+
+
+@dataclass
+class ProblemGradingTask:
+    """1問分の採点入力"""
+
+    user_answers: List[str]
+    correct_answers: List[str]
+    evaluation_criteria: Optional[str] = None
+
+
+@dataclass
+class AnswerVerdict:
+    """ユーザー回答1件分の判定結果"""
+
+    user_answer: str
+    correct_answer: Optional[str] = None  # 一致した模範解答（不一致の場合はNone）
+    error: Optional[str] = None
+    tier: Optional[str] = None  # 判定を確定させた段階（exact/local/cache/llm）
+
+    @property
+    def is_correct(self) -> bool:
+        return self.correct_answer is not None
+
+
+@dataclass
+class PairVerdict:
+    """回答と模範解答1組の判定結果"""
+
+    verdict: bool = False
+    tier: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class CallOutcome:
+    """並列実行した1件分の結果（失敗時はerrorに内容を格納）"""
+
+    value: Any = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def task_cache_key(task: GradingTask) -> tuple:
+    """キャッシュ参照用のキーを作成"""
+    return (task.user_answer, task.correct_answer, task.evaluation_criteria, GRADING_MODEL)
+
+
+def build_system_prompt(evaluation_criteria: Optional[str] = None) -> str:
+    """採点用のシステムプロンプトを作成"""
+    system_prompt = "あなたはテスト技術の専門家です。ユーザーの回答が模範解答と意味的に一致しているかを判断してください。"
+    if evaluation_criteria:
+        system_prompt += f"\n\n評価基準：\n{evaluation_criteria}"
+    return system_prompt
+
+
+def request_semantic_match(client, task: GradingTask) -> bool:
+    """LLMに1組の回答の意味一致を問い合わせる（失敗時は例外を送出）"""
+    response = client.chat.completions.create(
+        model=GRADING_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": build_system_prompt(task.evaluation_criteria),
+            },
+            {
+                "role": "user",
+                "content": f"ユーザーの回答: {task.user_answer}\n模範解答: {task.correct_answer}\nこれらは意味的に一致していますか？YesまたはNoで答えてください。",
+            },
+        ],
+    )
+    return response.choices[0].message.content.strip().lower() == "yes"
+
+
+def build_batch_prompt(task: ProblemGradingTask) -> str:
+    """1問分の回答をまとめて判定するためのユーザープロンプトを作成"""
+    correct_lines = "\n".join(f"{i}. {answer}" for i, answer in enumerate(task.correct_answers))
+    user_lines = "\n".join(f"{i}. {answer}" for i, answer in enumerate(task.user_answers))
+    return (
+        f"模範解答:\n{correct_lines}\n\n"
+        f"ユーザーの回答:\n{user_lines}\n\n"
+        "ユーザーの回答それぞれについて、意味的に一致する模範解答の番号をすべて挙げてください。"
+        "一致するものがない場合は空のリストにしてください。\n"
+        '次のJSON形式のみで答えてください: {"verdicts": [{"answer": 0, "matches": [0]}]}'
+    )
+
+
+def parse_batch_response(content: str, user_count: int, correct_count: int) -> List[List[int]]:
+    """バッチ判定の応答JSONを回答ごとの一致候補（模範解答の番号）に変換"""
+    candidates: List[List[int]] = [[] for _ in range(user_count)]
+    data = json.loads(content)
+    for verdict in data.get("verdicts", []):
+        answer_index = verdict.get("answer")
+        if not isinstance(answer_index, int) or not 0 <= answer_index < user_count:
+            continue
+        for match in verdict.get("matches") or []:
+            if isinstance(match, int) and 0 <= match < correct_count and match not in candidates[answer_index]:
+                candidates[answer_index].append(match)
+    return candidates
+
+
+def request_batch_match(client, task: ProblemGradingTask) -> List[List[int]]:
+    """LLMに1問分の回答をまとめて問い合わせ、回答ごとの一致候補を返す（失敗時は例外を送出）"""
+    response = client.chat.completions.create(
+        model=GRADING_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": build_system_prompt(task.evaluation_criteria),
+            },
+            {
+                "role": "user",
+                "content": build_batch_prompt(task),
+            },
+        ],
+        response_format={"type": "json_object"},
+        temperature=0,
+    )
+    return parse_batch_response(
+        response.choices[0].message.content, len(task.user_answers), len(task.correct_answers)
+    )
+
+
+def assign_matches(candidates: List[List[int]], correct_count: int) -> List[Optional[int]]:
+    """一致候補から各回答に模範解答を重複なく割り当てる（二部グラフの最大マッチング）"""
+    owner: List[Optional[int]] = [None] * correct_count
+
+    def try_assign(answer_index: int, visited: List[bool]) -> bool:
+        for correct_index in candidates[answer_index]:
+            if visited[correct_index]:
+                continue
+            visited[correct_index] = True
+            if owner[correct_index] is None or try_assign(owner[correct_index], visited):
+                owner[correct_index] = answer_index
+                return True
+        return False
+
+    for answer_index in range(len(candidates)):
+        try_assign(answer_index, [False] * correct_count)
+
+    assignment: List[Optional[int]] = [None] * len(candidates)
+    for correct_index, answer_index in enumerate(owner):
+        if answer_index is not None:
+            assignment[answer_index] = correct_index
+    return assignment
+
+
+def run_concurrently(
+    func: Callable[[T], R], items: Sequence[T], max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+) -> List[CallOutcome]:
+    """itemsの各要素にfuncを並列適用し、入力と同じ順序で結果を返す
+
+    1件の失敗は他の呼び出しに影響せず、該当要素のCallOutcome.errorに記録される。
+    全体の待ち時間は最も遅い呼び出し（と同時実行数の上限）で決まる。
+    """
+    if not items:
+        return []
+
+    def call(item: T) -> CallOutcome:
+        try:
+            return CallOutcome(value=func(item))
+        except Exception as e:
+            return CallOutcome(error=str(e))
+
+    workers = max(1, min(max_concurrency, len(items)))
+    if workers == 1:
+        return [call(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grading") as executor:
+        return list(executor.map(call, items))
+
+
+def grade_tasks(
+    client, tasks: Sequence[GradingTask], max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+) -> List[CallOutcome]:
+    """複数の意味一致判定をまとめて並列に実行する"""
+    if client is None:
+        return [CallOutcome(error=CLIENT_UNAVAILABLE_MESSAGE) for _ in tasks]
+    return run_concurrently(lambda task: request_semantic_match(client, task), tasks, max_concurrency)
+
+
+def grade_pairs(
+    client,
+    tasks: Sequence[GradingTask],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    cache=None,
+    matcher: Optional[AnswerMatcher] = None,
+) -> List[PairVerdict]:
+    """意味一致判定を行う（ローカル判定・キャッシュで決まらない組のみLLMに問い合わせる）"""
+    results: List[Optional[PairVerdict]] = [None] * len(tasks)
+    undecided = []
+    for i, task in enumerate(tasks):
+        local = matcher.match(task.user_answer, task.correct_answer) if matcher else None
+        if local and local.verdict is not None:
+            results[i] = PairVerdict(local.verdict, local.tier)
+        else:
+            undecided.append(i)
+
+    cached = cache.get_many([task_cache_key(tasks[i]) for i in undecided]) if cache else [None] * len(undecided)
+    pending = []
+    for i, verdict in zip(undecided, cached):
+        if verdict is None:
+            pending.append(i)
+        else:
+            results[i] = PairVerdict(verdict, TIER_CACHE)
+
+    new_entries = []
+    for i, outcome in zip(pending, grade_tasks(client, [tasks[i] for i in pending], max_concurrency)):
+        if outcome.ok:
+            results[i] = PairVerdict(bool(outcome.value), TIER_LLM)
+            new_entries.append((task_cache_key(tasks[i]), bool(outcome.value)))
+        else:
+            results[i] = PairVerdict(error=outcome.error)
+
+    if cache:
+        cache.put_many(new_entries)
+    return results
+
+
+def grade_batches(
+    client,
+    tasks: Sequence[ProblemGradingTask],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    cache=None,
+    matcher: Optional[AnswerMatcher] = None,
+) -> List[List[List[PairVerdict]]]:
+    """問題ごとに回答×模範解答の判定表を作成する
+
+    ローカル判定で一致が確定した回答はその時点で確定し、残りの組はキャッシュを参照する。
+    それでも決まらない回答だけを1問1リクエストでLLMに問い合わせる。
+    """
+    # 判定表（未確定のセルはNone）
+    tables: List[List[List[Optional[PairVerdict]]]] = []
+    for task in tasks:
+        table = []
+        for user_ans in task.user_answers:
+            row: List[Optional[PairVerdict]] = []
+            for correct_ans in task.correct_answers:
+                local = matcher.match(user_ans, correct_ans) if matcher else None
+                row.append(PairVerdict(local.verdict, local.tier) if local and local.verdict is not None else None)
+            # 明らかに一致する模範解答がある回答は残りの組を不一致として確定する
+            if any(cell and cell.verdict for cell in row):
+                row = [cell or PairVerdict(False, TIER_LOCAL) for cell in row]
+            table.append(row)
+        tables.append(table)
+
+    undecided = [
+        (t, i, j)
+        for t, table in enumerate(tables)
+        for i, row in enumerate(table)
+        for j, cell in enumerate(row)
+        if cell is None
+    ]
+    keys = [
+        (tasks[t].user_answers[i], tasks[t].correct_answers[j], tasks[t].evaluation_criteria, GRADING_MODEL)
+        for t, i, j in undecided
+    ]
+    for (t, i, j), verdict in zip(undecided, cache.get_many(keys) if cache else [None] * len(keys)):
+        if verdict is not None:
+            tables[t][i][j] = PairVerdict(verdict, TIER_CACHE)
+
+    requests: List[ProblemGradingTask] = []
+    request_owners = []
+    for t, (task, table) in enumerate(zip(tasks, tables)):
+        pending = [i for i, row in enumerate(table) if None in row]
+        if pending:
+            requests.append(
+                ProblemGradingTask(
+                    [task.user_answers[i] for i in pending], task.correct_answers, task.evaluation_criteria
+                )
+            )
+            request_owners.append((t, pending))
+
+    if client is None:
+        outcomes = [CallOutcome(error=CLIENT_UNAVAILABLE_MESSAGE) for _ in requests]
+    else:
+        outcomes = run_concurrently(lambda task: request_batch_match(client, task), requests, max_concurrency)
+
+    new_entries = []
+    for request, (t, pending), outcome in zip(requests, request_owners, outcomes):
+        for k, i in enumerate(pending):
+            row = tables[t][i]
+            for j, cell in enumerate(row):
+                if cell is not None:
+                    continue
+                if not outcome.ok:
+                    row[j] = PairVerdict(error=outcome.error)
+                    continue
+                verdict = j in outcome.value[k]
+                row[j] = PairVerdict(verdict, TIER_LLM)
+                key = (request.user_answers[k], request.correct_answers[j], request.evaluation_criteria, GRADING_MODEL)
+                new_entries.append((key, verdict))
+
+    if cache:
+        cache.put_many(new_entries)
+    return tables
+
+
+def deciding_tier(cells: Sequence[PairVerdict]) -> Optional[str]:
+    """不一致の判定を確定させた段階（最も後段のもの）を返す"""
+    tiers = [cell.tier for cell in cells if cell.tier in TIER_ORDER]
+    return max(tiers, key=TIER_ORDER.index) if tiers else None
+
+
+def grade_problems(
+    client,
+    tasks: Sequence[ProblemGradingTask],
+    mode: str = DEFAULT_GRADING_MODE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    cache=None,
+    matcher: Optional[AnswerMatcher] = None,
+) -> List[List[AnswerVerdict]]:
+    """複数問題の回答を採点し、問題ごとに回答単位の判定結果を返す
+
+    batchモードでは1問につき1リクエストで全回答を判定し、各回答をどの模範解答とも照合する。
+    pairモードではソート済みの回答と模範解答を同じ位置同士で1組ずつ判定する。
+    matcherを渡した場合は明らかな一致・不一致をローカルで判定し、
+    cacheを渡した場合は判定済みの組をキャッシュから返して新しい判定結果を保存する。
+    各判定結果のtierには判定を確定させた段階が記録される。
+    """
+    if mode == GRADING_MODE_PAIR:
+        pair_tasks: List[GradingTask] = []
+        ranges = []
+        for task in tasks:
+            pairs = [
+                GradingTask(user_ans, correct_ans, task.evaluation_criteria)
+                for user_ans, correct_ans in zip(sorted(task.user_answers), sorted(task.correct_answers))
+            ]
+            ranges.append((len(pair_tasks), len(pair_tasks) + len(pairs)))
+            pair_tasks.extend(pairs)
+
+        pair_verdicts = grade_pairs(client, pair_tasks, max_concurrency, cache, matcher)
+        return [
+            [
+                AnswerVerdict(
+                    pair.user_answer,
+                    pair.correct_answer if result.verdict else None,
+                    result.error,
+                    result.tier,
+                )
+                for pair, result in zip(pair_tasks[start:end], pair_verdicts[start:end])
+            ]
+            for start, end in ranges
+        ]
+
+    tables = grade_batches(client, tasks, max_concurrency, cache, matcher)
+    results = []
+    for task, table in zip(tasks, tables):
+        candidates = [[j for j, cell in enumerate(row) if cell.verdict] for row in table]
+        assignment = assign_matches(candidates, len(task.correct_answers))
+        verdicts = []
+        for answer, row, index in zip(task.user_answers, table, assignment):
+            if index is not None:
+                verdicts.append(AnswerVerdict(answer, task.correct_answers[index], tier=row[index].tier))
+            else:
+                error = next((cell.error for cell in row if cell.error), None)
+                verdicts.append(AnswerVerdict(answer, error=error, tier=None if error else deciding_tier(row)))
+        results.append(verdicts)
+    return results
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import streamlit as st
+
+from utils.db import get_connection_pool
+from utils.metrics import get_metrics
+
+# 既定値（secrets.tomlの[grading_cache]セクションで変更可能）
+DEFAULT_TTL_DAYS = 90
+DEFAULT_MAX_ROWS = 200_000
+DEFAULT_MEMORY_ENTRIES = 4096
+
+# 期限切れ・上限超過の行を削除する間隔（書き込み件数）
+PRUNE_INTERVAL = 500
+
+# (user_answer, correct_answer, evaluation_criteria, model)
+CacheKey = Tuple[str, str, Optional[str], str]
+
+
+def get_cache_db_path() -> Path:
+    """採点キャッシュのDBファイルパスを取得（users.dbと同じdataディレクトリ）"""
+    db_dir = Path(__file__).parent.parent / "data"
+    db_dir.mkdir(parents=True, exist_ok=True)
+    return db_dir / "grading_cache.db"
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """キャッシュキー用に文字列を正規化（全角半角の統一と空白の圧縮）"""
+    if not text:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def make_cache_key(user_answer: str, correct_answer: str, evaluation_criteria: Optional[str], model: str) -> str:
+    """正規化した入力からキャッシュキー（SHA-256）を作成"""
+    payload = json.dumps(
+        [
+            normalize_text(user_answer),
+            normalize_text(correct_answer),
+            normalize_text(evaluation_criteria),
+            model,
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GradingCache:
+    """意味一致判定の結果を保存する永続キャッシュ
+
+    プロセス内のLRUを前段に置き、ミスした場合のみSQLiteを参照する。
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        ttl_seconds: float = DEFAULT_TTL_DAYS * 86400,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    ):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._pool = get_connection_pool(db_path, self._init_schema)
+
+    @staticmethod
+    def _init_schema(conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS grading_cache (
+                cache_key TEXT PRIMARY KEY,
+                verdict BOOLEAN NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_grading_cache_created_at ON grading_cache (created_at)")
+
+    def _remember(self, key: str, verdict: bool, created_at: float):
+        self._memory[key] = (verdict, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Sequence[CacheKey]) -> List[Optional[bool]]:
+        """複数の判定結果をまとめて取得（未登録・期限切れはNone）"""
+        hashed = [make_cache_key(*key) for key in keys]
+        results: List[Optional[bool]] = [None] * len(keys)
+        expire_before = time.time() - self.ttl_seconds
+        pending: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, cache_key in enumerate(hashed):
+                entry = self._memory.get(cache_key)
+                if entry and entry[1] >= expire_before:
+                    self._memory.move_to_end(cache_key)
+                    results[i] = entry[0]
+                    self.memory_hits += 1
+                else:
+                    pending.setdefault(cache_key, []).append(i)
+
+        if pending:
+            rows = []
+            try:
+                with self._pool.connection() as conn:
+                    pending_keys = list(pending)
+                    # SQLiteのパラメータ数上限を超えないように分割して問い合わせる
+                    for start in range(0, len(pending_keys), 500):
+                        chunk = pending_keys[start : start + 500]
+                        placeholders = ",".join("?" * len(chunk))
+                        rows.extend(
+                            conn.execute(
+                                f"SELECT cache_key, verdict, created_at FROM grading_cache "
+                                f"WHERE cache_key IN ({placeholders}) AND created_at >= ?",
+                                (*chunk, expire_before),
+                            ).fetchall()
+                        )
+            except Exception as e:
+                print(f"採点キャッシュ読み込みエラー: {str(e)}")
+
+            with self._lock:
+                for cache_key, verdict, created_at in rows:
+                    for i in pending.pop(cache_key, []):
+                        results[i] = bool(verdict)
+                        self.db_hits += 1
+                    self._remember(cache_key, bool(verdict), created_at)
+                self.misses += sum(len(indexes) for indexes in pending.values())
+
+        return results
+
+    def get(
+        self, user_answer: str, correct_answer: str, evaluation_criteria: Optional[str], model: str
+    ) -> Optional[bool]:
+        """判定結果を1件取得"""
+        return self.get_many([(user_answer, correct_answer, evaluation_criteria, model)])[0]
+
+    def put_many(self, entries: Sequence[Tuple[CacheKey, bool]]):
+        """複数の判定結果をまとめて保存"""
+        if not entries:
+            return
+        now = time.time()
+        rows = [(make_cache_key(*key), bool(verdict), now) for key, verdict in entries]
+
+        with self._lock:
+            for cache_key, verdict, created_at in rows:
+                self._remember(cache_key, verdict, created_at)
+            self._writes_since_prune += len(rows)
+            should_prune = self._writes_since_prune >= PRUNE_INTERVAL
+            if should_prune:
+                self._writes_since_prune = 0
+
+        try:
+            with self._pool.connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO grading_cache (cache_key, verdict, created_at) VALUES (?, ?, ?)", rows
+                )
+                if should_prune:
+                    self._prune(conn)
+                conn.commit()
+        except Exception as e:
+            print(f"採点キャッシュ書き込みエラー: {str(e)}")
+
+    def _prune(self, conn: sqlite3.Connection):
+        """期限切れの行と上限を超えた古い行を削除"""
+        conn.execute("DELETE FROM grading_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        conn.execute(
+            """
+            DELETE FROM grading_cache WHERE cache_key IN (
+                SELECT cache_key FROM grading_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        """,
+            (self.max_rows,),
+        )
+
+    def prune(self):
+        """期限切れ・上限超過の行を削除"""
+        with self._pool.connection() as conn:
+            self._prune(conn)
+            conn.commit()
+
+    def clear(self):
+        """キャッシュを全て削除"""
+        with self._lock:
+            self._memory.clear()
+        with self._pool.connection() as conn:
+            conn.execute("DELETE FROM grading_cache")
+            conn.commit()
+
+    def count_rows(self) -> int:
+        """保存されている判定結果の件数を取得"""
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM grading_cache").fetchone()[0]
+
+    def stats(self) -> Dict:
+        """ヒット・ミスの統計情報を取得"""
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+
+_cache_lock = threading.Lock()
+_cache: Optional[GradingCache] = None
+
+
+def get_grading_cache() -> GradingCache:
+    """プロセス共通の採点キャッシュを取得"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                settings = st.secrets.get("grading_cache", {})
+            except Exception:
+                settings = {}
+            _cache = GradingCache(
+                get_cache_db_path(),
+                ttl_seconds=float(settings.get("ttl_days", DEFAULT_TTL_DAYS)) * 86400,
+                max_rows=int(settings.get("max_rows", DEFAULT_MAX_ROWS)),
+                memory_entries=int(settings.get("memory_entries", DEFAULT_MEMORY_ENTRIES)),
+            )
+            get_metrics().register_collector("grading_cache", _cache.stats)
+        return _cache
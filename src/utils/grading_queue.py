@@ -0,0 +1,343 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+import streamlit as st
+
+from utils.drill_results import format_submitted_at, get_pool, insert_submission
+from utils.metrics import get_metrics, increment, record_error
+
+# ジョブの状態
+STATUS_PENDING = "pending"  # 採点待ち（再試行待ちを含む）
+STATUS_RUNNING = "running"  # ワーカーが採点中
+STATUS_DONE = "done"  # 採点済み（submission_idに結果を保存）
+STATUS_FAILED = "failed"  # 再試行の上限に達した
+
+# 既定値（secrets.tomlの[grading_queue]セクションで変更可能）
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BACKOFF_SECONDS = 5.0
+DEFAULT_MAX_BACKOFF_SECONDS = 300.0
+
+# 採点待ちのジョブがない場合に、DBを確認し直すまでの最大の待ち時間（秒）
+IDLE_POLL_SECONDS = 5.0
+
+JOB_COLUMNS = (
+    "id",
+    "email",
+    "status",
+    "attempts",
+    "next_attempt_at",
+    "last_error",
+    "submission_id",
+    "created_at",
+    "updated_at",
+)
+
+# 全問題分の回答を採点する関数（problems, all_user_answers）-> results
+GradeFunction = Callable[[List[Dict], List[List[str]]], List[Dict]]
+
+
+class GradingUnavailable(Exception):
+    """LLMのエラーで判定できなかった回答がある（時間をおいて再試行する）"""
+
+
+def find_grading_errors(results: Sequence[Dict]) -> List[str]:
+    """採点結果に含まれるLLMのエラーを取得"""
+    return sorted({verdict.error for result in results for verdict in result["verdicts"] if verdict.error})
+
+
+def backoff_delay(attempts: int, base: float, maximum: float) -> float:
+    """attempts回目の失敗後に再試行するまでの待ち時間（指数バックオフ、±25%のジッター付き）"""
+    return min(maximum, base * 2 ** max(0, attempts - 1)) * random.uniform(0.75, 1.25)
+
+
+class GradingQueue:
+    """SQLiteに保存する回答送信の採点キュー
+
+    回答送信はgrading_jobsテーブルに保存してすぐに受付番号を返し、ワーカースレッドが採点する。
+    LLMのエラーで判定できなかった場合は指数バックオフで再試行し、
+    採点結果の保存とジョブの完了は1つのトランザクションで行う。
+    プロセスの再起動時は採点中だったジョブを採点待ちに戻して再開する。
+    """
+
+    def __init__(
+        self,
+        grade: GradeFunction,
+        workers: int = DEFAULT_WORKERS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+        max_backoff_seconds: float = DEFAULT_MAX_BACKOFF_SECONDS,
+    ):
+        self.grade = grade
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """中断されたジョブを採点待ちに戻してワーカースレッドを起動（2回目以降は何もしない）"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            recovered = self.requeue_interrupted()
+            if recovered:
+                print(f"中断された採点ジョブを再開: {recovered}件")
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"grading-queue-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """ワーカースレッドを停止（採点中のジョブは完了を待つ）"""
+        with self._lock:
+            self._stop.set()
+            self._wakeup.set()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def requeue_interrupted(self) -> int:
+        """採点中のまま残っているジョブ（前回のプロセス終了で中断されたもの）を採点待ちに戻す"""
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                "UPDATE grading_jobs SET status = ?, next_attempt_at = ?, updated_at = ? WHERE status = ?",
+                (STATUS_PENDING, time.time(), format_submitted_at(datetime.now()), STATUS_RUNNING),
+            )
+            conn.commit()
+            return c.rowcount
+
+    def enqueue(
+        self,
+        email: str,
+        problems: Sequence[Mapping],
+        all_user_answers: List[List[str]],
+        bank_version: Optional[int] = None,
+    ) -> int:
+        """回答送信を採点待ちとして保存し、受付番号（ジョブID）を返す"""
+        payload = json.dumps(
+            {
+                "problems": [dict(problem, correct_answers=list(problem["correct_answers"])) for problem in problems],
+                "answers": all_user_answers,
+                "bank_version": bank_version,
+            },
+            ensure_ascii=False,
+        )
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                """
+                INSERT INTO grading_jobs (email, status, payload, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+                (email, STATUS_PENDING, payload, time.time(), format_submitted_at(datetime.now())),
+            )
+            conn.commit()
+            job_id = c.lastrowid
+
+        increment("grading_queue.enqueued")
+        self._wakeup.set()
+        return job_id
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """ジョブの状態を取得（存在しない場合はNone）"""
+        with get_pool().connection() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM grading_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def list_jobs(self, email: str, statuses: Sequence[str] = (STATUS_PENDING, STATUS_RUNNING, STATUS_FAILED)) -> List[Dict]:
+        """ユーザーのジョブを指定した状態に絞って古い順に取得"""
+        with get_pool().connection() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {', '.join(JOB_COLUMNS)} FROM grading_jobs
+                WHERE email = ? AND status IN ({', '.join('?' * len(statuses))}) ORDER BY id
+            """,
+                (email, *statuses),
+            ).fetchall()
+        return [dict(zip(JOB_COLUMNS, row)) for row in rows]
+
+    def retry(self, job_id: int) -> bool:
+        """再試行の上限に達したジョブを採点待ちに戻す"""
+        with get_pool().connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                """
+                UPDATE grading_jobs SET status = ?, attempts = 0, next_attempt_at = ?, last_error = NULL, updated_at = ?
+                WHERE id = ? AND status = ?
+            """,
+                (STATUS_PENDING, time.time(), format_submitted_at(datetime.now()), job_id, STATUS_FAILED),
+            )
+            conn.commit()
+            retried = c.rowcount > 0
+
+        if retried:
+            self._wakeup.set()
+        return retried
+
+    def stats(self) -> Dict[str, int]:
+        """状態ごとのジョブ数"""
+        with get_pool().connection() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM grading_jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (STATUS_PENDING, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED)}
+        counts.update(rows)
+        return counts
+
+    def _claim(self) -> Optional[tuple]:
+        """採点時刻になったジョブを1件取り出して採点中にする"""
+        with get_pool().connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT id, email, payload, attempts, created_at FROM grading_jobs
+                WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT 1
+            """,
+                (STATUS_PENDING, time.time()),
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute(
+                "UPDATE grading_jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, format_submitted_at(datetime.now()), row[0]),
+            )
+            conn.commit()
+        return row
+
+    def _seconds_until_next(self) -> float:
+        """次に採点時刻になるジョブまでの待ち時間"""
+        with get_pool().connection() as conn:
+            next_attempt_at = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM grading_jobs WHERE status = ?", (STATUS_PENDING,)
+            ).fetchone()[0]
+        if next_attempt_at is None:
+            return IDLE_POLL_SECONDS
+        return min(IDLE_POLL_SECONDS, max(0.0, next_attempt_at - time.time()))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+                if job is None:
+                    self._wakeup.wait(self._seconds_until_next())
+                    self._wakeup.clear()
+                    continue
+                self._process(*job)
+            except Exception as e:
+                print(f"採点キューのワーカーでエラー: {str(e)}")
+                record_error("grading_queue.worker", e)
+                self._stop.wait(IDLE_POLL_SECONDS)
+
+    def _process(self, job_id: int, email: str, payload: str, attempts: int, created_at: str):
+        """1件のジョブを採点し、結果を保存する（判定できなかった場合は再試行を予約）"""
+        try:
+            data = json.loads(payload)
+            problems = data["problems"]
+            results = self.grade(problems, data["answers"])
+            errors = find_grading_errors(results)
+            if errors:
+                raise GradingUnavailable(" / ".join(errors))
+            self._complete(job_id, email, problems, results, data["bank_version"], created_at)
+        except Exception as e:
+            self._reschedule(job_id, attempts + 1, e)
+
+    def _complete(
+        self, job_id: int, email: str, problems: List[Dict], results: List[Dict], bank_version: Optional[int], created_at: str
+    ):
+        """採点結果の保存とジョブの完了を1つのトランザクションで行う（送信日時は受付日時）"""
+        with get_pool().connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            submission_id = insert_submission(conn, email, problems, results, bank_version, created_at)
+            conn.execute(
+                "UPDATE grading_jobs SET status = ?, submission_id = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (STATUS_DONE, submission_id, format_submitted_at(datetime.now()), job_id),
+            )
+            conn.commit()
+        increment("grading_queue.completed")
+
+    def _reschedule(self, job_id: int, attempts: int, error: Exception):
+        """失敗したジョブを再試行待ちに戻す（上限に達した場合は失敗にする）"""
+        record_error("grading_queue.attempt", error)
+        if attempts >= self.max_attempts:
+            status, next_attempt_at = STATUS_FAILED, time.time()
+            increment("grading_queue.failed")
+        else:
+            status = STATUS_PENDING
+            next_attempt_at = time.time() + backoff_delay(attempts, self.backoff_seconds, self.max_backoff_seconds)
+            increment("grading_queue.retries")
+
+        with get_pool().connection() as conn:
+            conn.execute(
+                """
+                UPDATE grading_jobs SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+                WHERE id = ?
+            """,
+                (status, next_attempt_at, str(error), format_submitted_at(datetime.now()), job_id),
+            )
+            conn.commit()
+
+
+_queue: Optional[GradingQueue] = None
+_queue_lock = threading.Lock()
+_start_thread: Optional[threading.Thread] = None
+
+
+def get_grading_queue_setting(name: str, default):
+    """採点キューの設定を取得（secrets.tomlの[grading_queue]セクションで変更可能）"""
+    try:
+        return st.secrets.get("grading_queue", {}).get(name, default)
+    except Exception:
+        return default
+
+
+def get_grading_queue(grade: GradeFunction) -> GradingQueue:
+    """プロセス共通の採点キューを取得（初回にワーカースレッドを起動し、中断されたジョブを再開）"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            try:
+                queue = GradingQueue(
+                    grade,
+                    workers=max(1, int(get_grading_queue_setting("workers", DEFAULT_WORKERS))),
+                    max_attempts=max(1, int(get_grading_queue_setting("max_attempts", DEFAULT_MAX_ATTEMPTS))),
+                    backoff_seconds=float(get_grading_queue_setting("backoff_seconds", DEFAULT_BACKOFF_SECONDS)),
+                    max_backoff_seconds=float(
+                        get_grading_queue_setting("max_backoff_seconds", DEFAULT_MAX_BACKOFF_SECONDS)
+                    ),
+                )
+            except (TypeError, ValueError):
+                queue = GradingQueue(grade)
+            queue.start()
+            get_metrics().register_collector("grading_queue", queue.stats)
+            _queue = queue
+        return _queue
+
+
+def start_grading_queue_in_background(get_queue: Callable[[], GradingQueue]) -> threading.Thread:
+    """採点キューを別スレッドで起動（プロセスで1回だけ、アプリの起動時に呼び出す）
+
+    get_queueは採点関数を読み込んでget_grading_queueを呼び出す関数。
+    """
+    global _start_thread
+    with _queue_lock:
+        if _start_thread is None:
+
+            def start():
+                try:
+                    get_queue()
+                except Exception as e:
+                    print(f"採点キューの起動エラー: {str(e)}")
+                    record_error("grading_queue.start", e)
+
+            _start_thread = threading.Thread(target=start, name="grading-queue-start", daemon=True)
+            _start_thread.start()
+        return _start_thread
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.answer_matcher import normalize_answer, similarity
+from utils.chat_context import count_tokens
+
+# 利用できるバックエンド
+BACKEND_OPENAI = "openai"  # OpenAI API
+BACKEND_FAKE = "fake"  # プロセス内の疑似バックエンド
+BACKEND_HTTP = "http"  # OpenAI互換のHTTPサーバー（scripts/mock_llm_server.pyなど）
+
+# 疑似バックエンドの既定値
+DEFAULT_FAKE_LATENCY_SECONDS = 0.2
+DEFAULT_FAKE_CHUNK_DELAY_SECONDS = 0.01
+DEFAULT_FAKE_CHUNK_CHARS = 8
+DEFAULT_FAKE_RESPONSE_CHARS = 400
+DEFAULT_MOCK_SERVER_URL = "http://127.0.0.1:8765/v1"
+
+# 疑似バックエンドで意味一致とみなす類似度
+FAKE_MATCH_THRESHOLD = 0.5
+
+# 応答を決める関数（messages, リクエスト全体）-> 応答本文
+Responder = Callable[[List[Dict], Dict], str]
+
+
+def _numbered_items(section: str) -> List[str]:
+    return [match.group(1).strip() for match in re.finditer(r"^\d+\. (.*)$", section, re.MULTILINE)]
+
+
+def _fake_match(user_answer: str, correct_answer: str) -> bool:
+    return similarity(normalize_answer(user_answer), normalize_answer(correct_answer)) >= FAKE_MATCH_THRESHOLD
+
+
+def default_responder(messages: List[Dict], request: Dict) -> str:
+    """リクエスト内容から決定的に応答を作る
+
+    採点のバッチ判定・Yes/No判定には文字列の類似度で答え、
+    それ以外（チャット）には最後のユーザー入力を含む固定長の文章を返す。
+    """
+    content = messages[-1]["content"] if messages else ""
+
+    batch = re.search(r"模範解答:\n(.*?)\n\nユーザーの回答:\n(.*?)\n\n", content, re.DOTALL)
+    if batch:
+        correct_answers = _numbered_items(batch.group(1))
+        user_answers = _numbered_items(batch.group(2))
+        verdicts = [
+            {"answer": i, "matches": [j for j, correct in enumerate(correct_answers) if _fake_match(user, correct)]}
+            for i, user in enumerate(user_answers)
+        ]
+        return json.dumps({"verdicts": verdicts}, ensure_ascii=False)
+
+    pair = re.search(r"ユーザーの回答: (.*)\n模範解答: (.*)\n", content)
+    if pair:
+        return "Yes" if _fake_match(pair.group(1), pair.group(2)) else "No"
+
+    text = f"（モック応答）「{content[:50]}」についての回答です。"
+    return (text * (DEFAULT_FAKE_RESPONSE_CHARS // len(text) + 1))[:DEFAULT_FAKE_RESPONSE_CHARS]
+
+
+def build_completion(content: str, request: Dict) -> Dict:
+    """Chat Completions形式の応答を作成"""
+    prompt_tokens = sum(count_tokens(message.get("content") or "") for message in request.get("messages", []))
+    completion_tokens = count_tokens(content)
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def build_chunks(content: str, request: Dict, chunk_chars: int = DEFAULT_FAKE_CHUNK_CHARS) -> List[Dict]:
+    """Chat Completionsのストリーミング形式のチャンク列を作成"""
+    completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    def chunk(delta: Dict, finish_reason: Optional[str] = None) -> Dict:
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    chunks = [chunk({"role": "assistant", "content": ""})]
+    chunks.extend(chunk({"content": content[i : i + chunk_chars]}) for i in range(0, len(content), chunk_chars))
+    chunks.append(chunk({"content": None}, "stop"))
+    return chunks
+
+
+def to_namespace(value: Any) -> Any:
+    """dictを属性アクセスできるオブジェクトに変換（SDKの応答オブジェクトの代わり）"""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: to_namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [to_namespace(item) for item in value]
+    return value
+
+
+class FakeAPIError(Exception):
+    """疑似バックエンドが注入するAPIエラー（openai.APIStatusError相当の属性を持つ）"""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"Error code: {status_code} (injected by fake backend)")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FaultInjector:
+    """遅延とエラーの注入設定"""
+
+    def __init__(
+        self,
+        latency: float = DEFAULT_FAKE_LATENCY_SECONDS,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        retry_after: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+
+    def next_latency(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def next_error(self) -> Optional[FakeAPIError]:
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            return FakeAPIError(self.error_status, self.retry_after)
+        return None
+
+
+class _FakeCompletions:
+    def __init__(self, backend: "FakeAsyncOpenAI"):
+        self._backend = backend
+
+    async def create(self, **kwargs):
+        backend = self._backend
+        backend.calls += 1
+        await asyncio.sleep(backend.faults.next_latency())
+        error = backend.faults.next_error()
+        if error is not None:
+            raise error
+
+        content = backend.responder(kwargs.get("messages", []), kwargs)
+        if not kwargs.get("stream"):
+            return to_namespace(build_completion(content, kwargs))
+
+        async def stream():
+            for chunk in build_chunks(content, kwargs, backend.chunk_chars):
+                await asyncio.sleep(backend.chunk_delay)
+                yield to_namespace(chunk)
+
+        return stream()
+
+
+class FakeAsyncOpenAI:
+    """AsyncOpenAIのchat.completions.createだけを再現するプロセス内の疑似バックエンド"""
+
+    def __init__(
+        self,
+        responder: Responder = default_responder,
+        faults: Optional[FaultInjector] = None,
+        chunk_delay: float = DEFAULT_FAKE_CHUNK_DELAY_SECONDS,
+        chunk_chars: int = DEFAULT_FAKE_CHUNK_CHARS,
+    ):
+        self.responder = responder
+        self.faults = faults or FaultInjector()
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+
+def create_backend_client(
+    backend: str, api_key: Optional[str] = None, settings: Optional[Dict] = None, **client_kwargs
+):
+    """設定に応じてLLMゲートウェイが使う非同期クライアントを作成"""
+    settings = settings or {}
+    if backend == BACKEND_FAKE:
+        return FakeAsyncOpenAI(
+            faults=FaultInjector(
+                latency=float(settings.get("fake_latency_seconds", DEFAULT_FAKE_LATENCY_SECONDS)),
+                jitter=float(settings.get("fake_jitter_seconds", 0.0)),
+                error_rate=float(settings.get("fake_error_rate", 0.0)),
+                error_status=int(settings.get("fake_error_status", 429)),
+                seed=settings.get("fake_seed"),
+            ),
+            chunk_delay=float(settings.get("fake_chunk_delay_seconds", DEFAULT_FAKE_CHUNK_DELAY_SECONDS)),
+        )
+
+    from openai import AsyncOpenAI
+
+    if backend == BACKEND_HTTP:
+        return AsyncOpenAI(
+            api_key=api_key or "mock", base_url=settings.get("base_url", DEFAULT_MOCK_SERVER_URL), **client_kwargs
+        )
+    if backend == BACKEND_OPENAI:
+        return AsyncOpenAI(api_key=api_key, **client_kwargs)
+    raise ValueError(f"不明なLLMバックエンドです: {backend}")
@@ -0,0 +1,273 @@
+import asyncio
+import email.utils
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from utils.chat_context import count_tokens
+from utils.metrics import get_metrics
+
+# 既定値（secrets.tomlの[llm]セクションで変更可能）
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200_000
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_TIMEOUT_SECONDS = 60.0
+DEFAULT_MAX_RETRIES = 4
+
+# バックオフの基準秒数と上限
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+# max_tokens未指定時に見込む応答トークン数（TPM制限の予約用）
+DEFAULT_EXPECTED_COMPLETION_TOKENS = 512
+
+# リトライ対象のHTTPステータス
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """1分あたりの上限に合わせて補充されるトークンバケット（rate_per_minuteが0以下なら無制限）"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """amount分のトークンが貯まるまで待つ"""
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        """見込みと実績の差分を反映する（正なら追加消費、負なら返却）"""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens = max(-self.capacity, min(self.capacity, self.tokens - delta))
+
+
+@dataclass
+class GatewayStats:
+    """ゲートウェイの累計統計"""
+
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    failures: int = 0
+
+
+def estimate_request_tokens(kwargs: Dict) -> int:
+    """リクエストの消費トークン数を見積もる（プロンプト＋応答の上限）"""
+    prompt_tokens = sum(count_tokens(message.get("content") or "") + 4 for message in kwargs.get("messages", []))
+    completion_tokens = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens")
+    return prompt_tokens + (completion_tokens or DEFAULT_EXPECTED_COMPLETION_TOKENS)
+
+
+def parse_retry_after(error: Exception) -> Optional[float]:
+    """エラー応答のRetry-After（秒またはHTTP日付）を秒数で返す"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """リトライで回復する可能性のあるエラーか"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    # タイムアウト・接続エラー（openai.APITimeoutError / APIConnectionError）
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError", "TimeoutError")
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """指数バックオフ（フルジッター）の待ち時間。Retry-Afterがあればそれ以上待つ"""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class LLMGateway:
+    """プロセス共通のLLM呼び出し窓口
+
+    1つの非同期クライアント（HTTPコネクションプール）を専用スレッドのイベントループで動かし、
+    同時実行数・RPM/TPM・タイムアウト・リトライをまとめて管理する。
+    非同期インターフェース（acreate/astream）に加え、スクリプトスレッドから使うための
+    同期版（create/stream、およびOpenAIクライアント互換のchat.completions.create）を提供する。
+    """
+
+    def __init__(
+        self,
+        client,
+        rpm: int = DEFAULT_RPM,
+        tpm: int = DEFAULT_TPM,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stats = GatewayStats()
+        self._request_bucket = TokenBucket(rpm)
+        self._token_bucket = TokenBucket(tpm)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        self.chat = _Chat(self)
+
+    async def _reserve(self, kwargs: Dict) -> int:
+        estimated = estimate_request_tokens(kwargs)
+        await self._request_bucket.acquire(1)
+        await self._token_bucket.acquire(estimated)
+        return estimated
+
+    def _settle(self, estimated: int, usage) -> None:
+        total_tokens = getattr(usage, "total_tokens", None)
+        if total_tokens is not None:
+            self._token_bucket.adjust(total_tokens - estimated)
+
+    async def _wait_before_retry(self, error: Exception, attempt: int) -> None:
+        self.stats.retries += 1
+        get_metrics().increment("llm.retries")
+        if getattr(error, "status_code", None) == 429:
+            self.stats.rate_limited += 1
+            get_metrics().increment("llm.rate_limited")
+        await asyncio.sleep(backoff_delay(attempt, parse_retry_after(error)))
+
+    async def acreate(self, **kwargs) -> Any:
+        """Chat Completionsを呼び出す（非ストリーミング）"""
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            estimated = await self._reserve(kwargs)
+            try:
+                async with self._semaphore:
+                    self.stats.requests += 1
+                    start = time.perf_counter()
+                    response = await self.client.chat.completions.create(**kwargs)
+                    get_metrics().observe("llm.request", time.perf_counter() - start)
+                self._settle(estimated, getattr(response, "usage", None))
+                return response
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.stats.failures += 1
+                    get_metrics().record_error("llm.request", e)
+                    raise
+                await self._wait_before_retry(e, attempt)
+                attempt += 1
+
+    async def astream(self, **kwargs) -> AsyncIterator[Any]:
+        """Chat Completionsをストリーミングで呼び出す（最初のチャンク受信前の失敗のみリトライ）"""
+        kwargs = {**kwargs, "stream": True}
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            await self._reserve(kwargs)
+            received = False
+            try:
+                async with self._semaphore:
+                    self.stats.requests += 1
+                    start = time.perf_counter()
+                    async for chunk in await self.client.chat.completions.create(**kwargs):
+                        if not received:
+                            get_metrics().observe("llm.stream_first_chunk", time.perf_counter() - start)
+                        received = True
+                        yield chunk
+                    get_metrics().observe("llm.stream", time.perf_counter() - start)
+                return
+            except Exception as e:
+                if received or attempt >= self.max_retries or not is_retryable(e):
+                    self.stats.failures += 1
+                    get_metrics().record_error("llm.stream", e)
+                    raise
+                await self._wait_before_retry(e, attempt)
+                attempt += 1
+
+    def create(self, **kwargs) -> Any:
+        """acreateの同期版"""
+        return asyncio.run_coroutine_threadsafe(self.acreate(**kwargs), self._loop).result()
+
+    def stream(self, **kwargs) -> Iterator[Any]:
+        """astreamの同期版（チャンクを受信した順に返す）"""
+        chunks: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for chunk in self.astream(**kwargs):
+                    chunks.put(chunk)
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # 途中で読むのをやめた場合はリクエストを中断する
+            future.cancel()
+
+    def run(self, coroutine) -> Any:
+        """任意のコルーチンをゲートウェイのイベントループで実行して結果を待つ"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+
+class _Completions:
+    """OpenAIクライアント互換のchat.completions"""
+
+    def __init__(self, gateway: LLMGateway):
+        self._gateway = gateway
+
+    def create(self, **kwargs):
+        if kwargs.pop("stream", False):
+            return self._gateway.stream(**kwargs)
+        return self._gateway.create(**kwargs)
+
+
+class _Chat:
+    def __init__(self, gateway: LLMGateway):
+        self.completions = _Completions(gateway)
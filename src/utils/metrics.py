@@ -0,0 +1,325 @@
+import functools
+import json
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+# 既定値（secrets.tomlの[metrics]セクションで変更可能）
+DEFAULT_BUFFER_SIZE = 10_000
+DEFAULT_ERROR_BUFFER_SIZE = 100
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+# Prometheusのメトリクス名の接頭辞
+METRIC_PREFIX = "qa_app"
+
+# 所要時間ヒストグラムのバケット上限（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@dataclass(frozen=True)
+class TimingEvent:
+    """リングバッファに記録する1回分の計測結果"""
+
+    timestamp: float
+    name: str
+    seconds: float
+    ok: bool
+
+
+@dataclass(frozen=True)
+class ErrorEvent:
+    """記録したエラー"""
+
+    timestamp: float
+    name: str
+    message: str
+
+
+class _Histogram:
+    """起動後の累計（Prometheusのhistogram形式で出力する）"""
+
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        for i, upper in enumerate(DURATION_BUCKETS):
+            if seconds <= upper:
+                self.buckets[i] += 1
+                break
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def _metric_name(name: str) -> str:
+    return f"{METRIC_PREFIX}_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """プロセス共通の計測結果の置き場
+
+    直近の計測結果はリングバッファに保持し（パーセンタイルの算出用）、
+    起動後の累計はヒストグラムとカウンターに集計する。
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, error_buffer_size: int = DEFAULT_ERROR_BUFFER_SIZE):
+        self.started_at = time.time()
+        self._events: Deque[TimingEvent] = deque(maxlen=buffer_size)
+        self._errors: Deque[ErrorEvent] = deque(maxlen=error_buffer_size)
+        self._histograms: Dict[str, _Histogram] = defaultdict(_Histogram)
+        self._error_counts: Dict[str, int] = defaultdict(int)
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, ok: bool = True):
+        """所要時間を記録"""
+        with self._lock:
+            self._events.append(TimingEvent(time.time(), name, seconds, ok))
+            self._histograms[name].observe(seconds)
+
+    def increment(self, name: str, amount: float = 1):
+        """カウンターを加算"""
+        with self._lock:
+            self._counters[name] += amount
+
+    def record_error(self, name: str, error):
+        """エラーを記録（例外を握りつぶす箇所でも呼ぶ）"""
+        with self._lock:
+            self._error_counts[name] += 1
+            self._errors.append(ErrorEvent(time.time(), name, str(error)))
+
+    def register_collector(self, name: str, collector: Callable[[], Dict[str, float]]):
+        """出力時に現在値を取得するゲージを登録（同じ名前で登録し直すと置き換え）"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """withブロックの所要時間を記録（例外が発生した場合はエラーとしても記録）
+
+        st.stop()・st.rerun()による中断（BaseException）はエラーとして扱わない。
+        """
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except Exception as e:
+            ok = False
+            self.record_error(name, e)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, ok)
+
+    def _collect_gauges(self) -> Dict[str, float]:
+        with self._lock:
+            collectors = dict(self._collectors)
+        gauges = {}
+        for prefix, collector in collectors.items():
+            try:
+                for key, value in collector().items():
+                    gauges[f"{prefix}_{key}"] = float(value)
+            except Exception as e:
+                self.record_error(f"collector.{prefix}", e)
+        return gauges
+
+    def snapshot(self) -> Dict:
+        """計測結果をJSONに変換できる形式で取得（パーセンタイルはリングバッファ内の直近分）"""
+        with self._lock:
+            events = list(self._events)
+            histograms = {name: (h.count, h.sum) for name, h in self._histograms.items()}
+            error_counts = dict(self._error_counts)
+            counters = dict(self._counters)
+            errors = list(self._errors)
+
+        window: Dict[str, List[float]] = defaultdict(list)
+        for event in events:
+            window[event.name].append(event.seconds)
+
+        operations = {}
+        for name in sorted(set(histograms) | set(error_counts)):
+            count, total = histograms.get(name, (0, 0.0))
+            samples = sorted(window.get(name, []))
+            operations[name] = {
+                "count": count,
+                "errors": error_counts.get(name, 0),
+                "mean_ms": total / count * 1000 if count else 0.0,
+                "window_count": len(samples),
+                "p50_ms": _percentile(samples, 50) * 1000,
+                "p95_ms": _percentile(samples, 95) * 1000,
+                "p99_ms": _percentile(samples, 99) * 1000,
+                "max_ms": samples[-1] * 1000 if samples else 0.0,
+            }
+
+        return {
+            "started_at": self.started_at,
+            "uptime_seconds": time.time() - self.started_at,
+            "operations": operations,
+            "counters": counters,
+            "gauges": self._collect_gauges(),
+            "recent_errors": [
+                {"timestamp": error.timestamp, "name": error.name, "message": error.message}
+                for error in reversed(errors)
+            ],
+        }
+
+    def to_json(self) -> str:
+        """JSON形式で出力"""
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheusのテキスト形式で出力"""
+        with self._lock:
+            histograms = {
+                name: (list(h.buckets), h.count, h.sum) for name, h in sorted(self._histograms.items())
+            }
+            error_counts = dict(sorted(self._error_counts.items()))
+            counters = dict(sorted(self._counters.items()))
+
+        duration = _metric_name("operation_duration_seconds")
+        lines = [f"# HELP {duration} 操作の所要時間", f"# TYPE {duration} histogram"]
+        for name, (buckets, count, total) in histograms.items():
+            label = f'operation="{_escape_label(name)}"'
+            cumulative = 0
+            for upper, bucket in zip(DURATION_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f'{duration}_bucket{{{label},le="{upper}"}} {cumulative}')
+            lines.append(f'{duration}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{duration}_sum{{{label}}} {total}")
+            lines.append(f"{duration}_count{{{label}}} {count}")
+
+        errors = _metric_name("operation_errors_total")
+        lines += [f"# HELP {errors} 操作ごとのエラー数", f"# TYPE {errors} counter"]
+        for name, count in error_counts.items():
+            lines.append(f'{errors}{{operation="{_escape_label(name)}"}} {count}')
+
+        events = _metric_name("events_total")
+        lines += [f"# HELP {events} イベントの発生数", f"# TYPE {events} counter"]
+        for name, value in counters.items():
+            lines.append(f'{events}{{name="{_escape_label(name)}"}} {value}')
+
+        for name, value in sorted(self._collect_gauges().items()):
+            gauge = _metric_name(name)
+            lines += [f"# TYPE {gauge} gauge", f"{gauge} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+
+def get_metrics_setting(name: str, default):
+    """計測設定を取得（secrets.tomlの[metrics]セクションで変更可能）"""
+    try:
+        import streamlit as st
+
+        return st.secrets.get("metrics", {}).get(name, default)
+    except Exception:
+        return default
+
+
+_metrics_lock = threading.Lock()
+_metrics: Optional[MetricsRegistry] = None
+
+
+def get_metrics() -> MetricsRegistry:
+    """プロセス共通の計測結果の置き場を取得"""
+    global _metrics
+    if _metrics is not None:
+        return _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry(int(get_metrics_setting("buffer_size", DEFAULT_BUFFER_SIZE)))
+        return _metrics
+
+
+def timer(name: str):
+    """withブロックの所要時間を記録"""
+    return get_metrics().timer(name)
+
+
+def timed(name: str):
+    """関数の所要時間を記録するデコレーター"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().timer(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def increment(name: str, amount: float = 1):
+    """カウンターを加算"""
+    get_metrics().increment(name, amount)
+
+
+def record_error(name: str, error):
+    """エラーを記録"""
+    get_metrics().record_error(name, error)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/metrics":
+            body, content_type = get_metrics().to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, content_type = get_metrics().to_json(), "application/json; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+_server_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+_server_attempted = False
+
+
+def start_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """[metrics] port が設定されていれば、/metrics と /metrics.json を返すHTTPサーバーを起動（プロセスで1回だけ）"""
+    global _server, _server_attempted
+    if _server_attempted:
+        return _server
+
+    with _server_lock:
+        if not _server_attempted:
+            _server_attempted = True
+            port = get_metrics_setting("port", None)
+            if not port:
+                return None
+            try:
+                _server = ThreadingHTTPServer(
+                    (get_metrics_setting("host", DEFAULT_METRICS_HOST), int(port)), _MetricsHandler
+                )
+            except OSError as e:
+                print(f"メトリクスサーバーの起動エラー: {str(e)}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
@@ -1,39 +1,138 @@
 import os
+import threading
+from typing import Optional
+
 import streamlit as st
-from openai import OpenAI
+
+from utils.llm_gateway import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_RPM,
+    DEFAULT_TIMEOUT_SECONDS,
+    DEFAULT_TPM,
+    LLMGateway,
+)
+from utils.llm_backends import BACKEND_FAKE, BACKEND_OPENAI, create_backend_client
+from utils.metrics import get_metrics
+
+
+def is_tracing_enabled() -> bool:
+    """LangSmithによるトレースが有効か（secrets.tomlの[tracing] enabled、または環境変数LANGSMITH_TRACING）"""
+    try:
+        if st.secrets.get("tracing", {}).get("enabled", False):
+            return True
+    except Exception:
+        pass
+    return os.environ.get("LANGSMITH_TRACING", "").lower() == "true"
+
+
+def enable_tracing(client):
+    """LangSmithのトレースを設定してクライアントをラップする（langsmithは有効時のみ読み込む）"""
+    try:
+        from langsmith import wrappers
+
+        os.environ["LANGSMITH_TRACING"] = "true"
+        os.environ.setdefault("LANGSMITH_PROJECT", "qa-support-system")
+        if "api_keys" in st.secrets and "langsmith" in st.secrets["api_keys"]:
+            os.environ.setdefault("LANGSMITH_API_KEY", st.secrets["api_keys"]["langsmith"])
+        return wrappers.wrap_openai(client)
+    except Exception as e:
+        print(f"トレース設定エラー: {str(e)}")
+        return client
+
+
+def get_openai_api_key() -> str:
+    """OpenAI APIキーを取得"""
+    if "api_keys" in st.secrets and "openai" in st.secrets["api_keys"]:
+        # ローカル環境の場合（secrets.tomlからの読み込み）
+        return st.secrets["api_keys"]["openai"]
+
+    # Streamlit Cloud環境の場合（環境変数から読み込み）
+    if not st.secrets.get("openai_api_key"):
+        raise ValueError(
+            "OpenAI APIキーが設定されていません。Streamlit Cloudの設定で'openai_api_key'を追加してください。"
+        )
+    return st.secrets["openai_api_key"]
+
+
+def get_llm_setting_section() -> dict:
+    """secrets.tomlの[llm]セクションを取得"""
+    try:
+        return dict(st.secrets.get("llm", {}))
+    except Exception:
+        return {}
+
+
+def get_llm_setting(name: str, default):
+    """LLMゲートウェイの設定を取得（secrets.tomlの[llm]セクションで変更可能）"""
+    return get_llm_setting_section().get(name, default)
+
+
+def create_llm_gateway() -> LLMGateway:
+    """プロセス共通のLLMゲートウェイを作成
+
+    [llm] backend で接続先を切り替えられる（openai: OpenAI API、fake: プロセス内の疑似バックエンド、
+    http: base_urlで指定したOpenAI互換サーバー）。
+    """
+    backend = get_llm_setting("backend", BACKEND_OPENAI)
+    max_concurrency = int(get_llm_setting("max_concurrency", DEFAULT_MAX_CONCURRENCY))
+    timeout = float(get_llm_setting("timeout_seconds", DEFAULT_TIMEOUT_SECONDS))
+
+    if backend == BACKEND_FAKE:
+        client = create_backend_client(backend, settings=get_llm_setting_section())
+    else:
+        import httpx
+
+        client = create_backend_client(
+            backend,
+            api_key=get_openai_api_key() if backend == BACKEND_OPENAI else None,
+            settings=get_llm_setting_section(),
+            # リトライはゲートウェイ側で行う
+            max_retries=0,
+            timeout=timeout,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+                timeout=timeout,
+            ),
+        )
+        if is_tracing_enabled():
+            client = enable_tracing(client)
+
+    return LLMGateway(
+        client,
+        rpm=int(get_llm_setting("rpm", DEFAULT_RPM)),
+        tpm=int(get_llm_setting("tpm", DEFAULT_TPM)),
+        max_concurrency=max_concurrency,
+        timeout=timeout,
+        max_retries=int(get_llm_setting("max_retries", DEFAULT_MAX_RETRIES)),
+    )
+
+
+_gateway_lock = threading.Lock()
+_gateway: Optional[LLMGateway] = None
 
 
 def init_openai_client():
-    """OpenAIクライアントの初期化"""
+    """OpenAIクライアントの初期化（全セッションで1つのLLMゲートウェイを共有）"""
+    global _gateway
     try:
-        # 環境変数設定
-        os.environ["LANGCHAIN_TRACING_V2"] = "true"
-        os.environ["LANGCHAIN_PROJECT"] = "qa-support-system"
-
-        # APIキーの設定
-        if "api_keys" in st.secrets and "openai" in st.secrets["api_keys"]:
-            # ローカル環境の場合（secrets.tomlからの読み込み）
-            os.environ["OPENAI_API_KEY"] = st.secrets["api_keys"]["openai"]
-        else:
-            # Streamlit Cloud環境の場合（環境変数から読み込み）
-            if not st.secrets.get("openai_api_key"):
-                raise ValueError(
-                    "OpenAI APIキーが設定されていません。Streamlit Cloudの設定で'openai_api_key'を追加してください。"
-                )
-            os.environ["OPENAI_API_KEY"] = st.secrets["openai_api_key"]
-
-        # OpenAIクライアントの初期化
-        if "openai_client" not in st.session_state:
-            st.session_state.openai_client = OpenAI()
-
-        return st.session_state.openai_client
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = create_llm_gateway()
+                gateway = _gateway
+                get_metrics().register_collector("llm_gateway", lambda: vars(gateway.stats))
+        return _gateway
     except Exception as e:
         st.error(f"OpenAIクライアントの初期化中にエラーが発生しました: {str(e)}")
         return None
 
 
 def get_openai_client():
-    """OpenAIクライアントの取得"""
-    if "openai_client" not in st.session_state:
+    """OpenAIクライアントの取得
+
+    返り値はOpenAIクライアント互換（chat.completions.create）のLLMゲートウェイで、
+    同時実行数・レート制限・リトライはプロセス全体で管理される。
+    """
+    if _gateway is None:
         return init_openai_client()
-    return st.session_state.openai_client
+    return _gateway
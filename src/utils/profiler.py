@@ -0,0 +1,261 @@
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional
+
+from utils.metrics import DURATION_BUCKETS
+
+# プロファイルの方式
+MODE_SAMPLING = "sampling"  # 一定間隔でスタックを採取（他のセッションと同時に使える）
+MODE_CPROFILE = "cprofile"  # 全ての関数呼び出しを記録（同時に1つの再実行のみ）
+
+DEFAULT_SAMPLING_INTERVAL = 0.005
+DEFAULT_TIMING_WINDOW = 1000
+
+# スタックの根元とみなすディレクトリ（Streamlit本体の呼び出し元は除く）
+SRC_DIR = str(Path(__file__).parent.parent)
+
+# 1つのスタックに記録するフレーム数の上限
+MAX_STACK_DEPTH = 200
+
+
+def frame_label(frame) -> str:
+    """フレームを「関数名 (ファイル名:定義行)」形式にする（collapsed形式の区切り文字;は使わない）"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse_stack(frame) -> Optional[str]:
+    """フレームから根元→末端の順にセミコロンで連結したスタックを作る（srcディレクトリ外の根元は除く）"""
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+
+    for i, candidate in enumerate(frames):
+        if candidate.f_code.co_filename.startswith(SRC_DIR):
+            return ";".join(frame_label(f) for f in frames[i:])
+    return None
+
+
+class SamplingProfiler:
+    """別スレッドから対象スレッドのスタックを一定間隔で採取する"""
+
+    def __init__(self, thread_id: int, interval: float = DEFAULT_SAMPLING_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rerun-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = collapse_stack(frame)
+            if stack:
+                self.stacks[stack] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class ProfileStore:
+    """プロファイル結果のプロセス共通の集計"""
+
+    def __init__(self, timing_window: int = DEFAULT_TIMING_WINDOW):
+        self.timing_window = timing_window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """集計を破棄"""
+        with self._lock:
+            self.reruns = 0
+            self.stacks: Counter = Counter()
+            self.histograms: Dict[str, List[int]] = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+            self.timings: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.timing_window))
+            self.cprofile_stats: Optional[pstats.Stats] = None
+
+    def add_rerun(self, timings: Dict[str, float], stacks: Counter, profile: Optional[cProfile.Profile] = None):
+        """再実行1回分の結果を追加"""
+        with self._lock:
+            self.reruns += 1
+            self.stacks.update(stacks)
+            for name, seconds in timings.items():
+                self.timings[name].append(seconds)
+                histogram = self.histograms[name]
+                for i, upper in enumerate(DURATION_BUCKETS):
+                    if seconds <= upper:
+                        histogram[i] += 1
+                        break
+                else:
+                    histogram[-1] += 1
+            if profile is not None:
+                if self.cprofile_stats is None:
+                    self.cprofile_stats = pstats.Stats(profile)
+                else:
+                    self.cprofile_stats.add(profile)
+
+    def histogram(self, name: str) -> Dict[str, int]:
+        """区間ごとの所要時間の分布（バケット上限→回数）"""
+        with self._lock:
+            counts = list(self.histograms.get(name, [0] * (len(DURATION_BUCKETS) + 1)))
+        labels = [f"≤{upper * 1000:g}ms" for upper in DURATION_BUCKETS] + [f">{DURATION_BUCKETS[-1] * 1000:g}ms"]
+        return dict(zip(labels, counts))
+
+    def timing_summary(self) -> List[Dict]:
+        """区間ごとの回数・平均・p50・p95（直近timing_window回分）"""
+        with self._lock:
+            timings = {name: sorted(values) for name, values in self.timings.items()}
+        summary = []
+        for name, values in sorted(timings.items()):
+            if not values:
+                continue
+            summary.append(
+                {
+                    "name": name,
+                    "count": len(values),
+                    "mean_ms": sum(values) / len(values) * 1000,
+                    "p50_ms": values[len(values) // 2] * 1000,
+                    "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+                }
+            )
+        return summary
+
+    def folded_stacks(self) -> str:
+        """flamegraph.pl・speedscopeで読み込めるcollapsed形式（1行に「スタック 採取回数」）"""
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def top_functions(self, limit: int = 30) -> List[Dict]:
+        """cProfileの結果から累積時間の大きい関数を取得"""
+        with self._lock:
+            stats = self.cprofile_stats
+            if stats is None:
+                return []
+            rows = [
+                {
+                    "function": f"{name} ({os.path.basename(filename)}:{line})",
+                    "calls": nc,
+                    "tottime_ms": tt * 1000,
+                    "cumtime_ms": ct * 1000,
+                }
+                for (filename, line, name), (cc, nc, tt, ct, callers) in stats.stats.items()
+            ]
+        rows.sort(key=lambda row: row["cumtime_ms"], reverse=True)
+        return rows[:limit]
+
+    def cprofile_dump(self) -> Optional[bytes]:
+        """cProfileの結果をpstats形式のバイト列で取得（snakeviz・flameprofなどで読み込める）"""
+        with self._lock:
+            if self.cprofile_stats is None:
+                return None
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, "rerun.prof")
+                self.cprofile_stats.dump_stats(path)
+                with open(path, "rb") as f:
+                    return f.read()
+
+
+class _ActiveRerun:
+    def __init__(self):
+        self.timings: Dict[str, float] = defaultdict(float)
+
+
+_store = ProfileStore()
+_local = threading.local()
+
+# 全セッションの再実行をプロファイルするか（管理者ページで切り替え）
+_all_sessions = False
+_mode = MODE_SAMPLING
+# cProfileは同時に1つしか有効にできないため、使用中は他の再実行をサンプリングで計測する
+_cprofile_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    """プロセス共通のプロファイル結果を取得"""
+    return _store
+
+
+def set_all_sessions(enabled: bool):
+    """全セッションの再実行のプロファイルを切り替え"""
+    global _all_sessions
+    _all_sessions = enabled
+
+
+def is_all_sessions_enabled() -> bool:
+    return _all_sessions
+
+
+def set_mode(mode: str):
+    """プロファイルの方式を設定（sampling / cprofile）"""
+    global _mode
+    _mode = mode if mode in (MODE_SAMPLING, MODE_CPROFILE) else MODE_SAMPLING
+
+
+def get_mode() -> str:
+    return _mode
+
+
+@contextmanager
+def profile_rerun(enabled: bool) -> Iterator[None]:
+    """再実行全体をプロファイルする（enabledがFalseの場合は何もしない）"""
+    if not enabled or getattr(_local, "active", None) is not None:
+        yield
+        return
+
+    profile = None
+    sampler = None
+    if _mode == MODE_CPROFILE and _cprofile_lock.acquire(blocking=False):
+        profile = cProfile.Profile()
+    else:
+        sampler = SamplingProfiler(threading.get_ident())
+
+    active = _ActiveRerun()
+    _local.active = active
+    start = time.perf_counter()
+    try:
+        if profile is not None:
+            profile.enable()
+        else:
+            sampler.start()
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+            _cprofile_lock.release()
+        else:
+            sampler.stop()
+        active.timings["rerun"] = time.perf_counter() - start
+        _local.active = None
+        _store.add_rerun(active.timings, sampler.stacks if sampler else Counter(), profile)
+
+
+@contextmanager
+def profile_section(name: str) -> Iterator[None]:
+    """プロファイル中の再実行であれば区間の所要時間を記録"""
+    active = getattr(_local, "active", None)
+    if active is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.timings[name] += time.perf_counter() - start
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# システムプロンプトのディレクトリ（実行時のカレントディレクトリに依存しない）
+PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
+
+# カテゴリ名とプロンプトファイルの対応
+PROMPT_FILES = {
+    "機能分類": "function_classification.md",
+    "テスト分類": "test_classification.md",
+    "評価シート作成": "evaluation_sheet.md",
+}
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """読み込み済みのシステムプロンプト"""
+
+    name: str
+    content: str
+    fingerprint: str  # 内容のSHA-256
+    mtime: float
+    type: str = "markdown"
+
+    @property
+    def version(self) -> str:
+        """応答に記録するプロンプトのバージョン（フィンガープリントの先頭12文字）"""
+        return self.fingerprint[:12]
+
+
+class PromptRegistry:
+    """プロセス共通のシステムプロンプト置き場
+
+    ファイルは初回参照時に1回だけ読み込み、更新日時が変わった場合のみ再読み込みする。
+    セッションには内容ではなくカテゴリ名だけを保持すればよい。
+    """
+
+    def __init__(self, files: Dict[str, Path]):
+        self.files = files
+        self._prompts: Dict[str, Prompt] = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        """カテゴリ名の一覧を取得"""
+        return list(self.files)
+
+    def get(self, name: str) -> Prompt:
+        """プロンプトを取得（ファイルが存在しない場合はFileNotFoundErrorを送出）"""
+        path = self.files[name]
+        mtime = os.stat(path).st_mtime
+        prompt = self._prompts.get(name)
+        if prompt is not None and prompt.mtime == mtime:
+            return prompt
+
+        with self._lock:
+            prompt = self._prompts.get(name)
+            if prompt is None or prompt.mtime != mtime:
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                prompt = Prompt(
+                    name=name,
+                    content=content,
+                    fingerprint=hashlib.sha256(content.encode("utf-8")).hexdigest(),
+                    mtime=mtime,
+                )
+                self._prompts[name] = prompt
+            return prompt
+
+    def get_all(self) -> Dict[str, Prompt]:
+        """全てのプロンプトを取得"""
+        return {name: self.get(name) for name in self.files}
+
+
+_registry_lock = threading.Lock()
+_registry: Optional[PromptRegistry] = None
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """プロセス共通のプロンプトレジストリを取得"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry({name: PROMPTS_DIR / filename for name, filename in PROMPT_FILES.items()})
+        return _registry
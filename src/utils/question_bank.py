@@ -0,0 +1,395 @@
+import bisect
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from utils.db import ConnectionPool, get_connection_pool
+
+# 初回起動時に取り込む問題データ
+SEED_PATH = Path(__file__).parent.parent / "data" / "questions.json"
+
+# 他のプロセスで取り込まれた新しいバージョンを確認する間隔（秒）
+VERSION_CHECK_SECONDS = 30
+
+# 問題データの項目（必須項目とそれ以外）
+REQUIRED_FIELDS = ("ref_number", "ref_page", "category", "text", "answer_count", "correct_answers")
+OPTIONAL_FIELDS = ("id", "evaluation_criteria")
+
+
+def get_question_bank_db_path() -> Path:
+    """問題バンクのDBファイルパスを取得（users.dbと同じdataディレクトリ）"""
+    db_dir = Path(__file__).parent.parent / "data"
+    db_dir.mkdir(parents=True, exist_ok=True)
+    return db_dir / "question_bank.db"
+
+
+def init_question_bank_schema(conn: sqlite3.Connection):
+    """テーブルの作成"""
+    c = conn.cursor()
+
+    # 取り込みごとのバージョン（最新のバージョンが出題に使われる）
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS question_bank_versions (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            fingerprint TEXT NOT NULL,
+            question_count INTEGER NOT NULL,
+            note TEXT,
+            created_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+    )
+
+    # バージョンごとの問題（positionは出題順）
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS questions (
+            version INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            question_id TEXT NOT NULL,
+            ref_number TEXT NOT NULL,
+            ref_page TEXT NOT NULL,
+            category TEXT NOT NULL,
+            text TEXT NOT NULL,
+            answer_count INTEGER NOT NULL,
+            correct_answers TEXT NOT NULL,
+            evaluation_criteria TEXT,
+            PRIMARY KEY (version, position)
+        )
+    """
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS idx_questions_version_id ON questions (version, question_id)")
+
+
+def get_pool() -> ConnectionPool:
+    """問題バンク用のコネクションプールを取得（初回のみスキーマを初期化）"""
+    return get_connection_pool(get_question_bank_db_path(), init_question_bank_schema)
+
+
+def make_question_id(ref_number: str, text: str) -> str:
+    """問題IDを作成（参照項番と問題文が同じなら、バージョンをまたいで同じIDになる）"""
+    return hashlib.sha256(f"{ref_number}\n{text}".encode("utf-8")).hexdigest()[:12]
+
+
+# 参照項番のキーのどの要素よりも大きい値（範囲検索の上限に使う）
+REF_KEY_MAX = (2, 0, "")
+
+
+def ref_number_key(ref_number: str) -> Tuple:
+    """参照項番の並び順（"1.10"が"1.9"の後になるように数値として比較）"""
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"[.\-]", ref_number))
+
+
+def validate_question(raw: Dict, position: int) -> Dict:
+    """問題データを検証して正規化（不正な場合はValueErrorを送出）"""
+    label = f"{position + 1}問目"
+    if not isinstance(raw, dict):
+        raise ValueError(f"{label}: 問題はオブジェクトで指定してください")
+
+    missing = [field for field in REQUIRED_FIELDS if raw.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"{label}: 必須項目がありません（{', '.join(missing)}）")
+
+    correct_answers = raw["correct_answers"]
+    if not isinstance(correct_answers, list) or not all(isinstance(a, str) and a for a in correct_answers):
+        raise ValueError(f"{label}: correct_answersは文字列のリストで指定してください")
+    try:
+        answer_count = int(raw["answer_count"])
+    except (TypeError, ValueError):
+        raise ValueError(f"{label}: answer_countは整数で指定してください")
+    if answer_count != len(correct_answers):
+        raise ValueError(f"{label}: answer_count（{answer_count}）と模範解答の数（{len(correct_answers)}）が一致しません")
+
+    question = {
+        "id": str(raw.get("id") or make_question_id(str(raw["ref_number"]), raw["text"])),
+        "ref_number": str(raw["ref_number"]),
+        "ref_page": str(raw["ref_page"]),
+        "category": raw["category"],
+        "text": raw["text"],
+        "answer_count": answer_count,
+        "correct_answers": list(correct_answers),
+    }
+    if raw.get("evaluation_criteria"):
+        question["evaluation_criteria"] = raw["evaluation_criteria"]
+    return question
+
+
+def parse_questions(content: str, filename: str = "questions.json") -> List[Dict]:
+    """JSON（リストまたは{"questions": [...]}）・JSONL（1行1問）の問題データを読み込んで検証"""
+    if filename.endswith(".jsonl"):
+        raw_questions = [json.loads(line) for line in content.splitlines() if line.strip()]
+    else:
+        data = json.loads(content)
+        raw_questions = data.get("questions") if isinstance(data, dict) else data
+        if not isinstance(raw_questions, list):
+            raise ValueError("問題データはリスト、または questions キーを持つオブジェクトで指定してください")
+
+    if not raw_questions:
+        raise ValueError("問題が1問もありません")
+
+    questions = [validate_question(raw, i) for i, raw in enumerate(raw_questions)]
+    duplicated = [question_id for question_id, count in Counter(q["id"] for q in questions).items() if count > 1]
+    if duplicated:
+        raise ValueError(f"問題IDが重複しています（{', '.join(sorted(duplicated))}）")
+    return questions
+
+
+def fingerprint_questions(questions: Sequence[Dict]) -> str:
+    """問題データ全体のフィンガープリント（同じ内容の再取り込みを判定する）"""
+    return hashlib.sha256(json.dumps(list(questions), ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class QuestionBank:
+    """読み込み済みの問題バンク（不変）
+
+    問題は読み取り専用のマッピングのタプルで保持し、
+    参照項番・カテゴリ・参照ページごとの位置の索引を持つ。
+    """
+
+    def __init__(self, version: int, fingerprint: str, questions: Iterable[Dict]):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.questions: Tuple[Mapping, ...] = tuple(
+            MappingProxyType({**q, "correct_answers": tuple(q["correct_answers"])}) for q in questions
+        )
+
+        by_id: Dict[str, int] = {}
+        by_ref_number: Dict[str, List[int]] = {}
+        by_category: Dict[str, List[int]] = {}
+        by_ref_page: Dict[str, List[int]] = {}
+        for position, question in enumerate(self.questions):
+            by_id[question["id"]] = position
+            by_ref_number.setdefault(question["ref_number"], []).append(position)
+            by_category.setdefault(question["category"], []).append(position)
+            by_ref_page.setdefault(question["ref_page"], []).append(position)
+
+        self.by_id: Mapping[str, int] = MappingProxyType(by_id)
+        self.by_ref_number: Mapping[str, Tuple[int, ...]] = _freeze_index(by_ref_number)
+        self.by_category: Mapping[str, Tuple[int, ...]] = _freeze_index(by_category)
+        self.by_ref_page: Mapping[str, Tuple[int, ...]] = _freeze_index(by_ref_page)
+
+        # 参照項番の範囲検索用（参照項番の順に並べた位置）
+        ordered = sorted(range(len(self.questions)), key=lambda p: (ref_number_key(self.questions[p]["ref_number"]), p))
+        self._ref_keys = [ref_number_key(self.questions[p]["ref_number"]) for p in ordered]
+        self._ref_positions = tuple(ordered)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def categories(self) -> List[str]:
+        """カテゴリの一覧（出題順）"""
+        return list(self.by_category)
+
+    def get(self, question_id: str) -> Optional[Mapping]:
+        """問題IDから問題を取得"""
+        position = self.by_id.get(question_id)
+        return self.questions[position] if position is not None else None
+
+    def positions_in_ref_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Tuple[int, ...]:
+        """参照項番がstart以上end以下の問題の位置（"1.3"を指定すると"1.3.1"などの下位の項番も含む）"""
+        lo = bisect.bisect_left(self._ref_keys, ref_number_key(start)) if start else 0
+        # endで始まる下位の項番も含めるため、どの要素よりも大きい要素を末尾に加えたキーで探す
+        hi = bisect.bisect_right(self._ref_keys, ref_number_key(end) + (REF_KEY_MAX,)) if end else len(self._ref_keys)
+        return tuple(sorted(self._ref_positions[lo:hi]))
+
+    def select(
+        self,
+        categories: Optional[Sequence[str]] = None,
+        ref_start: Optional[str] = None,
+        ref_end: Optional[str] = None,
+        ref_pages: Optional[Sequence[str]] = None,
+    ) -> Tuple[int, ...]:
+        """条件に合う問題の位置を出題順で取得（指定しない条件は絞り込まない）"""
+        selected: Optional[set] = None
+
+        def narrow(positions: Iterable[int]):
+            nonlocal selected
+            positions = set(positions)
+            selected = positions if selected is None else selected & positions
+
+        if categories:
+            narrow(p for category in categories for p in self.by_category.get(category, ()))
+        if ref_start or ref_end:
+            narrow(self.positions_in_ref_range(ref_start, ref_end))
+        if ref_pages:
+            narrow(p for page in ref_pages for p in self.by_ref_page.get(page, ()))
+
+        if selected is None:
+            return tuple(range(len(self.questions)))
+        return tuple(sorted(selected))
+
+
+def _freeze_index(index: Dict[str, List[int]]) -> Mapping[str, Tuple[int, ...]]:
+    return MappingProxyType({key: tuple(positions) for key, positions in index.items()})
+
+
+def get_active_version() -> Optional[int]:
+    """出題に使うバージョン（最新の取り込み）を取得"""
+    with get_pool().connection() as conn:
+        return conn.execute("SELECT MAX(version) FROM question_bank_versions").fetchone()[0]
+
+
+def read_version(version: int) -> Tuple[str, List[Dict]]:
+    """指定したバージョンのフィンガープリントと問題を取得"""
+    with get_pool().connection() as conn:
+        row = conn.execute("SELECT fingerprint FROM question_bank_versions WHERE version = ?", (version,)).fetchone()
+        if row is None:
+            raise ValueError(f"バージョン{version}は存在しません")
+        rows = conn.execute(
+            """
+            SELECT question_id, ref_number, ref_page, category, text, answer_count, correct_answers,
+                   evaluation_criteria
+            FROM questions WHERE version = ? ORDER BY position
+        """,
+            (version,),
+        ).fetchall()
+
+    questions = []
+    for question_id, ref_number, ref_page, category, text, answer_count, correct_answers, criteria in rows:
+        question = {
+            "id": question_id,
+            "ref_number": ref_number,
+            "ref_page": ref_page,
+            "category": category,
+            "text": text,
+            "answer_count": answer_count,
+            "correct_answers": json.loads(correct_answers),
+        }
+        if criteria:
+            question["evaluation_criteria"] = criteria
+        questions.append(question)
+    return row[0], questions
+
+
+def import_questions(questions: Sequence[Dict], note: Optional[str] = None, created_by: Optional[str] = None) -> int:
+    """問題を新しいバージョンとして取り込み、そのバージョンを返す（最新と同じ内容の場合は取り込まない）"""
+    questions = [validate_question(question, i) for i, question in enumerate(questions)]
+    fingerprint = fingerprint_questions(questions)
+
+    with get_pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        latest = c.execute(
+            "SELECT version, fingerprint FROM question_bank_versions ORDER BY version DESC LIMIT 1"
+        ).fetchone()
+        if latest is not None and latest[1] == fingerprint:
+            conn.rollback()
+            return latest[0]
+
+        c.execute(
+            "INSERT INTO question_bank_versions (fingerprint, question_count, note, created_by) VALUES (?, ?, ?, ?)",
+            (fingerprint, len(questions), note, created_by),
+        )
+        version = c.lastrowid
+        c.executemany(
+            """
+            INSERT INTO questions (version, position, question_id, ref_number, ref_page, category, text,
+                                   answer_count, correct_answers, evaluation_criteria)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            [
+                (
+                    version,
+                    position,
+                    q["id"],
+                    q["ref_number"],
+                    q["ref_page"],
+                    q["category"],
+                    q["text"],
+                    q["answer_count"],
+                    json.dumps(q["correct_answers"], ensure_ascii=False),
+                    q.get("evaluation_criteria"),
+                )
+                for position, q in enumerate(questions)
+            ],
+        )
+        conn.commit()
+
+    invalidate_question_bank()
+    return version
+
+
+def restore_version(version: int, created_by: Optional[str] = None) -> int:
+    """過去のバージョンの内容を新しいバージョンとして取り込み直す（出題を元に戻す）"""
+    _, questions = read_version(version)
+    return import_questions(questions, note=f"バージョン{version}から復元", created_by=created_by)
+
+
+def export_questions(version: Optional[int] = None) -> str:
+    """問題をJSON形式で書き出す（省略時は出題中のバージョン）"""
+    bank = get_question_bank() if version is None else QuestionBank(version, *read_version(version))
+    return json.dumps(
+        {
+            "version": bank.version,
+            "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "questions": [{**q, "correct_answers": list(q["correct_answers"])} for q in bank.questions],
+        },
+        ensure_ascii=False,
+        indent=2,
+    )
+
+
+def list_versions() -> List[Dict]:
+    """取り込んだバージョンの一覧（新しい順）"""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT version, question_count, note, created_by, created_at
+            FROM question_bank_versions ORDER BY version DESC
+        """
+        ).fetchall()
+    return [
+        {"version": row[0], "question_count": row[1], "note": row[2], "created_by": row[3], "created_at": row[4]}
+        for row in rows
+    ]
+
+
+def seed_question_bank() -> int:
+    """問題バンクが空の場合は初期データを取り込む"""
+    with open(SEED_PATH, "r", encoding="utf-8") as f:
+        questions = parse_questions(f.read(), SEED_PATH.name)
+    return import_questions(questions, note="初期データ", created_by="system")
+
+
+_bank_lock = threading.Lock()
+_bank: Optional[QuestionBank] = None
+_bank_checked_at = 0.0
+
+
+def invalidate_question_bank():
+    """読み込み済みの問題バンクを破棄（次回参照時に最新のバージョンを読み込む）"""
+    global _bank_checked_at
+    _bank_checked_at = 0.0
+
+
+def get_question_bank() -> QuestionBank:
+    """プロセス共通の問題バンクを取得
+
+    問題はプロセスごとに1回だけ読み込む。新しいバージョンの有無は
+    VERSION_CHECK_SECONDS秒ごとに確認し、変わっていた場合のみ読み込み直す。
+    """
+    global _bank, _bank_checked_at
+    bank = _bank
+    if bank is not None and time.monotonic() - _bank_checked_at < VERSION_CHECK_SECONDS:
+        return bank
+
+    with _bank_lock:
+        if _bank is not None and time.monotonic() - _bank_checked_at < VERSION_CHECK_SECONDS:
+            return _bank
+
+        version = get_active_version()
+        if version is None:
+            version = seed_question_bank()
+        if _bank is None or _bank.version != version:
+            _bank = QuestionBank(version, *read_version(version))
+        _bank_checked_at = time.monotonic()
+        return _bank
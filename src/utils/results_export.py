@@ -0,0 +1,191 @@
+import csv
+import io
+import json
+import tempfile
+import zipfile
+from itertools import groupby
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.drill_results import iter_result_rows, verdict_tier
+
+# 書き出し形式
+FORMAT_ZIP = "zip"  # CSV・JSONL・受験者ごとのテキストレポートをまとめたZIP
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+
+EXPORT_MIME_TYPES = {
+    FORMAT_ZIP: "application/zip",
+    FORMAT_CSV: "text/csv",
+    FORMAT_JSONL: "application/x-ndjson",
+}
+
+# この大きさを超えるまではメモリ上、超えたら一時ファイルに書き出す
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# 管理者ページからダウンロードできる行数の上限（secrets.tomlの[export]セクションで変更可能）
+# ダウンロードはアプリのプロセスのメモリに載るため、超える場合はscripts/export_results.pyで書き出す
+DEFAULT_MAX_DOWNLOAD_ROWS = 20000
+
+# CSVの列（Excelで開けるようにUTF-8のBOM付きで書き出す）
+CSV_COLUMNS = [
+    ("submission_id", "受験番号"),
+    ("email", "メールアドレス"),
+    ("submitted_at", "送信日時"),
+    ("bank_version", "問題バンクのバージョン"),
+    ("question_number", "問題番号"),
+    ("question_id", "問題ID"),
+    ("ref_number", "参照項番"),
+    ("ref_page", "参照ページ"),
+    ("category", "カテゴリ"),
+    ("text", "問題"),
+    ("correct_answers", "模範解答"),
+    ("user_answers", "回答"),
+    ("tiers", "判定"),
+    ("is_correct", "正誤"),
+]
+
+# レポートを生成する関数（problems, results, email, generated_at）-> str
+ReportRenderer = Callable[[List[Dict], List[Dict], str, str], str]
+
+
+def get_export_setting(name: str, default):
+    """エクスポートの設定を取得（secrets.tomlの[export]セクションで変更可能）"""
+    try:
+        import streamlit as st
+
+        return st.secrets.get("export", {}).get(name, default)
+    except Exception:
+        return default
+
+
+def get_max_download_rows() -> int:
+    """管理者ページからダウンロードできる行数の上限を取得"""
+    try:
+        return max(0, int(get_export_setting("max_download_rows", DEFAULT_MAX_DOWNLOAD_ROWS)))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_DOWNLOAD_ROWS
+
+
+def to_export_record(row: Dict) -> Dict:
+    """iter_result_rowsの1行を書き出し用の辞書にする"""
+    return {
+        "submission_id": row["submission_id"],
+        "email": row["email"],
+        "submitted_at": row["submitted_at"],
+        "bank_version": row["bank_version"],
+        "question_number": row["position"] + 1,
+        "question_id": row["question_id"],
+        "ref_number": row["ref_number"],
+        "ref_page": row["ref_page"],
+        "category": row["category"],
+        "text": row["text"],
+        "correct_answers": row["correct_answers"],
+        "user_answers": [verdict.user_answer for verdict in row["verdicts"]],
+        "tiers": [verdict_tier(verdict) for verdict in row["verdicts"]],
+        "is_correct": row["is_correct"],
+    }
+
+
+def csv_value(value):
+    """CSVのセルの値（複数の値は改行で区切り、正誤は正解・不正解で表す）"""
+    if isinstance(value, list):
+        return "\n".join(value)
+    if isinstance(value, bool):
+        return "正解" if value else "不正解"
+    return value
+
+
+def iter_csv(rows: Iterable[Dict]) -> Iterator[str]:
+    """CSVを1行ずつ返す（回答などの複数の値は改行で区切る）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([label for _, label in CSV_COLUMNS])
+    yield "\ufeff" + buffer.getvalue()
+
+    for row in rows:
+        record = to_export_record(row)
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([csv_value(record[key]) for key, _ in CSV_COLUMNS])
+        yield buffer.getvalue()
+
+
+def iter_jsonl(rows: Iterable[Dict]) -> Iterator[str]:
+    """JSONLを1行ずつ返す"""
+    for row in rows:
+        yield json.dumps(to_export_record(row), ensure_ascii=False) + "\n"
+
+
+def iter_reports(rows: Iterable[Dict], render_report: ReportRenderer) -> Iterator[Tuple[str, str]]:
+    """回答送信ごとに（ファイル名, テキストレポート）を返す（rowsは回答送信順に並んでいること）"""
+    for submission_id, submission_rows in groupby(rows, key=lambda row: row["submission_id"]):
+        problems = []
+        results = []
+        for row in submission_rows:
+            problems.append(
+                {
+                    "id": row["question_id"],
+                    "ref_number": row["ref_number"],
+                    "ref_page": row["ref_page"],
+                    "category": row["category"],
+                    "text": row["text"],
+                    "correct_answers": row["correct_answers"],
+                }
+            )
+            results.append(
+                {
+                    "is_correct": row["is_correct"],
+                    "message": row["message"],
+                    "user_answers": [verdict.user_answer for verdict in row["verdicts"]],
+                    "verdicts": row["verdicts"],
+                }
+            )
+        user_name = row["email"].split("@")[0]
+        file_name = f"reports/{user_name}/qa_drill_report_{submission_id}.txt"
+        yield file_name, render_report(problems, results, row["email"], row["submitted_at"])
+
+
+def write_lines(f: IO[bytes], lines: Iterable[str]):
+    """文字列を1行ずつUTF-8で書き込む"""
+    for line in lines:
+        f.write(line.encode("utf-8"))
+
+
+def write_export(
+    f: IO[bytes], export_format: str, render_report: Optional[ReportRenderer] = None, **filters
+) -> IO[bytes]:
+    """採点結果を指定した形式でfに書き出す（DBから少しずつ読み込み、そのまま書き出す）"""
+    if export_format == FORMAT_CSV:
+        write_lines(f, iter_csv(iter_result_rows(**filters)))
+    elif export_format == FORMAT_JSONL:
+        write_lines(f, iter_jsonl(iter_result_rows(**filters)))
+    elif export_format == FORMAT_ZIP:
+        with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open("results.csv", "w") as entry:
+                write_lines(entry, iter_csv(iter_result_rows(**filters)))
+            with zf.open("results.jsonl", "w") as entry:
+                write_lines(entry, iter_jsonl(iter_result_rows(**filters)))
+            if render_report is not None:
+                for file_name, report in iter_reports(iter_result_rows(**filters), render_report):
+                    zf.writestr(file_name, report)
+    else:
+        raise ValueError(f"未対応の形式です: {export_format}")
+    return f
+
+
+def export_results(export_format: str, render_report: Optional[ReportRenderer] = None, **filters) -> IO[bytes]:
+    """採点結果を一時ファイル（小さいうちはメモリ上）に書き出し、先頭に戻して返す"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    write_export(spool, export_format, render_report, **filters)
+    spool.seek(0)
+    return spool
+
+
+def export_results_bytes(export_format: str, render_report: Optional[ReportRenderer] = None, **filters) -> bytes:
+    """export_resultsの内容をバイト列で取得（管理者ページのダウンロード用）
+
+    st.download_buttonは書き出し後のファイル全体をメモリに保持して配信するため、
+    get_max_download_rowsを超える行数のエクスポートはscripts/export_results.pyでファイルに直接書き出す。
+    """
+    with export_results(export_format, render_report, **filters) as f:
+        return f.read()
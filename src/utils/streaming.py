@@ -0,0 +1,113 @@
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from utils.chat_context import count_tokens
+
+# 既定の描画間隔（秒）と、間隔内でも描画する未描画文字数
+DEFAULT_FLUSH_INTERVAL = 0.05
+DEFAULT_FLUSH_CHARS = 200
+
+CURSOR = "▌"
+
+
+@dataclass
+class StreamStats:
+    """ストリーミング応答1件分の計測結果"""
+
+    time_to_first_token: Optional[float]  # リクエスト開始から最初のトークンまでの秒数
+    duration: float  # リクエスト開始から完了までの秒数
+    chunks: int
+    tokens: int
+    flushes: int
+
+    @property
+    def tokens_per_second(self) -> float:
+        """最初のトークン以降の生成速度"""
+        if self.time_to_first_token is None:
+            return 0.0
+        generation_time = self.duration - self.time_to_first_token
+        return self.tokens / generation_time if generation_time > 0 else 0.0
+
+    def describe(self) -> str:
+        """画面表示用の文字列"""
+        if self.time_to_first_token is None:
+            return f"応答なし（{self.duration:.2f}秒）"
+        return f"初回トークン {self.time_to_first_token:.2f}秒・{self.tokens_per_second:.1f} tokens/秒"
+
+
+class StreamRenderer:
+    """ストリーミング応答を一定間隔でまとめて描画する
+
+    差分ごとに全文を描画し直すと応答長の2乗に比例した描画・通信が発生するため、
+    差分はリストに溜めておき、flush_interval秒ごとまたはflush_chars文字ごとに描画する。
+    """
+
+    def __init__(
+        self,
+        placeholder=None,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        flush_chars: int = DEFAULT_FLUSH_CHARS,
+    ):
+        self.placeholder = placeholder
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self._chunks: List[str] = []
+        self._text = ""
+        self._pending_chars = 0
+        self._started_at: Optional[float] = None
+        self._first_token_at: Optional[float] = None
+        self._last_flush_at = 0.0
+        self._chunk_count = 0
+        self._flushes = 0
+        self.stats: Optional[StreamStats] = None
+
+    def start(self):
+        """計測を開始する（リクエスト送信直前に呼ぶ）"""
+        self._started_at = time.perf_counter()
+        self._last_flush_at = self._started_at
+
+    def write(self, delta: str):
+        """差分を追加し、描画タイミングであれば描画する"""
+        if not delta:
+            return
+        now = time.perf_counter()
+        if self._started_at is None:
+            self.start()
+        if self._first_token_at is None:
+            self._first_token_at = now
+        self._chunks.append(delta)
+        self._chunk_count += 1
+        self._pending_chars += len(delta)
+
+        if self._pending_chars >= self.flush_chars or now - self._last_flush_at >= self.flush_interval:
+            self._flush(now, cursor=True)
+
+    def _flush(self, now: float, cursor: bool):
+        if self._chunks:
+            self._text += "".join(self._chunks)
+            self._chunks = []
+        self._pending_chars = 0
+        self._last_flush_at = now
+        if self.placeholder is not None:
+            self.placeholder.markdown(self._text + CURSOR if cursor else self._text)
+            self._flushes += 1
+
+    @property
+    def text(self) -> str:
+        """これまでに受け取った全文"""
+        return self._text + "".join(self._chunks)
+
+    def finish(self) -> str:
+        """残りを描画して計測結果を確定し、全文を返す"""
+        now = time.perf_counter()
+        self._flush(now, cursor=False)
+        started_at = self._started_at if self._started_at is not None else now
+        self.stats = StreamStats(
+            time_to_first_token=self._first_token_at - started_at if self._first_token_at is not None else None,
+            duration=now - started_at,
+            chunks=self._chunk_count,
+            tokens=count_tokens(self._text) if self._text else 0,
+            flushes=self._flushes,
+        )
+        return self._text